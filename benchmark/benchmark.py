@@ -1,6 +1,9 @@
+import argparse, json, os, sys, logging
+import numpy as np
 import pandas as pd
+import matplotlib
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
-import sys, logging
 
 logging.basicConfig(
     level=logging.INFO,
@@ -8,28 +11,243 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
-BENCHMARK_PATH = "/data/benchmark.csv"
-OUT_PATH = "/data/benchmark_plot.png"
+BENCHMARK_PATH = os.getenv("BENCHMARK_PATH", "/data/benchmark.csv")
+OUT_DIR = os.getenv("OUT_DIR", "/data")
+OUT_PATH = os.path.join(OUT_DIR, "benchmark_plot.png")
+CDF_PATH = os.path.join(OUT_DIR, "benchmark_cdf.png")
+REPORT_PATH = os.path.join(OUT_DIR, "benchmark_report.json")
+COMPARE_PATH = os.path.join(OUT_DIR, "benchmark_compare.json")
 
-df = pd.read_csv(BENCHMARK_PATH)
+CHUNK_ROWS = int(os.getenv("CHUNK_ROWS", "100000"))  # rows of benchmark.csv read at a time
+SAMPLE_SIZE = int(os.getenv("SAMPLE_SIZE", "5000"))  # rows kept per (run, event type) for quantiles
+BOOTSTRAP = int(os.getenv("BOOTSTRAP", "1000"))  # bootstrap resamples
+CONFIDENCE = float(os.getenv("CONFIDENCE", "0.95"))
+SEED = int(os.getenv("SEED", "0"))
+QUANTILES = [50, 90, 99]
+LEGACY_RUN = "legacy"  # rows written before runs were tagged
 
-df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s')
 
-plt.figure(figsize=(12,6))
+############################################
+# STREAMING
+############################################
+class RunSample:
+    """
+    Streaming summary of one (run, event type): exact count / mean / min / max, plus a uniform
+    sample of at most SAMPLE_SIZE rows for quantiles, CDFs and the bootstrap. The sample is a
+    bottom-k sample on random keys, so it is updated a whole chunk at a time.
+    """
 
-pre = df[df['event_type'] == 'prewarm']
-cold = df[df['event_type'] == 'cold']
+    def __init__(self, size: int, rng: np.random.Generator):
+        self.size = size
+        self.rng = rng
+        self.count = 0
+        self.total = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self.rows = None  # sampled rows with a "_key" column
+        self.version = None
+        self.first = self.last = None
 
-plt.plot(pre['timestamp'], pre['start_time_ms'], label="Prewarm start time (ms)")
-plt.plot(cold['timestamp'], cold['start_time_ms'], label="Cold start time (ms)")
+    def add(self, chunk: pd.DataFrame):
+        values = chunk["start_time_ms"].to_numpy()
+        self.count += len(values)
+        self.total += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.version = chunk["scheduler_version"].iloc[-1]
+        first, last = float(chunk["timestamp"].min()), float(chunk["timestamp"].max())
+        self.first = first if self.first is None else min(self.first, first)
+        self.last = last if self.last is None else max(self.last, last)
 
-plt.xlabel("Timestamp")
-plt.ylabel("Start time (ms)")
-plt.title("Warm vs Cold Processor Startup")
-plt.legend()
+        chunk = chunk.assign(_key=self.rng.random(len(chunk)))
+        rows = chunk if self.rows is None else pd.concat([self.rows, chunk], ignore_index=True)
+        if len(rows) > self.size:
+            rows = rows.iloc[np.argpartition(rows["_key"].to_numpy(), self.size)[:self.size]]
+        self.rows = rows
 
-plt.grid(True)
-plt.tight_layout()
+    def values(self) -> np.ndarray:
+        return self.rows["start_time_ms"].to_numpy()
 
-plt.savefig(OUT_PATH)
-logging.info(f"Benchmark graph saved to: {OUT_PATH}")
+
+def stream(path: str, runs: list = None) -> dict:
+    """{(run_id, event_type): RunSample} over benchmark.csv, read CHUNK_ROWS at a time."""
+    rng = np.random.default_rng(SEED)
+    samples = {}
+    for chunk in pd.read_csv(path, chunksize=CHUNK_ROWS):
+        for column, default in (("run_id", LEGACY_RUN), ("scheduler_version", "unknown")):
+            chunk[column] = chunk[column].fillna(default).astype(str) if column in chunk else default
+        chunk["start_time_ms"] = pd.to_numeric(chunk["start_time_ms"], errors="coerce")
+        chunk = chunk.dropna(subset=["start_time_ms"])
+        if runs:
+            chunk = chunk[chunk["run_id"].isin(runs)]
+        for key, group in chunk.groupby(["run_id", "event_type"], sort=False):
+            if key not in samples:
+                samples[key] = RunSample(SAMPLE_SIZE, rng)
+            samples[key].add(group)
+    return samples
+
+
+############################################
+# STATISTICS
+############################################
+def bootstrap(stat, *samples, rng: np.random.Generator, resamples: int = BOOTSTRAP, batch: int = 200) -> np.ndarray:
+    """(resamples x k) bootstrap distribution of stat(*resampled), stat returning k values per resample."""
+    out = []
+    for start in range(0, resamples, batch):
+        b = min(batch, resamples - start)
+        drawn = [s[rng.integers(0, len(s), size=(b, len(s)))] for s in samples]
+        out.append(stat(*drawn))
+    return np.concatenate(out, axis=0)
+
+
+def interval(dist: np.ndarray, confidence: float = CONFIDENCE):
+    alpha = (1.0 - confidence) / 2.0
+    low, high = np.quantile(dist, [alpha, 1.0 - alpha], axis=0)
+    return low, high
+
+
+def quantiles(values: np.ndarray) -> np.ndarray:
+    return np.percentile(values, QUANTILES, axis=-1).T
+
+
+def summarize(sample: RunSample, rng: np.random.Generator) -> dict:
+    values = sample.values()
+    point = quantiles(values)
+    low, high = interval(bootstrap(quantiles, values, rng=rng))
+    phases = [c for c in sample.rows.columns if c.endswith("_ms") and c != "start_time_ms"]
+    medians = sample.rows[phases].apply(pd.to_numeric, errors="coerce").median()
+    return {
+        "count": sample.count,
+        "sampled": len(values),
+        "mean": round(sample.total / sample.count, 2),
+        "min": sample.min,
+        "max": sample.max,
+        "scheduler_version": sample.version,
+        "first": sample.first,
+        "last": sample.last,
+        **{f"p{q}": {"value": round(point[i], 2), "ci": [round(low[i], 2), round(high[i], 2)]}
+           for i, q in enumerate(QUANTILES)},
+        "phase_medians": {p: round(v, 2) for p, v in medians.dropna().items()},
+    }
+
+
+def ratio(numerator: np.ndarray, denominator: np.ndarray, rng: np.random.Generator) -> dict:
+    """numerator / denominator of every quantile, with bootstrap intervals (both sides resampled)."""
+    point = quantiles(numerator) / quantiles(denominator)
+    low, high = interval(bootstrap(lambda a, b: quantiles(a) / quantiles(b), numerator, denominator, rng=rng))
+    return {f"p{q}": {"value": round(point[i], 3), "ci": [round(low[i], 3), round(high[i], 3)]}
+            for i, q in enumerate(QUANTILES)}
+
+
+############################################
+# MODES
+############################################
+def plot(samples: dict):
+    """Start time over time per event type (sampled rows), the chart the job always produced."""
+    plt.figure(figsize=(12, 6))
+    for event_type in sorted({e for _, e in samples}):
+        rows = pd.concat([s.rows for (_, e), s in samples.items() if e == event_type]).sort_values("timestamp")
+        plt.plot(pd.to_datetime(rows["timestamp"], unit="s"), rows["start_time_ms"], label=f"{event_type.capitalize()} start time (ms)")
+    plt.xlabel("Timestamp")
+    plt.ylabel("Start time (ms)")
+    plt.title("Warm vs Cold Processor Startup")
+    plt.legend()
+    plt.grid(True)
+    plt.tight_layout()
+    plt.savefig(OUT_PATH)
+    plt.close()
+    logging.info(f"Benchmark graph saved to: {OUT_PATH}")
+
+
+def plot_cdf(samples: dict):
+    plt.figure(figsize=(12, 6))
+    for (run, event_type), sample in sorted(samples.items()):
+        values = np.sort(sample.values())
+        plt.step(values, np.arange(1, len(values) + 1) / len(values), where="post", label=f"{run} {event_type}")
+    plt.xscale("log")
+    plt.xlabel("Start time (ms)")
+    plt.ylabel("Fraction of starts")
+    plt.title("Processor startup CDF per run")
+    plt.legend()
+    plt.grid(True, which="both")
+    plt.tight_layout()
+    plt.savefig(CDF_PATH)
+    plt.close()
+    logging.info(f"Benchmark CDF saved to: {CDF_PATH}")
+
+
+def report(samples: dict) -> dict:
+    """Quantiles with bootstrap intervals per run and event type, and the cold / prewarm speedup per run."""
+    rng = np.random.default_rng(SEED)
+    runs = {}
+    for (run, event_type), sample in sorted(samples.items()):
+        stats = summarize(sample, rng)
+        runs.setdefault(run, {})[event_type] = stats
+        logging.info(f"[Benchmark] {run} {event_type}: n={stats['count']} " + ", ".join(
+            f"p{q}={stats[f'p{q}']['value']} [{stats[f'p{q}']['ci'][0]}, {stats[f'p{q}']['ci'][1]}]" for q in QUANTILES))
+    for run, events in runs.items():
+        if "cold" in events and "prewarm" in events:
+            events["speedup"] = ratio(samples[(run, "cold")].values(), samples[(run, "prewarm")].values(), rng)
+            logging.info(f"[Benchmark] {run} speedup cold/prewarm: " + ", ".join(
+                f"p{q}={events['speedup'][f'p{q}']['value']}x" for q in QUANTILES))
+
+    out = {"confidence": CONFIDENCE, "bootstrap": BOOTSTRAP, "runs": runs}
+    with open(REPORT_PATH, "w") as f:
+        json.dump(out, f, indent=2, default=float)
+    logging.info(f"Benchmark report saved to: {REPORT_PATH}")
+    return out
+
+
+def compare(samples: dict, base: str, candidate: str, threshold: float) -> bool:
+    """
+    candidate / base - 1 of every quantile per event type. A change counts when it is beyond
+    `threshold` and its bootstrap interval excludes 0. Returns True if any quantile regressed.
+    """
+    rng = np.random.default_rng(SEED)
+    results, regressed = {}, False
+    for event_type in sorted({e for r, e in samples if r == base} & {e for r, e in samples if r == candidate}):
+        change = ratio(samples[(candidate, event_type)].values(), samples[(base, event_type)].values(), rng)
+        for q, c in change.items():
+            delta, low, high = c["value"] - 1, c["ci"][0] - 1, c["ci"][1] - 1
+            verdict = "regression" if delta > threshold and low > 0 else \
+                "improvement" if delta < -threshold and high < 0 else "no change"
+            regressed |= verdict == "regression"
+            results.setdefault(event_type, {})[q] = {"change": round(delta, 3), "ci": [round(low, 3), round(high, 3)],
+                                                     "verdict": verdict}
+            logging.info(f"[Benchmark] {event_type} {q}: {delta:+.1%} [{low:+.1%}, {high:+.1%}] {verdict}")
+
+    if not results:
+        logging.error(f"[Benchmark] No event type has rows in both {base} and {candidate}")
+    with open(COMPARE_PATH, "w") as f:
+        json.dump({"base": base, "candidate": candidate, "threshold": threshold, "results": results}, f, indent=2)
+    logging.info(f"Benchmark comparison saved to: {COMPARE_PATH}")
+    return regressed or not results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Processor startup benchmarks from benchmark.csv")
+    modes = parser.add_subparsers(dest="mode")
+    modes.add_parser("plot", help="start time over time (default)")
+    modes.add_parser("report", help="quantiles, bootstrap intervals, CDFs and speedups per run")
+    diff = modes.add_parser("compare", help="diff two runs, exit 1 on a regression")
+    diff.add_argument("base")
+    diff.add_argument("candidate")
+    diff.add_argument("--threshold", type=float, default=0.05, help="relative change that counts (default 0.05)")
+    args = parser.parse_args()
+
+    if args.mode == "compare":
+        samples = stream(BENCHMARK_PATH, [args.base, args.candidate])
+        sys.exit(1 if compare(samples, args.base, args.candidate, args.threshold) else 0)
+
+    samples = stream(BENCHMARK_PATH)
+    if not samples:
+        logging.error(f"[Benchmark] No benchmark rows in {BENCHMARK_PATH}")
+        sys.exit(1)
+    plot(samples)
+    if args.mode == "report":
+        plot_cdf(samples)
+        report(samples)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import os, time, math, logging, threading
+import telemetry
+
+WINDOW = float(os.getenv("WINDOW", "30"))  # seconds per aggregated row
+READING_FIELDS = ["temperature", "vibration", "load"]
+# processor-reported fields carried into every row (latest value seen in the window)
+PROCESSOR_FIELDS = ["cpu_usage", "mem_usage", "buffer_size", "buffer_capacity", "avg_latency", "avg_rate",
+                    "latency_p50", "latency_p95", "latency_p99", "rate_ewma", "cpu_throttled"]
+
+
+def percentile(values: list, q: float) -> float:
+    """Nearest-rank percentile of an unsorted list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class WindowAggregator:
+    """
+    Folds the raw MQTT stream into one row per processor per WINDOW seconds.
+      - machine readings (data/<machine>) are joined to their processor through the assignment map,
+        learned from retained assignments/<processor> messages and the processors' assigned_machines
+      - readings give mean / max / p95 of temperature, vibration and load plus the message rate
+      - processor metrics/buffer/state updates give the latest cpu, memory, buffer and latency values
+    Readings from machines no processor claims are counted and dropped.
+    """
+
+    def __init__(self, window: float = WINDOW):
+        self.window = window
+        self.lock = threading.Lock()
+        self.machine_owner = {}
+        self.owned = {}  # processor -> set of machines
+        self.processor_latest = {}  # processor -> {field: value, "assigned_machines": [...]}
+        self.readings = {}  # processor -> {field: [values]}
+        self.counts = {}  # processor -> messages this window
+        self.seen = set()  # processors that reported anything this window
+        self.unassigned = 0
+        self.window_start = math.floor(time.time() / window) * window
+
+    def on_assignment(self, processor: str, machines: list):
+        with self.lock:
+            for m in self.owned.pop(processor, set()):
+                if self.machine_owner.get(m) == processor:
+                    del self.machine_owner[m]
+            if machines:
+                self.owned[processor] = set(machines)
+                for m in machines:
+                    self.machine_owner[m] = processor
+            else:
+                self.processor_latest.pop(processor, None)
+
+    def on_processor_update(self, processor: str, fields: dict):
+        machines = fields.get("assigned_machines")
+        if machines:
+            self.on_assignment(processor, machines)
+
+        with self.lock:
+            latest = self.processor_latest.setdefault(processor, {f: 0.0 for f in PROCESSOR_FIELDS})
+            for f in PROCESSOR_FIELDS:
+                if f in fields:
+                    latest[f] = fields[f]
+            latest["assigned_machines"] = machines or latest.get("assigned_machines", [])
+            self.seen.add(processor)
+
+    def on_reading(self, machine: str, payload: dict):
+        with self.lock:
+            processor = self.machine_owner.get(machine)
+            if processor is None:
+                self.unassigned += 1
+                return
+
+            bucket = self.readings.setdefault(processor, {f: [] for f in READING_FIELDS})
+            for f in READING_FIELDS:
+                try:
+                    bucket[f].append(float(payload[f]))
+                except (KeyError, TypeError, ValueError):
+                    pass
+            self.counts[processor] = self.counts.get(processor, 0) + 1
+            self.seen.add(processor)
+
+    def seconds_until_close(self) -> float:
+        return max(0.0, self.window_start + self.window - time.time())
+
+    def close_window(self, final: bool = False) -> list:
+        """
+        Rows for the window that just ended, one per processor that reported in it.
+        final=True closes the current window early (shutdown); rates use the elapsed time.
+        """
+        with self.lock:
+            end = self.window_start + self.window
+            if final:
+                end = min(end, time.time())
+            duration = max(end - self.window_start, 1e-6)
+            readings, counts, seen = self.readings, self.counts, self.seen
+            unassigned = self.unassigned
+            self.readings, self.counts, self.seen, self.unassigned = {}, {}, set(), 0
+            self.window_start = max(end, math.floor(time.time() / self.window) * self.window)
+
+            rows = []
+            for processor in sorted(seen):
+                latest = self.processor_latest.get(processor, {})
+                bucket = readings.get(processor, {f: [] for f in READING_FIELDS})
+                row = {
+                    "timestamp": end,
+                    "processor_id": processor,
+                    "window_seconds": round(duration, 3),
+                    "msg_rate": round(counts.get(processor, 0) / duration, 3),
+                    "machine_count": len(self.owned.get(processor, ())),
+                    "assigned_machines": list(latest.get("assigned_machines", [])),
+                }
+                for f in PROCESSOR_FIELDS:
+                    row[f] = latest.get(f, 0.0)
+                for f in READING_FIELDS:
+                    values = bucket[f]
+                    row[f] = round(sum(values) / len(values), 4) if values else 0.0
+                    row[f"{f}_max"] = max(values) if values else 0.0
+                    row[f"{f}_p95"] = percentile(values, 95)
+                rows.append(row)
+
+        if unassigned:
+            telemetry.UNASSIGNED.inc(unassigned)
+            logging.info(f"[Collector] Dropped {unassigned} readings from machines without a processor")
+        return rows
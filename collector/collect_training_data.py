@@ -1,118 +1,120 @@
-import os, time, json, csv, sys, logging
+import os, json, sys, logging, signal, threading
 import paho.mqtt.client as mqtt
 from paho.mqtt.enums import CallbackAPIVersion
+from sink_writer import BufferedSinkWriter, CsvSink, JsonlSink
+from feature_store import ParquetSink
+from aggregator import WindowAggregator, READING_FIELDS
+import telemetry
 
 logging.basicConfig(
-    level=logging.INFO,
+    level=os.getenv("LOG_LEVEL", "INFO"),
     handlers=[logging.StreamHandler(sys.stdout)]
 )
 
 MQTT_BROKER = os.getenv("MQTT_BROKER", "mqtt-broker")
 MQTT_PORT = int(os.getenv("MQTT_PORT", 1883))
 DATA_DIR = "/data"
-CSV_FILE = os.path.join(DATA_DIR, "features.csv")
-JSONL_FILE = os.path.join(DATA_DIR, "raw_events.jsonl")
-
-processor_state = {}
+CSV_FILE = os.getenv("OUT_FEATURES", os.path.join(DATA_DIR, "features.csv"))
+JSONL_FILE = os.getenv("OUT_RAW", os.path.join(DATA_DIR, "raw_events.jsonl"))
+# raw_events.jsonl feeds the scheduler, Parquet feeds the trainer; csv is kept for ad-hoc inspection
+FEATURE_SINKS = os.getenv("FEATURE_SINKS", "jsonl,parquet").split(",")
+
+FEATURE_DEFAULTS = {
+    "timestamp": 0.0,
+    "processor_id": "unknown",
+    "cpu_usage": 0.0,
+    "mem_usage": 0.0,
+    "buffer_size": 0,
+    "buffer_capacity": 0,
+    "avg_latency": 0.0,
+    "avg_rate": 0.0,
+    "latency_p50": 0.0,
+    "latency_p95": 0.0,
+    "latency_p99": 0.0,
+    "rate_ewma": 0.0,
+    "cpu_throttled": 0.0,
+    "temperature": 0.0,
+    "vibration": 0.0,
+    "load": 0.0,
+    **{f"{f}_{stat}": 0.0 for f in READING_FIELDS for stat in ("max", "p95")},
+    "msg_rate": 0.0,
+    "machine_count": 0,
+    "window_seconds": 0.0,
+    "assigned_machines": []
+}
+FIELDNAMES = list(FEATURE_DEFAULTS)
+
+aggregator = WindowAggregator()
+writer = None
 
 
 def ensure_data_dir():
     os.makedirs(DATA_DIR, exist_ok=True)
 
 
-def write_csv(record):
-    """Append record to CSV, creating header if missing."""
-    file_exists = os.path.isfile(CSV_FILE)
-    with open(CSV_FILE, "a", newline="") as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=record.keys())
-        if not file_exists:
-            writer.writeheader()
-        writer.writerow(record)
-
-
-def write_jsonl(record):
-    """Append event to raw_events.jsonl for temporal analysis."""
-    with open(JSONL_FILE, "a") as f:
-        json.dump(record, f)
-        f.write("\n")
-
-
-def merge_state(processor_id, update):
-    """Merge partial updates and write FULL feature snapshot."""
-
-    base = {
-        "timestamp": time.time(),
-        "processor_id": processor_id,
-        "cpu_usage": 0.0,
-        "mem_usage": 0.0,
-        "buffer_size": 0,
-        "buffer_capacity": 0,
-        "avg_latency": 0.0,
-        "avg_rate": 0.0,
-        "temperature": 0.0,
-        "vibration": 0.0,
-        "load": 0.0,
-        "assigned_machines": []
-    }
-
-    # Load last known state or base
-    current = processor_state.get(processor_id, base.copy())
-
-    # Apply update
-    current.update(update)
-
-    # ALWAYS refresh timestamp
-    current["timestamp"] = time.time()
-
-    # Save state
-    processor_state[processor_id] = current
-
-    clean_state = sanitize_state(current.copy())
-
-    # Write FULL snapshot, not partial update
-    write_csv(clean_state)
-    write_jsonl(clean_state)
+def build_sinks():
+    sinks = []
+    if "csv" in FEATURE_SINKS:
+        sinks.append(CsvSink(CSV_FILE, FIELDNAMES))
+    if "jsonl" in FEATURE_SINKS:
+        sinks.append(JsonlSink(JSONL_FILE))
+    if "parquet" in FEATURE_SINKS:
+        sinks.append(ParquetSink())
+    logging.info(f"[Collector] Writing to {[type(s).__name__ for s in sinks]}")
+    return sinks
 
 
 def on_message(client, userdata, msg):
     topic = msg.topic
+    kind = topic.split("/", 1)[0]
+    telemetry.MESSAGES.labels(kind).inc()
+    if topic.startswith("assignments/"):
+        on_assignment(topic, msg.payload)
+        return
+
     try:
         payload = json.loads(msg.payload.decode())
     except Exception as e:
-        logging.info(f"[Collector] Invalid JSON from {topic}: {e}")
+        telemetry.MESSAGES.labels("invalid").inc()
+        logging.debug(f"[Collector] Invalid JSON from {topic}: {e}")
         return
 
-    processor_id = payload.get("processor_id", "unknown")
-
-    if topic.startswith("metrics/"):
-        merge_state(
-            processor_id,
-            {
-                "cpu_usage": payload.get("cpu_usage", 0.0),
-                "mem_usage": payload.get("mem_usage", 0.0),
-                "avg_latency": payload.get("avg_latency", 0.0),
-                "avg_rate": payload.get("avg_rate", 0.0),
-                "assigned_machines": payload.get("assigned_machines", []),
-            },
-        )
-    elif topic.startswith("buffer/"):
-        merge_state(
-            processor_id,
-            {
-                "buffer_size": payload.get("buffer_size", 0),
-                "buffer_capacity": payload.get("buffer_capacity", 0),
-                "assigned_machines": payload.get("assigned_machines", []),
-            },
-        )
-    elif topic.startswith("data/") or topic.startswith("state/"):
-        merge_state(processor_id, payload)
+    if topic.startswith("data/"):
+        # raw machine reading: joined to its processor by the aggregator
+        aggregator.on_reading(topic.split("/", 1)[1], payload)
+    elif topic.startswith("metrics/") or topic.startswith("buffer/") or topic.startswith("state/"):
+        aggregator.on_processor_update(payload.get("processor_id", topic.split("/", 1)[1]), payload)
     else:
-        logging.info(f"[Collector] Ignored unknown topic: {topic}")
+        logging.debug(f"[Collector] Ignored unknown topic: {topic}")
+
+
+def on_assignment(topic, raw):
+    """Retained assignments/<processor> from the scheduler; empty payload = processor gone."""
+    try:
+        payload = json.loads(raw.decode()) if raw else {}
+    except Exception as e:
+        logging.info(f"[Collector] Invalid assignment on {topic}: {e}")
+        return
+    machines = payload.get("machines", []) if isinstance(payload, dict) else payload
+    aggregator.on_assignment(topic.split("/", 1)[1], machines)
+
+
+def write_window(final=False):
+    """Write one feature row per processor for the window that just closed."""
+    rows = aggregator.close_window(final=final)
+    telemetry.WINDOW_ROWS.inc(len(rows))
+    for row in rows:
+        writer.write(sanitize_state({**FEATURE_DEFAULTS, **row}))
+
+
+def window_loop():
+    while not stopping.wait(aggregator.seconds_until_close()):
+        write_window()
 
 
 def sanitize_state(d):
     for k, v in d.items():
-        if isinstance(v, list):
+        if isinstance(v, list) or k == "processor_id":
             continue
         if v is None:
             d[k] = 0.0
@@ -129,15 +131,42 @@ def on_connect(client, userdata, flags, rc, properties=None):
     client.subscribe("buffer/#")
     client.subscribe("data/#")
     client.subscribe("state/#")
+    client.subscribe("assignments/+", qos=1)
+
+
+def shutdown(signum, frame):
+    """
+    Only ask the MQTT loop to stop: the handler runs on the loop's thread, possibly inside
+    on_message holding the aggregator's lock, so the final flush happens after loop_forever().
+    """
+    logging.info(f"[Collector] Signal {signum} received, flushing and exiting")
+    stopping.set()
+    threading.Thread(target=client.disconnect, name="disconnect").start()
 
 
 if __name__ == "__main__":
     ensure_data_dir()
+    writer = BufferedSinkWriter(build_sinks())
+    telemetry.serve()
 
     client = mqtt.Client(callback_api_version=CallbackAPIVersion.VERSION2)
     client.on_connect = on_connect
     client.on_message = on_message
 
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    # one row per processor per WINDOW seconds
+    stopping = threading.Event()
+    window_thread = threading.Thread(target=window_loop, name="window", daemon=True)
+    window_thread.start()
+
     logging.info(f"[Collector] Connecting to {MQTT_BROKER}:{MQTT_PORT}")
     client.connect(MQTT_BROKER, MQTT_PORT, 60)
     client.loop_forever()
+
+    # disconnected by shutdown(): close the last window and flush every queued row
+    stopping.set()
+    window_thread.join()
+    write_window(final=True)
+    writer.close()
@@ -0,0 +1,116 @@
+import os, time, logging, datetime
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+FEATURE_STORE_DIR = os.getenv("FEATURE_STORE_DIR", "/data/features")
+SEGMENT_ROWS = int(os.getenv("SEGMENT_ROWS", "50000"))
+SEGMENT_SECONDS = float(os.getenv("SEGMENT_SECONDS", "300"))
+
+# Fixed, typed schema of the feature store; the trainer reads columns by these names.
+SCHEMA = pa.schema([
+    ("timestamp", pa.float64()),
+    ("processor_id", pa.string()),
+    ("cpu_usage", pa.float64()),
+    ("mem_usage", pa.float64()),
+    ("buffer_size", pa.float64()),
+    ("buffer_capacity", pa.float64()),
+    ("avg_latency", pa.float64()),
+    ("avg_rate", pa.float64()),
+    ("latency_p50", pa.float64()),
+    ("latency_p95", pa.float64()),
+    ("latency_p99", pa.float64()),
+    ("rate_ewma", pa.float64()),
+    ("cpu_throttled", pa.float64()),
+    ("temperature", pa.float64()),
+    ("vibration", pa.float64()),
+    ("load", pa.float64()),
+    ("temperature_max", pa.float64()),
+    ("temperature_p95", pa.float64()),
+    ("vibration_max", pa.float64()),
+    ("vibration_p95", pa.float64()),
+    ("load_max", pa.float64()),
+    ("load_p95", pa.float64()),
+    ("msg_rate", pa.float64()),
+    ("machine_count", pa.float64()),
+    ("window_seconds", pa.float64()),
+    ("assigned_machines", pa.list_(pa.string())),
+])
+
+
+def partition_of(timestamp: float) -> str:
+    """Hive-style hourly partition, e.g. date=2025-01-31/hour=13 (UTC)."""
+    t = datetime.datetime.fromtimestamp(timestamp, tz=datetime.timezone.utc)
+    return f"date={t:%Y-%m-%d}/hour={t:%H}"
+
+
+def coerce(row: dict, schema: pa.Schema = SCHEMA) -> dict:
+    """Cast a collector row to the schema types, unknown or broken values become defaults."""
+    out = {}
+    for field in schema:
+        value = row.get(field.name)
+        if pa.types.is_floating(field.type):
+            try:
+                out[field.name] = float(value) if value is not None else 0.0
+            except (TypeError, ValueError):
+                out[field.name] = 0.0
+        elif pa.types.is_list(field.type):
+            out[field.name] = [str(v) for v in value] if isinstance(value, (list, tuple)) else []
+        else:
+            out[field.name] = str(value) if value is not None else ""
+    return out
+
+
+class ParquetSink:
+    """
+    Writes the feature rows as time-partitioned Parquet segments:
+        <root>/date=YYYY-MM-DD/hour=HH/part-<first timestamp ns>.parquet
+    A segment is cut every SEGMENT_ROWS rows or SEGMENT_SECONDS, whichever comes first, and
+    written to a temp file then renamed, so readers never see a half-written file.
+    Rows not yet in a segment live only in memory (raw_events.jsonl still has them).
+    """
+
+    def __init__(self, root: str = FEATURE_STORE_DIR, schema: pa.Schema = SCHEMA,
+                 segment_rows: int = SEGMENT_ROWS, segment_seconds: float = SEGMENT_SECONDS):
+        self.root = root
+        self.schema = schema
+        self.segment_rows = segment_rows
+        self.segment_seconds = segment_seconds
+        self.pending = []
+        self.segment_started = time.time()
+        os.makedirs(root, exist_ok=True)
+
+    def write_rows(self, rows: list):
+        if not self.pending:
+            self.segment_started = time.time()
+        self.pending.extend(coerce(r, self.schema) for r in rows)
+
+        if len(self.pending) >= self.segment_rows or time.time() - self.segment_started >= self.segment_seconds:
+            self._write_segment()
+
+    def sync(self):
+        # segments are complete files once renamed; pending rows are not durable by design
+        pass
+
+    def close(self):
+        self._write_segment()
+
+    def _write_segment(self):
+        if not self.pending:
+            return
+
+        partitions = {}
+        for row in self.pending:
+            partitions.setdefault(partition_of(row["timestamp"]), []).append(row)
+
+        for partition, rows in partitions.items():
+            directory = os.path.join(self.root, partition)
+            os.makedirs(directory, exist_ok=True)
+            name = f"part-{int(rows[0]['timestamp'] * 1e9)}-{len(rows)}.parquet"
+            tmp = os.path.join(directory, f".{name}.tmp")  # dot prefix: ignored by dataset discovery
+
+            table = pa.Table.from_pylist(rows, schema=self.schema)
+            pq.write_table(table, tmp, compression="zstd")
+            os.replace(tmp, os.path.join(directory, name))
+
+        logging.debug(f"[Collector] Wrote {len(self.pending)} rows to {len(partitions)} Parquet partition(s)")
+        self.pending = []
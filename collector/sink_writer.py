@@ -0,0 +1,148 @@
+import os, csv, json, time, queue, logging, threading
+import telemetry
+
+FLUSH_ROWS = int(os.getenv("FLUSH_ROWS", "500"))
+FLUSH_INTERVAL = float(os.getenv("FLUSH_INTERVAL", "1.0"))  # seconds
+FSYNC_POLICY = os.getenv("FSYNC_POLICY", "interval")  # always | interval | never
+FSYNC_INTERVAL = float(os.getenv("FSYNC_INTERVAL", "5.0"))  # seconds, for FSYNC_POLICY=interval
+WRITE_QUEUE_SIZE = int(os.getenv("WRITE_QUEUE_SIZE", "100000"))
+
+_STOP = object()
+
+
+############################################
+# Sinks: write_rows(batch), sync(), close()
+############################################
+class CsvSink:
+    """
+    Appends rows to a CSV file with a fixed header through one open handle.
+    An existing file keeps its header, so rows stay aligned when new fields are added later.
+    """
+
+    def __init__(self, path: str, fieldnames: list):
+        needs_header = not os.path.isfile(path) or os.path.getsize(path) == 0
+        if not needs_header:
+            with open(path, newline="") as f:
+                fieldnames = next(csv.reader(f), None) or fieldnames
+        self.file = open(path, "a", newline="")
+        self.writer = csv.DictWriter(self.file, fieldnames=fieldnames, extrasaction="ignore")
+        if needs_header:
+            self.writer.writeheader()
+
+    def write_rows(self, rows: list):
+        self.writer.writerows(rows)
+        self.file.flush()
+
+    def sync(self):
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+class JsonlSink:
+    """Appends one JSON object per line through one open handle."""
+
+    def __init__(self, path: str):
+        self.file = open(path, "a")
+
+    def write_rows(self, rows: list):
+        self.file.write("".join(json.dumps(r) + "\n" for r in rows))
+        self.file.flush()
+
+    def sync(self):
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+class BufferedSinkWriter:
+    """
+    Background writer for the collector's sinks.
+    Records are queued in memory and handed to every sink in batches when FLUSH_ROWS are pending
+    or FLUSH_INTERVAL has passed. fsync follows FSYNC_POLICY. close() drains the queue, so nothing
+    queued is lost on shutdown.
+    """
+
+    def __init__(self, sinks: list,
+                 flush_rows: int = FLUSH_ROWS, flush_interval: float = FLUSH_INTERVAL,
+                 fsync_policy: str = FSYNC_POLICY, fsync_interval: float = FSYNC_INTERVAL):
+        self.sinks = sinks
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self.last_fsync = time.time()
+        self.rows_written = 0
+
+        self.queue = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+        telemetry.WRITE_QUEUE_DEPTH.set_function(self.queue.qsize)
+        self.thread = threading.Thread(target=self._run, name="sink-writer", daemon=True)
+        self.thread.start()
+
+    def write(self, record: dict):
+        """Queue a record; blocks only if the writer is WRITE_QUEUE_SIZE records behind."""
+        self.queue.put(record)
+
+    def close(self):
+        """Flush everything queued, fsync and close the sinks."""
+        if self.thread.is_alive():
+            self.queue.put(_STOP)
+            self.thread.join()
+        for sink in self.sinks:
+            sink.close()
+        logging.info(f"[Collector] Writer closed after {self.rows_written} rows")
+
+    def _run(self):
+        batch = []
+        deadline = time.time() + self.flush_interval
+
+        while True:
+            try:
+                item = self.queue.get(timeout=max(0.0, deadline - time.time()))
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._flush(batch)
+                self._sync()
+                return
+            if item is not None:
+                batch.append(item)
+
+            if len(batch) >= self.flush_rows or time.time() >= deadline:
+                self._flush(batch)
+                batch = []
+                deadline = time.time() + self.flush_interval
+
+    def _flush(self, batch: list):
+        if not batch:
+            return
+        for sink in self.sinks:
+            name = type(sink).__name__
+            try:
+                with telemetry.FLUSH_SECONDS.labels(name).time():
+                    sink.write_rows(batch)
+                telemetry.ROWS_WRITTEN.labels(name).inc(len(batch))
+            except Exception as e:
+                telemetry.WRITE_ERRORS.labels(name).inc()
+                logging.error(f"[Collector] {name} failed to write {len(batch)} rows: {e}")
+        self.rows_written += len(batch)
+
+        now = time.time()
+        if self.fsync_policy == "always" or (
+            self.fsync_policy == "interval" and now - self.last_fsync >= self.fsync_interval
+        ):
+            self._sync()
+            self.last_fsync = now
+
+    def _sync(self):
+        if self.fsync_policy == "never":
+            return
+        with telemetry.FSYNC_SECONDS.time():
+            for sink in self.sinks:
+                try:
+                    sink.sync()
+                except Exception as e:
+                    logging.error(f"[Collector] {type(sink).__name__} failed to sync: {e}")
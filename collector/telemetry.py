@@ -0,0 +1,21 @@
+import os, logging
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))  # Prometheus /metrics, 0 = off
+
+FLUSH_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+MESSAGES = Counter("collector_messages_total", "MQTT messages received, by kind", ["kind"])
+UNASSIGNED = Counter("collector_unassigned_readings_total", "Readings dropped because no processor claims the machine")
+WINDOW_ROWS = Counter("collector_window_rows_total", "Feature rows produced by closed windows")
+ROWS_WRITTEN = Counter("collector_rows_written_total", "Rows written, by sink", ["sink"])
+WRITE_ERRORS = Counter("collector_write_errors_total", "Failed batch writes, by sink", ["sink"])
+FLUSH_SECONDS = Histogram("collector_flush_seconds", "Time to write one batch, by sink", ["sink"], buckets=FLUSH_BUCKETS)
+FSYNC_SECONDS = Histogram("collector_fsync_seconds", "Time to fsync every sink", buckets=FLUSH_BUCKETS)
+WRITE_QUEUE_DEPTH = Gauge("collector_write_queue_depth", "Rows queued for the sink writer")
+
+
+def serve(port: int = METRICS_PORT):
+    if port > 0:
+        start_http_server(port)
+        logging.info(f"[Collector] Serving Prometheus metrics on :{port}/metrics")
@@ -0,0 +1,218 @@
+import os, sys, json, time, random, asyncio, logging, threading, statistics
+from paho.mqtt.client import Client, MQTT_ERR_SUCCESS
+from paho.mqtt.enums import CallbackAPIVersion
+
+logging.basicConfig(
+    level=logging.INFO,
+    handlers=[logging.StreamHandler(sys.stdout)],
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+############################################
+# CONFIG
+############################################
+BROKER_HOST = os.getenv("MQTT_BROKER", "localhost")
+BROKER_PORT = int(os.getenv("MQTT_PORT", "1883"))
+MACHINES = int(os.getenv("MACHINES", "1000"))  # virtual machines in this process
+MACHINE_PREFIX = os.getenv("MACHINE_PREFIX", "machine-sim")
+# Readings per second per machine: one number for all machines, or "low:high" for a uniform spread
+RATE = os.getenv("RATE", "1.0")
+JITTER = float(os.getenv("JITTER", "0.1"))  # +/- fraction of the interval added to every send
+QOS = int(os.getenv("QOS", "0"))
+PAYLOAD_BYTES = int(os.getenv("PAYLOAD_BYTES", "0"))  # pad readings up to this size, 0 = no padding
+CONNECTIONS = int(os.getenv("CONNECTIONS", "4"))  # MQTT connections the machines are spread over
+LAG_SAMPLE = int(os.getenv("LAG_SAMPLE", "50"))  # machines whose topics are subscribed back for broker lag
+REPORT_INTERVAL = float(os.getenv("REPORT_INTERVAL", "5"))  # seconds
+DURATION = float(os.getenv("DURATION", "0"))  # seconds, 0 = run until stopped
+SEED = os.getenv("SEED")
+# Retained list of the virtual machines, the scheduler assigns them like machine pods; cleared by
+# the last will when the generator goes away
+REGISTRY_TOPIC = f"machines/{MACHINE_PREFIX}"
+
+
+def parse_rate(spec: str):
+    """(low, high) readings per second from "1.5" or "0.5:5"."""
+    low, _, high = spec.partition(":")
+    low = float(low)
+    return low, float(high) if high else low
+
+
+def reading(rng: random.Random) -> dict:
+    """One sensor reading, same ranges as machine.py."""
+    return {
+        "temperature": round(rng.uniform(60, 100), 2),
+        "vibration": round(rng.uniform(0.2, 1.5), 3),
+        "load": round(rng.uniform(10, 80), 2),
+    }
+
+
+def encode(data: dict, size: int = PAYLOAD_BYTES) -> bytes:
+    payload = json.dumps(data, separators=(",", ":"))
+    if len(payload) < size:
+        data = dict(data, pad="x" * (size - len(payload) - len(',"pad":""')))
+        payload = json.dumps(data, separators=(",", ":"))
+    return payload.encode()
+
+
+class LoadStats:
+    """Counters of one report interval; publishes come from the event loop, lag samples from paho's thread."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.published = 0
+        self.failed = 0
+        self.bytes = 0
+        self.lags = []
+        self.total = 0
+        self.since = time.time()
+
+    def sent(self, size: int, ok: bool):
+        with self.lock:
+            if ok:
+                self.published += 1
+                self.bytes += size
+            else:
+                self.failed += 1
+
+    def lag(self, seconds: float):
+        with self.lock:
+            self.lags.append(seconds)
+
+    def take(self) -> dict:
+        now = time.time()
+        with self.lock:
+            elapsed = max(now - self.since, 1e-6)
+            lags, published, failed, size = self.lags, self.published, self.failed, self.bytes
+            self.lags, self.published, self.failed, self.bytes, self.since = [], 0, 0, 0, now
+            self.total += published
+        report = {
+            "rate": round(published / elapsed, 1),
+            "mbit": round(8 * size / elapsed / 1e6, 3),
+            "failed": failed,
+            "total": self.total,
+            "lag_samples": len(lags),
+        }
+        if len(lags) >= 2:
+            cuts = statistics.quantiles(lags, n=100)
+            report.update(lag_p50_ms=round(cuts[49] * 1000, 1), lag_p99_ms=round(cuts[98] * 1000, 1),
+                          lag_max_ms=round(max(lags) * 1000, 1))
+        return report
+
+
+############################################
+# MQTT
+############################################
+def connect(client_id: str) -> Client:
+    client = Client(CallbackAPIVersion.VERSION2, client_id=client_id)
+    client.max_inflight_messages_set(1000)
+    client.connect(BROKER_HOST, BROKER_PORT, 60)
+    client.loop_start()
+    return client
+
+
+def register(machines: list) -> Client:
+    """Announce the machines on REGISTRY_TOPIC on every (re)connect, so the scheduler assigns them."""
+    def on_connect(client, userdata, flags, rc, properties=None):
+        client.publish(REGISTRY_TOPIC, json.dumps({"machines": machines}), qos=1, retain=True)
+
+    client = Client(CallbackAPIVersion.VERSION2, client_id=f"{MACHINE_PREFIX}-registry")
+    client.will_set(REGISTRY_TOPIC, payload=None, qos=1, retain=True)
+    client.on_connect = on_connect
+    client.connect(BROKER_HOST, BROKER_PORT, 60)
+    client.loop_start()
+    return client
+
+
+def track_lag(machines: list, stats: LoadStats) -> Client:
+    """Subscribe back to a sample of our own topics; lag = broker delivery time - sent_at (same host clock)."""
+    def on_message(client, userdata, msg):
+        try:
+            sent_at = json.loads(msg.payload)["sent_at"]
+        except (ValueError, KeyError, TypeError):
+            return
+        stats.lag(time.time() - sent_at)
+
+    def on_connect(client, userdata, flags, rc, properties=None):
+        client.subscribe([(f"data/{m}", QOS) for m in machines])
+
+    client = Client(CallbackAPIVersion.VERSION2, client_id=f"{MACHINE_PREFIX}-lag")
+    client.on_connect = on_connect
+    client.on_message = on_message
+    client.connect(BROKER_HOST, BROKER_PORT, 60)
+    client.loop_start()
+    return client
+
+
+############################################
+# LOAD
+############################################
+async def run_machine(machine_id: str, rate: float, client: Client, stats: LoadStats, rng: random.Random):
+    """Publish `rate` readings per second on data/<machine_id>, on an absolute schedule so jitter never drifts."""
+    interval = 1.0 / rate
+    topic = f"data/{machine_id}"
+    loop = asyncio.get_running_loop()
+    next_at = loop.time() + rng.uniform(0, interval)  # spread the machines' phases
+    while True:
+        delay = next_at + rng.uniform(-JITTER, JITTER) * interval - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        payload = encode({**reading(rng), "sent_at": time.time()})
+        info = client.publish(topic, payload, qos=QOS)
+        stats.sent(len(payload), info.rc == MQTT_ERR_SUCCESS)
+        next_at += interval
+
+
+async def report_loop(stats: LoadStats, target_rate: float):
+    while True:
+        await asyncio.sleep(REPORT_INTERVAL)
+        report = stats.take()
+        logging.info(f"[LOADGEN] {report['rate']}/s of {target_rate:.1f}/s target, {report['mbit']} Mbit/s, "
+                     f"failed={report['failed']}, total={report['total']}, lag p50/p99/max="
+                     f"{report.get('lag_p50_ms')}/{report.get('lag_p99_ms')}/{report.get('lag_max_ms')} ms "
+                     f"({report['lag_samples']} samples)")
+
+
+async def main():
+    rng = random.Random(SEED)
+    low, high = parse_rate(RATE)
+    machines = [f"{MACHINE_PREFIX}-{i:05d}" for i in range(MACHINES)]
+    rates = {m: rng.uniform(low, high) for m in machines}
+    target_rate = sum(rates.values())
+
+    stats = LoadStats()
+    registry_client = register(machines)
+    clients = [connect(f"{MACHINE_PREFIX}-pub-{i}") for i in range(max(CONNECTIONS, 1))]
+    lag_client = track_lag(rng.sample(machines, min(LAG_SAMPLE, len(machines))), stats) if LAG_SAMPLE > 0 else None
+    logging.info(f"[LOADGEN] {MACHINES} machines at {RATE}/s each ({target_rate:.1f}/s total), qos={QOS}, "
+                 f"jitter={JITTER}, payload>={PAYLOAD_BYTES}B over {len(clients)} connections to {BROKER_HOST}")
+
+    # machines drawn at rate 0 are registered but stay silent, like an idle machine
+    idle = sum(1 for m in machines if rates[m] <= 0)
+    if idle:
+        logging.info(f"[LOADGEN] {idle} machines idle at rate 0")
+    tasks = [asyncio.create_task(run_machine(m, rates[m], clients[i % len(clients)], stats, random.Random(rng.random())))
+             for i, m in enumerate(machines) if rates[m] > 0]
+    tasks.append(asyncio.create_task(report_loop(stats, target_rate)))
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=DURATION if DURATION > 0 else None,
+                                     return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            task.result()  # re-raise whatever stopped a machine or the reporter
+    finally:
+        for task in tasks:
+            task.cancel()
+        try:
+            registry_client.publish(REGISTRY_TOPIC, None, qos=1, retain=True).wait_for_publish(5)
+        except (RuntimeError, ValueError) as e:
+            logging.warning(f"[LOADGEN] Could not clear {REGISTRY_TOPIC}: {e}")
+        for client in clients + [registry_client] + ([lag_client] if lag_client else []):
+            client.loop_stop()
+            client.disconnect()
+        logging.info(f"[LOADGEN] Done, {stats.take()['total']} readings published")
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -10,8 +10,28 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 machine_id = os.getenv("MACHINE_ID", "machine-unknown")
 broker_host = os.getenv("MQTT_BROKER", "localhost")
 interval = float(os.getenv("INTERVAL", 1.0))
+# Retained {"rate": readings per second}, set by the shift scenario; overrides INTERVAL
+RATE_TOPIC = "control/machines/rate"
+
+
+def on_connect(client, userdata, flags, rc, properties=None):
+    client.subscribe(RATE_TOPIC, qos=1)
+
+
+def on_rate(client, userdata, msg):
+    global interval
+    try:
+        rate = float(json.loads(msg.payload)["rate"])
+    except (ValueError, KeyError, TypeError):
+        return
+    if rate > 0:
+        interval = 1.0 / rate
+        logging.info(f"[SIM] {machine_id} rate set to {rate}/s")
+
 
 client = Client(CallbackAPIVersion.VERSION2)
+client.on_connect = on_connect
+client.message_callback_add(RATE_TOPIC, on_rate)
 client.connect(broker_host, 1883, 60)
 client.loop_start()
 
@@ -24,5 +44,5 @@ while True:
 
     topic = f"data/{machine_id}"
     client.publish(topic, json.dumps(data))
-    logging.info(f"[SIM] {machine_id} => {data}")
+    logging.debug(f"[SIM] {machine_id} => {data}")
     time.sleep(interval)
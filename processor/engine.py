@@ -0,0 +1,166 @@
+import os, time, threading
+import numpy as np
+
+# Columns of every machine's ring buffer
+COLUMNS = ["timestamp", "temperature", "vibration", "load"]
+SENSORS = slice(1, None)
+
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", "64"))  # readings per micro-batch
+BATCH_DEADLINE_MS = float(os.getenv("BATCH_DEADLINE_MS", "50"))  # max wait after the first reading of a batch
+ROLLING_WINDOW = int(os.getenv("ROLLING_WINDOW", "50"))  # readings per machine in the rolling statistics
+ANOMALY_Z = float(os.getenv("ANOMALY_Z", "3.0"))
+# Optional stand-in for heavier per-reading work (the old per-message sleep), 0 = off
+SIMULATED_WORK_PER_ITEM_MS = float(os.getenv("SIMULATED_WORK_PER_ITEM_MS", "0"))
+
+STAGES = ["ingest", "stats", "score", "work"]
+
+
+def to_float(value) -> float:
+    """A reading field as float; missing or non-numeric values become NaN instead of failing the batch."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class MachineRing:
+    """Preallocated (capacity x COLUMNS) float64 ring of one machine's most recent readings."""
+
+    def __init__(self, capacity: int):
+        self.data = np.full((capacity, len(COLUMNS)), np.nan)
+        self.capacity = capacity
+        self.head = 0  # next row to write
+        self.count = 0
+
+    def extend(self, rows: np.ndarray):
+        n = len(rows)
+        if n >= self.capacity:
+            self.data[:] = rows[-self.capacity:]
+            self.head, self.count = 0, self.capacity
+            return
+        end = self.head + n
+        if end <= self.capacity:
+            self.data[self.head:end] = rows
+        else:
+            split = self.capacity - self.head
+            self.data[self.head:] = rows[:split]
+            self.data[:end - self.capacity] = rows[split:]
+        self.head = end % self.capacity
+        self.count = min(self.count + n, self.capacity)
+
+    def last(self, n: int) -> np.ndarray:
+        """The newest min(n, count) rows, oldest first."""
+        n = min(n, self.count)
+        idx = (self.head - n + np.arange(n)) % self.capacity
+        return self.data[idx]
+
+    def window(self, n: int) -> np.ndarray:
+        """The newest n rows padded with NaN at the front, so windows of all machines stack."""
+        out = np.full((n, len(COLUMNS)), np.nan)
+        rows = self.last(n)
+        if len(rows):
+            out[n - len(rows):] = rows
+        return out
+
+
+class MicroBatchEngine:
+    """
+    Per-machine ring buffers plus the batched workload. process() takes a micro-batch of
+    (machine, reading, received_at) and runs every stage as array math over the whole batch:
+      ingest - one (n x COLUMNS) array, scattered into the machines' rings
+      stats  - rolling mean / std per machine over the last ROLLING_WINDOW readings (NaN-padded stack)
+      score  - z-score of every reading in the batch against its machine's statistics
+      work   - SIMULATED_WORK_PER_ITEM_MS per reading, if configured
+    Stage timings accumulate until take_stage_ms() reads and resets them.
+    """
+
+    def __init__(self, capacity: int, window: int = ROLLING_WINDOW, anomaly_z: float = ANOMALY_Z):
+        self.capacity = max(capacity, window)
+        self.window = window
+        self.anomaly_z = anomaly_z
+        self.rings = {}
+        self.lock = threading.Lock()
+        self.stage_seconds = dict.fromkeys(STAGES, 0.0)
+        self.batches = 0
+        self.anomalies = 0
+        self.last_scores = {}  # machine -> newest anomaly score
+
+    def ring(self, machine: str) -> MachineRing:
+        ring = self.rings.get(machine)
+        if ring is None:
+            ring = self.rings[machine] = MachineRing(self.capacity)
+        return ring
+
+    def process(self, batch: list) -> np.ndarray:
+        """Run one micro-batch; returns the anomaly score of each reading, in batch order."""
+        t0 = time.perf_counter()
+        machines = [m for m, _, _ in batch]
+        values = np.array([[to_float(r.get(c)) if c != "timestamp" else t for c in COLUMNS]
+                           for _, r, t in batch], dtype=np.float64)
+        names, inverse = np.unique(machines, return_inverse=True)
+
+        with self.lock:
+            for i, machine in enumerate(names):
+                self.ring(machine).extend(values[inverse == i])
+            t1 = time.perf_counter()
+
+            # nanmean / nanstd by hand: an all-NaN window (a sensor that never sent a number) gives NaN
+            # statistics, and a zero score below, without a RuntimeWarning per batch
+            windows = np.stack([self.rings[m].window(self.window)[:, SENSORS] for m in names])
+            valid = ~np.isnan(windows)
+            count = valid.sum(axis=1)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                mean = np.where(valid, windows, 0.0).sum(axis=1) / count
+                std = np.sqrt(np.where(valid, (windows - mean[:, None]) ** 2, 0.0).sum(axis=1) / count)
+            t2 = time.perf_counter()
+
+            z = np.abs(values[:, SENSORS] - mean[inverse]) / np.where(std[inverse] > 0, std[inverse], np.inf)
+            scores = np.nan_to_num(z).max(axis=1)
+            self.anomalies += int((scores > self.anomaly_z).sum())
+            for i, machine in enumerate(names):
+                self.last_scores[machine] = float(scores[inverse == i][-1])
+            t3 = time.perf_counter()
+
+        if SIMULATED_WORK_PER_ITEM_MS > 0:
+            time.sleep(SIMULATED_WORK_PER_ITEM_MS * len(batch) / 1000.0)
+        t4 = time.perf_counter()
+
+        with self.lock:
+            for stage, seconds in zip(STAGES, (t1 - t0, t2 - t1, t3 - t2, t4 - t3)):
+                self.stage_seconds[stage] += seconds
+            self.batches += 1
+        return scores
+
+    def drop(self, machines):
+        """Forget the rings and scores of machines this processor no longer handles."""
+        with self.lock:
+            for machine in machines:
+                self.rings.pop(machine, None)
+                self.last_scores.pop(machine, None)
+
+    def take_stage_ms(self) -> dict:
+        """Mean milliseconds per batch of every stage since the previous call, plus the batch count."""
+        with self.lock:
+            batches = self.batches
+            out = {s: round(1000.0 * v / batches, 3) if batches else 0.0 for s, v in self.stage_seconds.items()}
+            self.stage_seconds = dict.fromkeys(STAGES, 0.0)
+            self.batches = 0
+        out["batches"] = batches
+        return out
+
+    def held(self) -> int:
+        """Readings currently held across all rings."""
+        with self.lock:
+            return sum(r.count for r in self.rings.values())
+
+    def export(self) -> dict:
+        """{machine: rows oldest first} of every ring, for snapshots."""
+        with self.lock:
+            return {m: r.last(r.count) for m, r in self.rings.items() if r.count}
+
+    def load(self, rings: dict):
+        """Replace the rings with restored {machine: rows oldest first}."""
+        with self.lock:
+            self.rings = {}
+            for machine, rows in rings.items():
+                self.ring(machine).extend(np.asarray(rows, dtype=np.float64).reshape(-1, len(COLUMNS)))
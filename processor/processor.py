@@ -1,11 +1,15 @@
-import os,json,time,threading,statistics,logging,sys, random
+import os,json,time,threading,logging,sys, queue
 import paho.mqtt.client as mqtt
-from collections import deque
-import psutil
+from window_stats import SlidingRate, EwmaRate, LatencyHistogram
+from resource_sampler import ResourceSampler
+from snapshot import SnapshotWriter, SnapshotRestorer
+from engine import MicroBatchEngine, BATCH_SIZE, BATCH_DEADLINE_MS
+from subscriptions import data_topics
+import telemetry
 from paho.mqtt.enums import CallbackAPIVersion
 
 logging.basicConfig(
-    level=logging.INFO,
+    level=os.getenv("LOG_LEVEL", "INFO"),
     handlers=[logging.StreamHandler(sys.stdout)],
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
@@ -13,81 +17,363 @@ logging.basicConfig(
 BROKER = os.getenv("MQTT_BROKER", "mqtt-broker")
 PROCESSOR_ID = os.getenv("CLIENT_ID", "unknown")
 HOSTNAME = os.getenv("HOSTNAME", "unknown")
-DATA_TOPIC = "data/#"  # subscribe to all IoT simulator topics
+ASSIGNMENT_TOPIC = f"assignments/{PROCESSOR_ID}"
+# Unassigned processors split data/# through an MQTT shared subscription; empty disables it.
+SHARED_GROUP = os.getenv("SHARED_SUBSCRIPTION_GROUP", "processors")
 STATE_TOPIC = f"state/{PROCESSOR_ID}"
 BUFFER_TOPIC = f"buffer/{PROCESSOR_ID}"
 METRICS_TOPIC = f"metrics/{PROCESSOR_ID}"
 MAXLEN = int(os.getenv("MAXLEN", "30"))
 STATE_INTERVAL = 5  # seconds
-ASSIGNED_MACHINES = os.getenv(f"ASSIGNED_MACHINES_{HOSTNAME.replace('-', '_')}", "").split(",")
+ASSIGNED_MACHINES = [m for m in os.getenv(f"ASSIGNED_MACHINES_{HOSTNAME.replace('-', '_')}", "").split(",") if m]
+assignment_received = bool(ASSIGNED_MACHINES)  # after the first assignment the shared group is never used again
 
 PROCESSOR_MODE = os.getenv("PROCESSOR_MODE", "ACTIVE")  # ACTIVE | PREWARM
 PREWARM_TOPIC = f"prewarm/{PROCESSOR_ID}/#"
+# Retained registration, updated on every mode transition; the last will clears it when the pod dies
+REGISTRY_TOPIC = f"registry/{PROCESSOR_ID}"
+HYDRATE_TIMEOUT = float(os.getenv("HYDRATE_TIMEOUT", "5"))  # seconds to wait for the source's snapshot
 mode = PROCESSOR_MODE  # runtime mode: ACTIVE, PREWARM, HYDRATING, READY
-
-buffer = deque(maxlen=MAXLEN)
-metrics = {"processed": 0, "avg_rate": 0.0, "avg_latency": 0.0}
-processing_times = deque(maxlen=MAXLEN)
+# Ack of the first message processed after start (ACTIVE pods) or activation (prewarm pods);
+# benchmarks measure both start paths up to this ack
+ACTIVATED_TOPIC = f"activated/{PROCESSOR_ID}"
+started_at = time.time()
+activated_at = started_at if mode == "ACTIVE" else None
+awaiting_first = mode == "ACTIVE"
+
+# Ingest pipeline: the MQTT network thread only enqueues, WORKER_THREADS drain the queue.
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "1000"))
+WORKER_THREADS = int(os.getenv("WORKER_THREADS", "4"))
+INGEST_OVERFLOW = os.getenv("INGEST_OVERFLOW", "block")  # block | drop_oldest
+INGEST_BLOCK_TIMEOUT = float(os.getenv("INGEST_BLOCK_TIMEOUT", "1.0"))  # seconds
+
+# Per-machine NumPy ring buffers and the batched workload (engine.py)
+engine = MicroBatchEngine(capacity=MAXLEN)
+metrics = {"processed": 0, "dropped": 0, "avg_rate": 0.0, "avg_latency": 0.0}
+# Current throughput and tail latency over sliding windows (RATE_WINDOW, LATENCY_WINDOW)
+throughput = SlidingRate()
+throughput_ewma = EwmaRate()
+latency_hist = LatencyHistogram()
+# cpu/memory relative to this pod's own cgroup limits, not the node's
+resources = ResourceSampler()
 last_publish_time = time.time()
+machine_counts = {}  # messages per machine since the last metrics publish
+last_rate_reset = time.time()
+
+# Retained snapshot/<id> (+ /delta) topics other pods hydrate from
+snapshot_writer = SnapshotWriter(PROCESSOR_ID)
+restorer = None  # SnapshotRestorer while HYDRATING, and while READY to follow the source's deltas
+hydration = {}  # outcome of the last hydration, carried in the registration
+restored_machines = []  # the source's assignment in the restored snapshot
+hydration_lock = threading.Lock()
+
+ingest_queue = queue.Queue(maxsize=INGEST_QUEUE_SIZE)
+state_lock = threading.Lock()  # guards metrics, the rate/latency windows and last_publish_time
+subscription_lock = threading.Lock()  # guards subscribed_topics, ASSIGNED_MACHINES and assignment_received
+subscribed_topics = set()
 
 mqtt_client = mqtt.Client(callback_api_version=CallbackAPIVersion.VERSION2, client_id=PROCESSOR_ID)
+# Control commands use their own connection so they never queue behind data on the socket.
+control_client = mqtt.Client(callback_api_version=CallbackAPIVersion.VERSION2, client_id=f"{PROCESSOR_ID}-control")
+control_client.will_set(REGISTRY_TOPIC, payload=None, qos=1, retain=True)
 
 def on_connect(client, userdata, flags, rc, properties=None):
     if rc == 0:
         logging.info(f"[{PROCESSOR_ID}] Connected to MQTT broker at {BROKER}")
-        client.subscribe(DATA_TOPIC)
-        client.subscribe(PREWARM_TOPIC)
+        # clean session: the broker forgot our subscriptions, start from scratch
+        with subscription_lock:
+            subscribed_topics.clear()
+        apply_assignment(ASSIGNED_MACHINES)
     else:
         logging.info(f"[{PROCESSOR_ID}] Connection failed with code {rc}")
 
-def on_message(client, userdata, msg):
-    global last_publish_time, mode, metrics
+def on_control_connect(client, userdata, flags, rc, properties=None):
+    if rc == 0:
+        logging.info(f"[{PROCESSOR_ID}] Control channel connected to {BROKER}")
+        client.subscribe(PREWARM_TOPIC)
+        client.subscribe(ASSIGNMENT_TOPIC, qos=1)
+        register()
+    else:
+        logging.info(f"[{PROCESSOR_ID}] Control channel connection failed with code {rc}")
 
+def on_control_message(client, userdata, msg):
+    """Fast path: prewarm, assignment and snapshot messages are handled inline on the control connection."""
+    if msg.topic == ASSIGNMENT_TOPIC:
+        on_assignment(msg)
+        return
+    if msg.topic.startswith("snapshot/"):
+        on_snapshot(msg)
+        return
     check_commands(msg)
 
-    if mode == "PREWARM":
-        # ignore real processing
+############################################
+# SUBSCRIPTION MANAGEMENT
+############################################
+def apply_assignment(machines, received=False):
+    """
+    Diff the wanted data subscriptions against the current ones and apply in place.
+    received: the list comes from the scheduler, so from now on it is followed exactly.
+    """
+    global ASSIGNED_MACHINES, assignment_received
+
+    with subscription_lock:
+        left = set(ASSIGNED_MACHINES) - set(machines)
+        ASSIGNED_MACHINES = list(machines)
+        assignment_received = assignment_received or received
+        wanted = data_topics(mode == "ACTIVE", ASSIGNED_MACHINES, assignment_received, SHARED_GROUP)
+        removed = subscribed_topics - wanted
+        added = wanted - subscribed_topics
+
+        if removed:
+            mqtt_client.unsubscribe(sorted(removed))
+        if added:
+            mqtt_client.subscribe([(t, 0) for t in sorted(added)])
+
+        subscribed_topics.difference_update(removed)
+        subscribed_topics.update(added)
+
+    # the rings of machines that moved elsewhere would otherwise stay in memory and snapshots forever
+    engine.drop(left)
+
+    if added or removed:
+        logging.info(f"[{PROCESSOR_ID}] Subscriptions updated: +{sorted(added)} -{sorted(removed)}")
+
+def on_assignment(msg):
+    """Payload is a JSON list of machine ids, or {"machines": [...]}; empty means no machines."""
+    try:
+        payload = json.loads(msg.payload.decode()) if msg.payload else []
+        machines = payload.get("machines", []) if isinstance(payload, dict) else payload
+        apply_assignment([str(m) for m in machines if m], received=True)
+    except Exception as e:
+        logging.error(f"[{PROCESSOR_ID}] Bad assignment payload on {msg.topic}: {e}")
+
+def on_message(client, userdata, msg):
+    """Runs on paho's network thread: hand data to the worker pool."""
+    if mode != "ACTIVE":
+        # ignore real processing until activated
         return
 
-    if msg.topic.startswith("state/"):
-        # when hydrating, load this state
-        if mode == "HYDRATING":
+    enqueue(msg.topic, msg.payload)
+
+def enqueue(topic, payload):
+    """
+    Put a data message on the ingest queue. When the queue is full:
+      block       - stall the network thread (TCP backpressure towards the broker) for up to
+                    INGEST_BLOCK_TIMEOUT, then drop the message
+      drop_oldest - evict the oldest queued message to make room
+    """
+    item = (topic, payload, time.time())
+
+    if INGEST_OVERFLOW == "drop_oldest":
+        while True:
             try:
-                state = json.loads(msg.payload.decode())
-                buffer.clear()
-                for item in state.get("buffer", []):
-                    buffer.append(item)
-                metrics.update(state.get("metrics", {}))
-                mode = "READY"
-                logging.info("[PROC] Hydration complete → READY")
-            except:
-                logging.error("[PROC] Bad state hydration payload")
-
-    start_time = time.time()
-    payload = msg.payload.decode()
+                ingest_queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    ingest_queue.get_nowait()
+                    count_drop()
+                except queue.Empty:
+                    pass
+
+    try:
+        ingest_queue.put(item, timeout=INGEST_BLOCK_TIMEOUT)
+    except queue.Full:
+        count_drop()
+
+def count_drop():
+    telemetry.DROPPED.inc()
+    with state_lock:
+        metrics["dropped"] += 1
+        dropped = metrics["dropped"]
+    if dropped % 100 == 1:
+        logging.warning(f"[{PROCESSOR_ID}] Ingest queue full ({INGEST_QUEUE_SIZE}), dropped {dropped} messages so far")
+
+def next_batch():
+    """Block for one message, then take more until BATCH_SIZE or BATCH_DEADLINE_MS after the first."""
+    batch = [ingest_queue.get()]
+    deadline = time.time() + BATCH_DEADLINE_MS / 1000.0
+    while len(batch) < BATCH_SIZE:
+        remaining = deadline - time.time()
+        try:
+            batch.append(ingest_queue.get(timeout=remaining) if remaining > 0 else ingest_queue.get_nowait())
+        except queue.Empty:
+            break
+    return batch
+
+def worker_loop():
+    """Drain the ingest queue in micro-batches; WORKER_THREADS of these run concurrently."""
+    while True:
+        batch = next_batch()
+        try:
+            process_batch(batch)
+        except Exception as e:
+            logging.error(f"[{PROCESSOR_ID}] Failed to process a batch of {len(batch)} messages: {e}")
+
+def decode_reading(payload):
     try:
         data = json.loads(payload)
-    except json.JSONDecodeError:
-        data = {"raw": payload}
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return {}
+    return data if isinstance(data, dict) else {}
 
-    # Simulate processing workload
-    time.sleep(random.uniform(0.05, 0.15))
+def process_batch(batch):
+    global last_publish_time, awaiting_first
 
-    buffer.append(data)
-    processing_times.append(time.time() - start_time)
-    metrics["processed"] += 1
+    readings = [(topic.split("/", 1)[1], decode_reading(payload), received) for topic, payload, received in batch]
+    with telemetry.BATCH_SECONDS.time():
+        scores = engine.process(readings)
+    telemetry.BATCH_SIZE.observe(len(readings))
+    telemetry.MESSAGES.inc(len(readings))
+    telemetry.ANOMALIES.inc(int((scores > engine.anomaly_z).sum()))
 
     now = time.time()
-    if now - last_publish_time >= STATE_INTERVAL:
+    with state_lock:
+        for machine, _, received in readings:
+            # end to end: queueing, batching and the batch's processing
+            latency_hist.record(now - received, now)
+            telemetry.LATENCY.observe(now - received)
+            machine_counts[machine] = machine_counts.get(machine, 0) + 1
+            snapshot_writer.note_append(machine)
+        throughput.add(len(readings), now)
+        throughput_ewma.add(len(readings), now)
+        metrics["processed"] += len(readings)
+        publish_due = now - last_publish_time >= STATE_INTERVAL
+        if publish_due:
+            last_publish_time = now
+
+    if awaiting_first:
+        with state_lock:
+            first, awaiting_first = awaiting_first, False
+        if first:
+            publish_activated(min(received for _, _, received in readings), now)
+
+    if publish_due:
         publish_all()
-        last_publish_time = now
+
+def publish_activated(first_received_at, first_message_at):
+    control_client.publish(ACTIVATED_TOPIC, json.dumps({
+        "processor_id": PROCESSOR_ID,
+        "origin": PROCESSOR_MODE.lower(),
+        "started_at": started_at,
+        "activated_at": activated_at,
+        "first_received_at": first_received_at,
+        "first_message_at": first_message_at,
+    }), qos=1)
+    logging.info(f"[PROC] First message processed {(first_message_at - (activated_at or started_at)) * 1000.0:.1f} ms after activation")
 
 ############################################
 # HYDRATION + ACTIVATION CHECK
 ############################################
-def check_commands(msg):
-    global mode
+def register():
+    """Publish this pod's current mode (and last hydration) on its retained registry topic."""
+    control_client.publish(REGISTRY_TOPIC, json.dumps({
+        "processor_id": PROCESSOR_ID,
+        "mode": mode,
+        "origin": PROCESSOR_MODE.lower(),  # prewarm pods belong to the scheduler's pool
+        "timestamp": time.time(),
+        **hydration,
+    }), qos=1, retain=True)
+
+def set_mode(new_mode):
+    global mode, activated_at, awaiting_first
+    if new_mode == "ACTIVE" and mode != "ACTIVE":
+        activated_at, awaiting_first = time.time(), True
+    mode = new_mode
+    telemetry.MODE.state(mode)
+    register()
+
+def start_hydration(payload):
+    """Hydrate payload: {"source": "<processor id>"}; restore that processor's retained snapshot."""
+    global restorer
 
+    try:
+        source = json.loads(payload.decode()).get("source")
+    except Exception:
+        source = None
+
+    with hydration_lock:
+        set_mode("HYDRATING")
+        if source:
+            restorer = SnapshotRestorer(source, engine.capacity)
+            control_client.subscribe([(t, 1) for t in restorer.topics()])
+            threading.Timer(HYDRATE_TIMEOUT, hydration_timeout, args=(restorer,)).start()
+            logging.info(f"[PROC] Hydrating from {source}")
+            return
+    finish_hydration(None, "no source")
+
+def on_snapshot(msg):
+    with hydration_lock:
+        current = restorer
+    if current is None or mode not in ("HYDRATING", "READY"):
+        return
+    try:
+        state = current.offer(msg.topic, msg.payload)
+    except Exception as e:
+        logging.error(f"[PROC] Bad snapshot on {msg.topic}: {e}")
+        return
+    if not state:
+        return
+    if mode == "HYDRATING":
+        finish_hydration(state, "restored", current)
+    else:
+        catch_up(state, current)
+
+def catch_up(state, expected):
+    """READY: apply a newer snapshot of the source, so activation starts from its latest rows."""
+    global restored_machines
+
+    with hydration_lock:
+        if mode != "READY" or restorer is not expected:
+            return  # activated meanwhile, the rings are live now
+        engine.load(state["rings"])
+        restored_machines = [str(m) for m in state["machines"] if m]
+        with state_lock:
+            metrics.update({k: v for k, v in state["metrics"].items() if k in metrics})
+        hydration.update(version=state["version"], buffer_size=engine.held())
+    logging.debug(f"[PROC] Caught up with {expected.source} (version {state['version']})")
+
+def stop_following():
+    """Drop the snapshot subscriptions of the hydration source. Caller holds hydration_lock."""
+    global restorer
+    if restorer:
+        control_client.unsubscribe(restorer.topics())
+        restorer = None
+
+def hydration_timeout(expected):
+    finish_hydration(None, "timeout", expected)
+
+def finish_hydration(state, status, expected=None):
+    """
+    Apply the restored state (None = start cold) and register as READY with the state's version.
+    After a restore the source's snapshot topics stay subscribed until activation.
+    """
+    global hydration, restored_machines
+
+    with hydration_lock:
+        if mode != "HYDRATING" or restorer is not expected:
+            return  # the snapshot and the timeout raced, the other one already finished
+        source = restorer.source if restorer else None
+        if not state:
+            stop_following()
+
+        if state:
+            engine.load(state["rings"])
+            restored_machines = [str(m) for m in state["machines"] if m]
+            with state_lock:
+                metrics.update({k: v for k, v in state["metrics"].items() if k in metrics})
+
+        hydration = {
+            "status": status,
+            "source": source,
+            "version": state["version"] if state else 0,
+            "buffer_size": engine.held(),
+            "restore_ms": state["restore_ms"] if state else None,
+        }
+        set_mode("READY")
+    logging.info(f"[PROC] Hydration {status} → READY (version {hydration['version']}, {hydration['buffer_size']} buffered)")
+
+def check_commands(msg):
     topic = msg.topic
     cmd = ""
 
@@ -101,26 +387,66 @@ def check_commands(msg):
 
     if cmd == "hydrate" and mode == "PREWARM":
         logging.info("[PROC] HYDRATE command received")
-        mode = "HYDRATING"
+        start_hydration(msg.payload)
 
     if cmd == "activate" and mode == "READY":
         logging.info("[PROC] ACTIVATE command received")
-        mode = "ACTIVE"
+        activate(msg.payload)
+
+def activate(payload):
+    """
+    Activate payload: {"machines": [...]}, the machines handed over from the hydration source.
+    Without that key the pod takes its retained assignment, else the restored source's machines.
+    Rings of restored machines that did not come along are dropped.
+    """
+    try:
+        command = json.loads(payload.decode()) if payload else {}
+    except Exception:
+        command = {}
+    handed_over = isinstance(command, dict) and isinstance(command.get("machines"), list)
+
+    with hydration_lock:
+        stop_following()  # the rings are live from here on
+        if handed_over:
+            machines = [str(m) for m in command["machines"] if m]
+        else:
+            machines = ASSIGNED_MACHINES or restored_machines
+        if machines:
+            engine.drop(set(engine.rings) - set(machines))
+        set_mode("ACTIVE")
+    apply_assignment(machines, received=handed_over or bool(restored_machines))
+    logging.info(f"[PROC] Taking over {len(machines)} machines with {engine.held()} buffered readings")
 
 def publish_all():
-    """Publish buffer, metrics, and state JSON messages."""
-    if not buffer:
+    """Publish buffer, metrics and state JSON messages, and the retained state snapshot."""
+    held = engine.held()
+    if not held:
         return
-
-    cpu_usage = psutil.cpu_percent(interval=None)
-    mem = psutil.virtual_memory()
-    avg_latency = statistics.mean(processing_times) if processing_times else 0
-    avg_rate = metrics["processed"] / (time.time() - start_time_global + 1e-6)
+    with telemetry.PUBLISH_SECONDS.time():
+        _publish_all(held)
+
+def _publish_all(held):
+    global last_rate_reset
+
+    usage = resources.sample()
+    with state_lock:
+        now = time.time()
+        avg_latency = latency_hist.mean(now)
+        latency = {f"latency_p{q}": round(latency_hist.percentile(q, now), 4) for q in (50, 95, 99)}
+        avg_rate = throughput.rate(now)
+        rate_ewma = throughput_ewma.rate(now)
+        dropped = metrics["dropped"]
+        snapshot_topic, snapshot = snapshot_writer.next(
+            engine.export(), {"processed": metrics["processed"], "dropped": dropped}, ASSIGNED_MACHINES, now)
+        machine_rates = {m: round(c / max(now - last_rate_reset, 1e-6), 3) for m, c in machine_counts.items()}
+        machine_counts.clear()
+        last_rate_reset = now
 
     buffer_payload = {
         "processor_id": PROCESSOR_ID,
         "timestamp": time.time(),
-        "buffer_size": len(buffer),
+        # readings held, capped at MAXLEN like the single buffer this used to be
+        "buffer_size": min(held, MAXLEN),
         "buffer_capacity": MAXLEN,
         "assigned_machines": ASSIGNED_MACHINES,
     }
@@ -129,9 +455,15 @@ def publish_all():
         "processor_id": PROCESSOR_ID,
         "timestamp": time.time(),
         "avg_latency": round(avg_latency, 4),
+        **latency,
         "avg_rate": round(avg_rate, 2),
-        "cpu_usage": cpu_usage,
-        "mem_usage": round(mem.percent, 2),
+        "rate_ewma": round(rate_ewma, 2),
+        **usage,
+        "queue_depth": ingest_queue.qsize(),
+        "stage_ms": engine.take_stage_ms(),
+        "anomalies": engine.anomalies,
+        "dropped": dropped,
+        "machine_rates": machine_rates,
         "assigned_machines": ASSIGNED_MACHINES,
     }
 
@@ -141,9 +473,10 @@ def publish_all():
     mqtt_client.publish(BUFFER_TOPIC, json.dumps(buffer_payload))
     mqtt_client.publish(METRICS_TOPIC, json.dumps(metrics_payload))
     mqtt_client.publish(STATE_TOPIC, json.dumps(state_payload))
+    mqtt_client.publish(snapshot_topic, snapshot, qos=1, retain=True)
 
-    logging.info(f"[{PROCESSOR_ID}] Published buffer: {buffer_payload}")
-    logging.info(f"[{PROCESSOR_ID}] Published metrics: {metrics_payload}")
+    logging.debug(f"[{PROCESSOR_ID}] Published buffer: {buffer_payload}")
+    logging.debug(f"[{PROCESSOR_ID}] Published metrics: {metrics_payload}")
 
 def state_publisher_loop():
     """Background thread to publish state even when no new data arrives."""
@@ -153,12 +486,24 @@ def state_publisher_loop():
 
 mqtt_client.on_connect = on_connect
 mqtt_client.on_message = on_message
+control_client.on_connect = on_control_connect
+control_client.on_message = on_control_message
+
+telemetry.QUEUE_DEPTH.set_function(ingest_queue.qsize)
+telemetry.BUFFERED.set_function(engine.held)
+telemetry.MODE.state(mode)
+telemetry.serve()
 
 logging.info(f"[{PROCESSOR_ID}] Starting processor; connecting to {BROKER} ...")
+control_client.connect(BROKER, 1883, 60)
+control_client.loop_start()
 mqtt_client.connect(BROKER, 1883, 60)
 
-# Track uptime for average rate calculation
-start_time_global = time.time()
+# Start the ingest worker pool
+for i in range(WORKER_THREADS):
+    threading.Thread(target=worker_loop, name=f"ingest-worker-{i}", daemon=True).start()
+logging.info(f"[{PROCESSOR_ID}] {WORKER_THREADS} ingest workers, batches of {BATCH_SIZE} or {BATCH_DEADLINE_MS}ms, "
+             f"queue size {INGEST_QUEUE_SIZE}, overflow={INGEST_OVERFLOW}")
 
 # Start background thread for periodic publishing
 threading.Thread(target=state_publisher_loop, daemon=True).start()
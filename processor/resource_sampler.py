@@ -0,0 +1,130 @@
+import os, time, logging, threading
+import psutil
+
+CGROUP_ROOT = os.getenv("CGROUP_ROOT", "/sys/fs/cgroup")
+
+
+def _read(path: str):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _read_keyed(path: str) -> dict:
+    """Parse a flat-keyed cgroup file (cpu.stat, memory.stat) into {key: int}."""
+    text = _read(path)
+    if not text:
+        return {}
+    out = {}
+    for line in text.splitlines():
+        key, _, value = line.partition(" ")
+        try:
+            out[key] = int(value)
+        except ValueError:
+            pass
+    return out
+
+
+def usable_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return psutil.cpu_count() or 1
+
+
+class ResourceSampler:
+    """
+    CPU and memory of this container, relative to its own limits.
+    With cgroup v2 (the unified hierarchy at CGROUP_ROOT) it reads:
+      cpu.stat      usage_usec, nr_periods, nr_throttled, throttled_usec
+      cpu.max       "<quota> <period>" or "max <period>"
+      memory.current, memory.max, memory.stat (inactive_file)
+    cpu_usage is the share of the CPU quota used since the previous sample, mem_usage the
+    working set (current - inactive_file, as the kubelet counts it) over memory.max. Without a
+    limit the container's usable cores / node memory are the limit. Without cgroup v2 it
+    falls back to psutil numbers for this process.
+    """
+
+    def __init__(self, root: str = CGROUP_ROOT):
+        self.root = root
+        self.lock = threading.Lock()
+        self.cgroup = os.path.exists(os.path.join(root, "cpu.stat")) and os.path.exists(os.path.join(root, "memory.current"))
+        self.process = psutil.Process()
+        self.last_time = time.monotonic()
+        self.last_cpu = self._read_cpu_stat() if self.cgroup else {}
+        if not self.cgroup:
+            self.process.cpu_percent(interval=None)  # prime the process counter
+        logging.info(f"[PROC] Resource sampling from {'cgroup v2 at ' + root if self.cgroup else 'psutil (no cgroup v2)'}")
+
+    def _read_cpu_stat(self) -> dict:
+        return _read_keyed(os.path.join(self.root, "cpu.stat"))
+
+    def cpu_limit(self) -> float:
+        """CPU limit in cores, from cpu.max, else the cores this process may run on."""
+        value = _read(os.path.join(self.root, "cpu.max")) if self.cgroup else None
+        if value:
+            quota, _, period = value.partition(" ")
+            if quota != "max":
+                try:
+                    return int(quota) / int(period or 100000)
+                except ValueError:
+                    pass
+        return float(usable_cores())
+
+    def memory_limit(self) -> int:
+        value = _read(os.path.join(self.root, "memory.max")) if self.cgroup else None
+        if value and value != "max":
+            try:
+                return int(value)
+            except ValueError:
+                pass
+        return psutil.virtual_memory().total
+
+    def sample(self) -> dict:
+        with self.lock:
+            now = time.monotonic()
+            elapsed = max(now - self.last_time, 1e-6)
+            self.last_time = now
+            if self.cgroup:
+                return self._sample_cgroup(elapsed)
+            return self._sample_process()
+
+    def _sample_cgroup(self, elapsed: float) -> dict:
+        cpu = self._read_cpu_stat()
+        delta = {k: cpu.get(k, 0) - self.last_cpu.get(k, 0) for k in ("usage_usec", "nr_periods", "nr_throttled", "throttled_usec")}
+        self.last_cpu = cpu
+
+        cpu_limit = self.cpu_limit()
+        used_cores = delta["usage_usec"] / 1e6 / elapsed
+
+        mem_limit = self.memory_limit()
+        current = int(_read(os.path.join(self.root, "memory.current")) or 0)
+        inactive = _read_keyed(os.path.join(self.root, "memory.stat")).get("inactive_file", 0)
+        working_set = max(current - inactive, 0)
+
+        return {
+            "cpu_usage": round(100.0 * used_cores / cpu_limit, 2),
+            "cpu_limit": round(cpu_limit, 3),
+            "cpu_throttled": round(delta["nr_throttled"] / delta["nr_periods"], 4) if delta["nr_periods"] > 0 else 0.0,
+            "cpu_throttled_ms": round(delta["throttled_usec"] / 1000.0, 1),
+            "mem_usage": round(100.0 * working_set / mem_limit, 2),
+            "mem_bytes": working_set,
+            "mem_limit": mem_limit,
+        }
+
+    def _sample_process(self) -> dict:
+        cpu_limit = self.cpu_limit()
+        mem_limit = self.memory_limit()
+        rss = self.process.memory_info().rss
+        return {
+            # Process.cpu_percent is relative to one core
+            "cpu_usage": round(self.process.cpu_percent(interval=None) / cpu_limit, 2),
+            "cpu_limit": round(cpu_limit, 3),
+            "cpu_throttled": 0.0,
+            "cpu_throttled_ms": 0.0,
+            "mem_usage": round(100.0 * rss / mem_limit, 2),
+            "mem_bytes": rss,
+            "mem_limit": mem_limit,
+        }
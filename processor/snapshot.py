@@ -0,0 +1,129 @@
+import os, time
+import msgpack
+import numpy as np
+from engine import COLUMNS
+
+# Retained per processor: the last full snapshot, and one delta that is cumulative since that
+# full snapshot. A hydrating pod needs exactly these two messages, never a chain of deltas.
+SNAPSHOT_TOPIC = "snapshot/{processor}"
+SNAPSHOT_DELTA_TOPIC = "snapshot/{processor}/delta"
+SNAPSHOT_FULL_INTERVAL = float(os.getenv("SNAPSHOT_FULL_INTERVAL", "60"))  # seconds between full snapshots
+
+
+def encode(snapshot: dict) -> bytes:
+    return msgpack.packb(snapshot, use_bin_type=True)
+
+
+def decode(payload: bytes) -> dict:
+    return msgpack.unpackb(payload, raw=False)
+
+
+def pack_rows(rows: np.ndarray) -> bytes:
+    return np.ascontiguousarray(rows, dtype="<f8").tobytes()
+
+
+def unpack_rows(data: bytes, columns: int = len(COLUMNS)) -> np.ndarray:
+    return np.frombuffer(data, dtype="<f8").reshape(-1, columns)
+
+
+class SnapshotWriter:
+    """
+    Produces the snapshot stream of one processor. Every call to next() bumps the version and
+    returns either a full snapshot (every machine's ring rows, metrics, assignment) or a delta holding
+    only the rows appended per machine since the last full one. Callers report appends through
+    note_append(). Rows travel as raw little-endian float64, COLUMNS wide.
+    """
+
+    def __init__(self, processor_id: str, full_interval: float = SNAPSHOT_FULL_INTERVAL):
+        self.processor_id = processor_id
+        self.full_interval = full_interval
+        self.version = 0
+        self.base = None  # version of the last full snapshot
+        self.last_full = 0.0
+        self.appended = {}  # machine -> rows appended ever
+        self.appended_at_base = {}
+
+    def note_append(self, machine: str, n: int = 1):
+        self.appended[machine] = self.appended.get(machine, 0) + n
+
+    def next(self, rings: dict, metrics: dict, machines: list, now: float = None):
+        """(topic, payload) of the next snapshot; rings is {machine: rows oldest first}."""
+        now = time.time() if now is None else now
+        self.version += 1
+        since_base = {m: min(self.appended.get(m, 0) - self.appended_at_base.get(m, 0), len(rows))
+                      for m, rows in rings.items()}
+        full_rows = sum(len(rows) for rows in rings.values())
+        snapshot = {
+            "processor_id": self.processor_id,
+            "version": self.version,
+            "timestamp": now,
+            "metrics": metrics,
+            "machines": list(machines),
+            "columns": COLUMNS,
+        }
+
+        # a delta half the size of the rings is hardly cheaper than a full snapshot
+        if self.base is None or now - self.last_full >= self.full_interval or 2 * sum(since_base.values()) >= full_rows:
+            self.base, self.last_full, self.appended_at_base = self.version, now, dict(self.appended)
+            snapshot.update(kind="full", rings={m: pack_rows(rows) for m, rows in rings.items()})
+            return SNAPSHOT_TOPIC.format(processor=self.processor_id), encode(snapshot)
+
+        delta = {m: pack_rows(rings[m][len(rings[m]) - n:]) for m, n in since_base.items() if n > 0}
+        snapshot.update(kind="delta", base=self.base, rings=delta)
+        return SNAPSHOT_DELTA_TOPIC.format(processor=self.processor_id), encode(snapshot)
+
+
+class SnapshotRestorer:
+    """
+    Rebuilds a processor's state from its retained snapshot topics, and keeps it current.
+    The delta filter is subscribed before the full one, so by the time the retained full snapshot
+    arrives the matching retained delta (if any) is already here; offer() then returns the state.
+    After that every newer delta on the same base, and every new full snapshot, returns the updated
+    state again, so a READY pod that stays subscribed is never more than one delta behind its source.
+    """
+
+    def __init__(self, source: str, capacity: int):
+        self.source = source
+        self.capacity = capacity
+        self.full = None  # decoded full snapshot, rings unpacked
+        self.delta = None
+        self.version = 0  # version of the last state returned
+        self.started = time.time()
+
+    def topics(self) -> list:
+        return [SNAPSHOT_DELTA_TOPIC.format(processor=self.source), SNAPSHOT_TOPIC.format(processor=self.source)]
+
+    def offer(self, topic: str, payload: bytes):
+        """Feed a message; returns the state whenever it moved to a newer version, else None."""
+        if not payload:
+            return None
+        snapshot = decode(payload)
+        columns = len(snapshot.get("columns", COLUMNS))
+        if snapshot.get("kind") == "delta":
+            self.delta = snapshot
+        else:
+            snapshot["rings"] = {m: unpack_rows(data, columns) for m, data in snapshot.get("rings", {}).items()}
+            self.full = snapshot
+
+        if self.full is None:
+            return None
+        state = {
+            "version": self.full["version"],
+            "metrics": self.full.get("metrics", {}),
+            "machines": self.full.get("machines", []),
+        }
+        rings = dict(self.full["rings"])
+        # deltas are cumulative since their base, so the latest one on this base is all that is needed
+        if self.delta and self.delta.get("base") == self.full["version"]:
+            state["version"] = self.delta["version"]
+            for m, data in self.delta.get("rings", {}).items():
+                rows = unpack_rows(data, columns)
+                rings[m] = np.concatenate([rings[m], rows]) if m in rings else rows
+            state["metrics"] = self.delta.get("metrics", state["metrics"])
+            state["machines"] = self.delta.get("machines", state["machines"])
+        if state["version"] <= self.version:
+            return None  # a stale delta, or a delta waiting for its full snapshot
+        self.version = state["version"]
+        state["rings"] = {m: rows[-self.capacity:] for m, rows in rings.items()}
+        state["restore_ms"] = round((time.time() - self.started) * 1000.0, 2)
+        return state
@@ -0,0 +1,17 @@
+DATA_TOPIC = "data/{machine}"  # one subscription per assigned machine
+
+
+def data_topics(active: bool, machines: list, assigned: bool, shared_group: str = "") -> set:
+    """
+    Data topics a processor should hold. Parked, hydrating and ready pods hold none. Once the
+    scheduler has sent any assignment, even an empty one, exactly the assigned machines; only a
+    processor that never got one takes a share of data/# through the shared group, so it is not
+    idle before the scheduler's first round and never doubles machines another processor owns.
+    """
+    if not active:
+        return set()
+    if assigned or machines:
+        return {DATA_TOPIC.format(machine=m) for m in machines}
+    if shared_group:
+        return {f"$share/{shared_group}/data/#"}
+    return set()
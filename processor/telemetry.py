@@ -0,0 +1,24 @@
+import os, logging
+from prometheus_client import Counter, Enum, Gauge, Histogram, start_http_server
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))  # Prometheus /metrics, 0 = off
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+MESSAGES = Counter("processor_messages_total", "Readings processed")
+DROPPED = Counter("processor_dropped_total", "Readings dropped because the ingest queue was full")
+ANOMALIES = Counter("processor_anomalies_total", "Readings scored above ANOMALY_Z")
+QUEUE_DEPTH = Gauge("processor_queue_depth", "Readings waiting in the ingest queue")
+BUFFERED = Gauge("processor_buffered_readings", "Readings held in the machines' ring buffers")
+LATENCY = Histogram("processor_latency_seconds", "Receipt to processed, per reading", buckets=LATENCY_BUCKETS)
+BATCH_SECONDS = Histogram("processor_batch_seconds", "Time to process one micro-batch", buckets=LATENCY_BUCKETS)
+BATCH_SIZE = Histogram("processor_batch_size", "Readings per micro-batch", buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+PUBLISH_SECONDS = Histogram("processor_publish_seconds", "Time to build and publish metrics, state and snapshot",
+                            buckets=LATENCY_BUCKETS)
+MODE = Enum("processor_mode", "Runtime mode", states=["ACTIVE", "PREWARM", "HYDRATING", "READY"])
+
+
+def serve(port: int = METRICS_PORT):
+    if port > 0:
+        start_http_server(port)
+        logging.info(f"[PROC] Serving Prometheus metrics on :{port}/metrics")
@@ -0,0 +1,51 @@
+import numpy as np
+from engine import COLUMNS
+from snapshot import SnapshotRestorer, SnapshotWriter
+
+
+def rows(start, n):
+    return np.arange(start, start + n, dtype=np.float64).repeat(len(COLUMNS)).reshape(n, len(COLUMNS))
+
+
+def test_restores_full_plus_delta():
+    writer = SnapshotWriter("p1", full_interval=1e9)
+    restorer = SnapshotRestorer("p1", capacity=100)
+    writer.note_append("m1", 10)
+    full = writer.next({"m1": rows(0, 10)}, {}, ["m1"], now=0)
+    writer.note_append("m1", 2)
+    delta = writer.next({"m1": rows(0, 12)}, {}, ["m1"], now=1)
+
+    assert restorer.offer(*delta) is None  # waits for its full snapshot
+    state = restorer.offer(*full)
+    assert state["version"] == 2
+    assert np.array_equal(state["rings"]["m1"], rows(0, 12))
+
+
+def test_follows_later_deltas_and_full_snapshots():
+    writer = SnapshotWriter("p1", full_interval=10)
+    restorer = SnapshotRestorer("p1", capacity=100)
+    writer.note_append("m1", 10)
+    restorer.offer(*writer.next({"m1": rows(0, 10)}, {}, ["m1"], now=0))
+
+    writer.note_append("m1", 2)
+    delta = writer.next({"m1": rows(0, 12)}, {}, ["m1"], now=1)
+    assert np.array_equal(restorer.offer(*delta)["rings"]["m1"], rows(0, 12))
+    assert restorer.offer(*delta) is None  # nothing new
+
+    writer.note_append("m1", 3)
+    state = restorer.offer(*writer.next({"m1": rows(0, 15)}, {}, ["m1"], now=2))
+    assert np.array_equal(state["rings"]["m1"], rows(0, 15))
+
+    writer.note_append("m2", 4)
+    full = writer.next({"m1": rows(0, 15), "m2": rows(50, 4)}, {}, ["m1", "m2"], now=20)
+    state = restorer.offer(*full)
+    assert state["machines"] == ["m1", "m2"]
+    assert np.array_equal(state["rings"]["m2"], rows(50, 4))
+
+
+def test_rings_are_cut_to_capacity():
+    writer = SnapshotWriter("p1")
+    restorer = SnapshotRestorer("p1", capacity=5)
+    writer.note_append("m1", 10)
+    state = restorer.offer(*writer.next({"m1": rows(0, 10)}, {}, ["m1"], now=0))
+    assert np.array_equal(state["rings"]["m1"], rows(5, 5))
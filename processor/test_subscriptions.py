@@ -0,0 +1,18 @@
+from subscriptions import data_topics
+
+
+def test_unassigned_processor_takes_a_share():
+    assert data_topics(True, [], assigned=False, shared_group="processors") == {"$share/processors/data/#"}
+
+
+def test_empty_assignment_drops_the_shared_subscription():
+    assert data_topics(True, [], assigned=True, shared_group="processors") == set()
+
+
+def test_assignment_subscribes_to_exactly_its_machines():
+    assert data_topics(True, ["m1", "m2"], assigned=True, shared_group="processors") == {"data/m1", "data/m2"}
+
+
+def test_parked_pods_hold_nothing():
+    assert data_topics(False, ["m1"], assigned=True, shared_group="processors") == set()
+    assert data_topics(False, [], assigned=False, shared_group="processors") == set()
@@ -0,0 +1,128 @@
+import os, math, time, bisect
+
+RATE_WINDOW = int(os.getenv("RATE_WINDOW", "30"))  # seconds
+RATE_HALFLIFE = float(os.getenv("RATE_HALFLIFE", "10"))  # seconds
+LATENCY_WINDOW = float(os.getenv("LATENCY_WINDOW", "60"))  # seconds
+LATENCY_SLICES = int(os.getenv("LATENCY_SLICES", "6"))
+
+# Log-spaced latency bucket upper bounds: 1ms .. ~30s, each 20% wider than the one before
+LATENCY_BOUNDS = [0.001 * 1.2 ** i for i in range(int(math.log(30000) / math.log(1.2)) + 2)]
+
+
+class SlidingRate:
+    """Events per second over the last `window` seconds, kept as a ring of 1s counters."""
+
+    def __init__(self, window: int = RATE_WINDOW, now: float = None):
+        now = time.time() if now is None else now
+        self.size = max(1, int(window))
+        self.counts = [0] * self.size
+        self.total = 0
+        self.head = int(now)
+        self.started = now
+
+    def _advance(self, now: float):
+        second = int(now)
+        if second - self.head >= self.size:
+            self.counts = [0] * self.size
+            self.total = 0
+        else:
+            for s in range(self.head + 1, second + 1):
+                self.total -= self.counts[s % self.size]
+                self.counts[s % self.size] = 0
+        self.head = max(self.head, second)
+
+    def add(self, n: int = 1, now: float = None):
+        now = time.time() if now is None else now
+        self._advance(now)
+        self.counts[int(now) % self.size] += n
+        self.total += n
+
+    def rate(self, now: float = None) -> float:
+        now = time.time() if now is None else now
+        self._advance(now)
+        # the current second is partial; a young ring only spans the time since it started
+        span = min(self.size - 1 + (now - int(now)), now - self.started)
+        return self.total / max(span, 1e-6)
+
+
+class EwmaRate:
+    """Exponentially decayed event rate with a time-based half-life, O(1) per event."""
+
+    def __init__(self, halflife: float = RATE_HALFLIFE):
+        self.tau = halflife / math.log(2)
+        self.value = 0.0
+        self.last = None
+
+    def _decayed(self, now: float) -> float:
+        if self.last is None:
+            return 0.0
+        return self.value * math.exp(-(now - self.last) / self.tau)
+
+    def add(self, n: int = 1, now: float = None):
+        now = time.time() if now is None else now
+        self.value = self._decayed(now) + n / self.tau
+        self.last = now
+
+    def rate(self, now: float = None) -> float:
+        return self._decayed(time.time() if now is None else now)
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram over a sliding window.
+    The window is LATENCY_SLICES sub-histograms; the oldest is dropped as time moves on, and a
+    running total over all slices is kept so recording is O(log buckets) and percentiles O(buckets).
+    """
+
+    def __init__(self, window: float = LATENCY_WINDOW, slices: int = LATENCY_SLICES, bounds: list = LATENCY_BOUNDS):
+        self.bounds = bounds
+        self.slice_seconds = window / slices
+        self.slices = [[0] * (len(bounds) + 1) for _ in range(slices)]
+        self.slice_sums = [0.0] * slices
+        self.totals = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.head = int(time.time() / self.slice_seconds)
+
+    def _advance(self, now: float):
+        current = int(now / self.slice_seconds)
+        for s in range(max(self.head + 1, current - len(self.slices) + 1), current + 1):
+            i = s % len(self.slices)
+            for b, c in enumerate(self.slices[i]):
+                if c:
+                    self.totals[b] -= c
+                    self.count -= c
+            self.sum -= self.slice_sums[i]
+            self.slices[i] = [0] * (len(self.bounds) + 1)
+            self.slice_sums[i] = 0.0
+        self.head = max(self.head, current)
+
+    def record(self, seconds: float, now: float = None):
+        now = time.time() if now is None else now
+        self._advance(now)
+        b = bisect.bisect_left(self.bounds, seconds)
+        i = self.head % len(self.slices)
+        self.slices[i][b] += 1
+        self.slice_sums[i] += seconds
+        self.totals[b] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def percentile(self, q: float, now: float = None) -> float:
+        """Latency (seconds) below which q% of the window's samples fall, interpolated in the bucket."""
+        self._advance(time.time() if now is None else now)
+        if self.count <= 0:
+            return 0.0
+        rank = q / 100.0 * self.count
+        seen = 0
+        for b, c in enumerate(self.totals):
+            if c and seen + c >= rank:
+                lower = self.bounds[b - 1] if b > 0 else 0.0
+                upper = self.bounds[b] if b < len(self.bounds) else self.bounds[-1]
+                return lower + (upper - lower) * (rank - seen) / c
+            seen += c
+        return self.bounds[-1]
+
+    def mean(self, now: float = None) -> float:
+        self._advance(time.time() if now is None else now)
+        return self.sum / self.count if self.count > 0 else 0.0
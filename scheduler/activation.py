@@ -0,0 +1,64 @@
+import os, json, time, logging, threading
+
+ACTIVATED_TOPIC = "activated/+"  # processors ack their first processed message after starting or activation
+FIRST_MESSAGE_TIMEOUT = float(os.getenv("FIRST_MESSAGE_TIMEOUT", "60"))  # seconds
+
+# Phases the pod reports itself, in order, with the ack field that stamps each
+ACK_PHASES = [("process_started", "started_at"), ("activated", "activated_at"),
+              ("first_received", "first_received_at"), ("first_message", "first_message_at")]
+
+
+class ActivationAcks:
+    """
+    Activation acks, stamped with the time they reach the scheduler. Both benchmarks measure
+    request -> ack arrival, i.e. until the pod has processed its first message, so cold and
+    prewarm numbers are comparable. The pod's own timestamps in the ack give the phases in between.
+    """
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.acks = {}  # pod -> (ack, received_at)
+
+    def track(self, mqtt_client):
+        mqtt_client.message_callback_add(ACTIVATED_TOPIC, self._on_ack)
+        mqtt_client.subscribe(ACTIVATED_TOPIC, qos=1)
+
+    def _on_ack(self, client, userdata, msg):
+        received_at = time.time()
+        pod = msg.topic.split("/", 1)[1]
+        try:
+            ack = json.loads(msg.payload.decode())
+        except Exception as e:
+            logging.error(f"[AI-SCHED] Bad activation ack from {pod}: {e}")
+            return
+        with self.cond:
+            self.acks[pod] = (ack, received_at)
+            self.cond.notify_all()
+
+    def wait(self, pod: str, since: float, timeout: float = FIRST_MESSAGE_TIMEOUT):
+        """(ack, received_at) of the first ack from `pod` that arrived after `since`, or None on timeout."""
+        end = time.time() + timeout
+        with self.cond:
+            while True:
+                entry = self.acks.get(pod)
+                if entry and entry[1] >= since:
+                    return entry
+                remaining = end - time.time()
+                if remaining <= 0:
+                    return None
+                self.cond.wait(remaining)
+
+
+def ack_phases_ms(ack: dict, start: float) -> dict:
+    """
+    Phases reported by the pod, in ms after `start` (pod clocks, so subject to clock skew).
+    Phases before the request, like a prewarm pod's process start, are left out.
+    """
+    phases = {}
+    for phase, field in ACK_PHASES:
+        if ack.get(field) and ack[field] >= start:
+            phases[f"{phase}_ms"] = round((ack[field] - start) * 1000.0, 1)
+    return phases
+
+
+activation_acks = ActivationAcks()
@@ -1,18 +1,29 @@
-import time, os, json, logging, sys
-import xgboost as xgb
-import numpy as np
-from initial_scheduler import schedule
+import time, os, json, logging, sys, threading
+from initial_scheduler import track_assignments, track_metrics, track_machines, running_machines, machine_rates, \
+    scale_processors_based_on_machines, wait_for_pods, assign_machines_to_processors, update_processor_assignments, \
+    assigned_machines, publish_assignment, return_machines
 from kubernetes import client, config
 import paho.mqtt.client as mqtt
 from paho.mqtt.enums import CallbackAPIVersion
 from benchmark_collector import benchmark_cold_start_deployment, append_benchmark
+from feature_source import EventTailReader
+from predictor import ModelCache, predict_processor_probabilities, scale_decision, PREWARM_THRESHOLD
+from prewarm_pool import PrewarmPool
+from rounds import ControlPlane
+from activation import activation_acks, ack_phases_ms, FIRST_MESSAGE_TIMEOUT
+import telemetry
+from events import SchedulerEvents, RateLimiter, Hysteresis, PODS, METRICS, RESYNC, \
+    RESCHEDULE_MIN_INTERVAL, PREDICT_MIN_INTERVAL, RESYNC_INTERVAL
 
 logging.basicConfig(
-    level=logging.INFO,
+    level=os.getenv("LOG_LEVEL", "INFO"),
     handlers=[logging.StreamHandler(sys.stdout)],
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
+MQTT_BROKER = os.getenv("MQTT_BROKER", "mqtt-broker")
+BENCHMARK_INTERVAL = float(os.getenv("BENCHMARK_INTERVAL", "300"))  # seconds between cold/prewarm benchmarks
+
 mqtt_client = mqtt.Client(callback_api_version=CallbackAPIVersion.VERSION2)
 
 
@@ -41,173 +52,277 @@ FEATURES = [
     "avg_latency","avg_rate","temperature","vibration","load"
 ]
 
+# Follows raw_events.jsonl incrementally and keeps the latest event per processor
+feature_source = EventTailReader(RAW_EVENTS_PATH)
+# Booster stays in memory, reloaded only when the model file changes
+model_cache = ModelCache(MODEL_PATH)
 
-def predict_scale_decision(model, features):
-    metrics = get_latest_metrics(features)
-
-    # ordering is crucial
-    row = [metrics[f] for f in features]
 
-    dmatrix = xgb.DMatrix(
-        np.array([row], dtype=float),
-        feature_names=features
-    )
-
-    prob = float(model.predict(dmatrix)[0])
+def predict_scale_decision(model, features):
+    """Overload probability per processor, all processors scored in one batch."""
+    rows = get_latest_metrics_by_processor(features)
+    if not rows:
+        # no processor reported recently, fall back to the newest event we have
+        rows = {"latest": get_latest_metrics(features)}
 
-    return prob
+    return predict_processor_probabilities(model, features, rows)
 
 def get_latest_metrics(features: list) -> dict:
-    """Return dict that includes ONLY model-required features."""
-    out = {f: 0.0 for f in features}  # Default to 0.0 for all features
-
+    """Return dict that includes ONLY model-required features, from the most recent event."""
     try:
-        with open(RAW_EVENTS_PATH, "r") as f:
-            # Read the first line of the .jsonl file
-            line = f.readline()
-            if line:  # Ensure there's a line to process
-                obj = json.loads(line.strip())  # Parse the JSON object from the line
-                for f in features:
-                    try:
-                        out[f] = float(obj.get(f, 0.0))
-                    except ValueError:
-                        out[f] = 0.0  # In case of conversion issues
+        new_events = feature_source.poll()
+        logging.debug(f"[AI-SCHED] Read {new_events} new events from {RAW_EVENTS_PATH}")
     except Exception as e:
-        logging.error(f"[AI-SCHED] No {RAW_EVENTS_PATH} found — using zeros {e}")
+        logging.error(f"[AI-SCHED] Failed to read {RAW_EVENTS_PATH} — using last known state {e}")
 
-    return out
+    obj = feature_source.newest()
+    if not obj:
+        logging.error(f"[AI-SCHED] No events in {RAW_EVENTS_PATH} yet — using zeros")
 
+    return to_feature_row(obj, features)
 
-def load_model():
-    if not os.path.exists(MODEL_PATH):
-        logging.warning("[AI-SCHED] No model found -> prediction disabled.")
-        return None
-
-    model = xgb.Booster()
-    model.load_model(MODEL_PATH)
-    logging.info("[AI-SCHED] XGB model loaded.")
+def get_latest_metrics_by_processor(features: list) -> dict:
+    """{processor_id: feature dict} from the latest event of every processor still reporting."""
+    try:
+        feature_source.poll()
+    except Exception as e:
+        logging.error(f"[AI-SCHED] Failed to read {RAW_EVENTS_PATH} — using last known state {e}")
 
-    feature_names = model.feature_names
-    if feature_names is None:
-        raise RuntimeError("Model has no feature names!")
+    return {p: to_feature_row(obj, features) for p, obj in feature_source.snapshots().items()}
 
-    return model, feature_names
+def to_feature_row(obj: dict, features: list) -> dict:
+    out = {f: 0.0 for f in features}  # Default to 0.0 for all features
+    for f in features:
+        try:
+            out[f] = float(obj.get(f, 0.0))
+        except (TypeError, ValueError):
+            out[f] = 0.0  # In case of conversion issues
+    return out
 
 
 ############################################
-# PROCESSOR PREWARM + HYDRATION PIPELINE
+# PROCESSOR PREWARM POOL
 ############################################
 
-def create_prewarm_processor(prob):
-    """Launch a new processor pod in PREWARM mode."""
-    name = "prewarm-processor"
-    logging.info(f"[AI-SCHED] Creating prewarm processor: {name}")
-
-    try:
-        dep = apps.read_namespaced_deployment(name, "default")
-    except:
-        logging.error("[AI-SCHED] ERROR: prewarm-processor Deployment not found!")
-        return None
-
-    if prob > 0.8:
-        scale_prewarm_processor(3)
-    elif prob > 0.7:
-        scale_prewarm_processor(2)
-    else:
-        scale_prewarm_processor(1)
-
-    return name
+ACTIVATION_TIMEOUT = float(os.getenv("ACTIVATION_TIMEOUT", "10"))  # seconds for a handed-out pod to report ACTIVE
 
 def scale_prewarm_processor(count):
-    apps.patch_namespaced_deployment_scale(
-        name="prewarm-processor",
-        namespace="default",
-        body={"spec": {"replicas": count}}
-    )
+    with telemetry.k8s_call("scale_prewarm"):
+        apps.patch_namespaced_deployment_scale(
+            name="prewarm-processor",
+            namespace="default",
+            body={"spec": {"replicas": count}}
+        )
     logging.info(f"[AI-SCHED] Scaled prewarm pool to {count}")
 
-def get_prewarm_pods():
-    pods = v1.list_namespaced_pod(
-        namespace="default",
-        label_selector="app=prewarm-processor,mode=prewarm"
-    )
-    return [p.metadata.name for p in pods.items]
-
-def hydrate_prewarm_processor(pod_name):
-    """Send hydration command via MQTT"""
-    logging.info(f"[AI-SCHED] Hydrating {pod_name}")
-
-    try:
-        hydration_topic = f"prewarm/{pod_name}/hydrate"
-        mqtt_client.publish(hydration_topic, "1")
-        logging.info(f"[AI-SCHED] Hydration published in the: {hydration_topic} topic")
-    except Exception as e:
-        logging.error(f"[AI-SCHED] Hydration publishing failed: {e}")
-
-def activate_prewarm_processor(pod_name):
-    """Instruct prewarmed processor to begin accepting machine assignments."""
-    logging.info(f"[AI-SCHED] Activating {pod_name}")
+def set_deletion_cost(pod_name, cost):
+    """Serving pods are the last and retired pods the first ones removed when the prewarm deployment scales down."""
+    with telemetry.k8s_call("annotate_pod"):
+        v1.patch_namespaced_pod(pod_name, "default", {
+            "metadata": {"annotations": {"controller.kubernetes.io/pod-deletion-cost": str(cost)}}
+        })
 
+def delete_pod(pod_name):
     try:
-        activation_topic = f"prewarm/{pod_name}/activate"
-        mqtt_client.publish(activation_topic, "1")
-        logging.info(f"[AI-SCHED] Activation published in the: {activation_topic} topic")
-    except Exception as e:
-        logging.error(f"[AI-SCHED] Activation publishing failed: {e}")
+        with telemetry.k8s_call("delete_pod"):
+            v1.delete_namespaced_pod(pod_name, "default")
+    except client.exceptions.ApiException as e:
+        if e.status != 404:  # the ReplicaSet removed it already
+            raise
+
+# Inventory of prewarm pods from their MQTT registrations; keeps `target` of them hydrated
+pool = PrewarmPool(mqtt_client, scale_prewarm_processor, set_deletion_cost, delete_pod)
+
+class KubeCluster:
+    """The cluster side of the ControlPlane rounds: pods through the Kubernetes API, assignments over MQTT."""
+
+    def machines(self):
+        return running_machines()
+
+    def machine_rates(self):
+        return machine_rates()
+
+    def scale_processors(self, num_machines):
+        return scale_processors_based_on_machines(num_machines)
+
+    def running_processors(self, required):
+        return wait_for_pods("processor", required)
+
+    def assign(self, machines, processors):
+        update_processor_assignments(assign_machines_to_processors(machines, processors), mqtt_client)
+
+    def assigned(self, processor):
+        return assigned_machines(processor)
+
+    def publish_assignment(self, processor, machines):
+        publish_assignment(processor, machines, mqtt_client)
+
+    def handed_out(self, pod_name, source, machines, start):
+        telemetry.DECISIONS.labels("handout").inc()
+        telemetry.MIGRATIONS.inc(len(machines))
+        # the activation is followed on its own thread so the event loop never waits for it
+        threading.Thread(target=follow_handout, args=(pod_name, source, start),
+                         name=f"handout-{pod_name}", daemon=True).start()
+
+    def handout_missed(self, source):
+        telemetry.DECISIONS.labels("handout_unavailable").inc()
+        logging.warning(f"[AI-SCHED] No READY prewarm pod hydrated from {source} to hand out")
+
+    def lease_over(self):
+        events.emit(PODS, "handout-lease")
+
+def scheduling_round():
+    control.scheduling_round()
+
+def follow_handout(pod_name, source, start):
+    """
+    Like the cold-start benchmark, the prewarm benchmark runs until the pod's ack of its first
+    processed message reaches the scheduler. A pod that never reports ACTIVE gives its machines
+    back to the source and is retired.
+    """
+    registration = pool.wait_for_mode(pod_name, "ACTIVE", ACTIVATION_TIMEOUT)
+    if registration is None:
+        telemetry.DECISIONS.labels("handout_timeout").inc()
+        logging.warning(f"[AI-SCHED] {pod_name} did not report ACTIVE within {ACTIVATION_TIMEOUT}s")
+        return_machines(pod_name, source, mqtt_client)
+        pool.retire(pod_name)
+        return
+    ack = activation_acks.wait(pod_name, start, FIRST_MESSAGE_TIMEOUT)
+    if ack is None:
+        telemetry.DECISIONS.labels("handout_timeout").inc()
+        logging.warning(f"[AI-SCHED] {pod_name} processed no message within {FIRST_MESSAGE_TIMEOUT}s of activation")
+        return
+
+    ack, received_at = ack
+    duration_ms = (received_at - start) * 1000.0
+    append_benchmark("prewarm", duration_ms, ack_phases_ms(ack, start))
+    logging.info(f"[AI-SCHED] Prewarm benchmark proc: {pod_name}: time_ms={int(duration_ms)} "
+                 f"(hydrated from {registration.get('source')}, version {registration.get('version')})")
 
 
+############################################
+# PREDICTION ROUND
+############################################
 
-########################################################
-# schedule: assign machines to processors.
-########################################################
-
-while True:
-    ###### Begin Random scheduling #######
-    schedule()
-    ###### End Random scheduling #######
+def prediction_round(benchmark: bool = False):
+    """Score every processor, size the pool through the hysteresis policy, hand out pods where needed."""
+    with telemetry.PREDICTION_SECONDS.time():
+        _prediction_round(benchmark)
 
-    ###### Begin AI scheduling #######
-    model, features = load_model()
-    metrics = get_latest_metrics(features)
+def _prediction_round(benchmark):
+    model, features = model_cache.get()
 
     if model:
-        prob = predict_scale_decision(model, features)
-        pred = 1 if prob > 0.5 else 0
+        with telemetry.INFERENCE_SECONDS.time():
+            probs = predict_scale_decision(model, features)
+        prewarm_count = scale_decision(probs)
     else:
-        pred = 0
-        prob = 0
-
-    logging.info(f"[AI-SCHED] Prediction={pred}, Prob={prob:.3f}")
-
-    logging.info("[AI-SCHED] Start cold benchmark.")
-    benchmark_cold_start_deployment()
-
-    if pred == 1 or prob > 0:
-        logging.info("[AI-SCHED] AI requests prewarm capacity")
-        pod_name = create_prewarm_processor(prob)
-
-        logging.info("[AI-SCHED] Wait 10 sec for prewarm-processors to rise.")
-        time.sleep(10)
-
-        # We don't need this method, we could use MQTT to store the pre-warm pod names after creation
-        # That essentially brings the prewarmed pod launch to near to a few milliseconds.
-        pod_names = get_prewarm_pods()
-
-        for pod_name in pod_names:
-            hydrate_prewarm_processor(pod_name)
+        probs = {}
+        prewarm_count = 0
 
-        time.sleep(5)
+    previous = prewarm_policy.current
+    target = control.prediction_round(probs, prewarm_count, benchmark)
+    if target is not None:
+        telemetry.DECISIONS.labels("prewarm_scale_up" if target > previous else "prewarm_scale_down").inc()
+    telemetry.PREWARM_TARGET.set(prewarm_policy.current)
+    logging.info(f"[AI-SCHED] Prediction: prewarm={prewarm_count}, applied={target}, "
+                 f"{sum(1 for v in probs.values() if v > PREWARM_THRESHOLD)}/{len(probs)} processors likely to overload")
+    logging.debug(f"[AI-SCHED] Overload probabilities: { {p: round(v, 3) for p, v in probs.items()} }")
 
-        logging.info("[AI-SCHED] Start prewarm benchmark.")
-        start = time.time()
 
-        for pod_name in pod_names:
-            activate_prewarm_processor(pod_name)
-            finish = time.time()
-            duration_ms = (finish - start) * 1000.0
-            append_benchmark("prewarm", duration_ms)
-            logging.info(f"[AI-SCHED] Prewarm benchmark proc: {pod_name}: time_ms={int(duration_ms)}")
+########################################################
+# Event loop: pod watches and metric updates trigger rounds,
+# rate limiters and hysteresis keep the API server calm.
+########################################################
 
-    time.sleep(300)
+events = SchedulerEvents()
+prewarm_policy = Hysteresis()
+control = ControlPlane(KubeCluster(), pool, prewarm_policy)
+
+def on_connect(client, userdata, flags, rc, properties=None):
+    logging.info(f"[AI-SCHED] Connected to MQTT broker at {MQTT_BROKER}")
+    track_assignments(client)
+    track_metrics(client, on_update=lambda processor: events.emit(METRICS, processor))
+    track_machines(client, on_update=lambda: events.emit(PODS, "virtual-machines"))
+    pool.track(client)
+    activation_acks.track(client)
+
+def run_guarded(name, fn, *args):
+    kind = name.lower().replace(" ", "_")
+    telemetry.ROUNDS.labels(kind).inc()
+    try:
+        fn(*args)
+    except Exception as e:
+        telemetry.ROUND_ERRORS.labels(kind).inc()
+        logging.error(f"[AI-SCHED] {name} failed: {e}")
+
+cold_benchmark_lock = threading.Lock()  # held while a cold benchmark runs, one at a time
+
+def start_cold_benchmark():
+    """
+    Run the cold-start benchmark on its own thread, it waits up to minutes for the new pod.
+    Scheduling rounds are held back meanwhile so they do not scale its extra replica away; a PODS
+    event when it finishes lets them run again.
+    """
+    if not cold_benchmark_lock.acquire(blocking=False):
+        logging.info("[AI-SCHED] Cold benchmark still running, skipping this one.")
+        return
+
+    def run():
+        try:
+            run_guarded("Cold benchmark", benchmark_cold_start_deployment)
+        finally:
+            cold_benchmark_lock.release()
+            events.emit(PODS, "cold-benchmark")
 
-########################################################
\ No newline at end of file
+    logging.info("[AI-SCHED] Start cold benchmark.")
+    threading.Thread(target=run, name="cold-benchmark", daemon=True).start()
+
+def main():
+    telemetry.serve()
+    mqtt_client.on_connect = on_connect
+    mqtt_client.connect(MQTT_BROKER, 1883, 60)
+    mqtt_client.loop_start()
+
+    events.watch_pods("machine")
+    events.watch_pods("processor")
+
+    reschedule_limiter = RateLimiter(RESCHEDULE_MIN_INTERVAL)
+    predict_limiter = RateLimiter(PREDICT_MIN_INTERVAL)
+    benchmark_limiter = RateLimiter(BENCHMARK_INTERVAL)
+    pending = {PODS, METRICS}  # first round does everything
+
+    while True:
+        now = time.time()
+
+        benchmarking = cold_benchmark_lock.locked()
+        if PODS in pending and not benchmarking and reschedule_limiter.ready(now):
+            pending.discard(PODS)
+            reschedule_limiter.mark(now)
+            run_guarded("Scheduling", scheduling_round)
+
+        benchmark_due = benchmark_limiter.ready(now)
+        if benchmark_due:
+            benchmark_limiter.mark(now)
+            start_cold_benchmark()
+
+        if (METRICS in pending and predict_limiter.ready(now)) or benchmark_due:
+            pending.discard(METRICS)
+            predict_limiter.mark(now)
+            run_guarded("Prediction", prediction_round, benchmark_due)
+
+        # sleep until something happens, or until a deferred event may run
+        timeout = min(RESYNC_INTERVAL, benchmark_limiter.wait_time())
+        if PODS in pending and not benchmarking:
+            timeout = min(timeout, reschedule_limiter.wait_time())
+        if METRICS in pending:
+            timeout = min(timeout, predict_limiter.wait_time())
+
+        happened = events.wait(timeout)
+        if RESYNC in happened:
+            pending |= {PODS, METRICS}
+        pending |= set(happened) - {RESYNC}
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+import math, hashlib, bisect
+
+#######
+# Pluggable machine -> processor assignment engines.
+#
+# Every engine implements
+#   assign(machines, processors, previous=None, machine_load=None, processor_stats=None) -> {processor: [machines]}
+# where
+#   previous        = last round's {processor: [machines]}, used to keep machines where they are
+#   machine_load    = observed message rate per machine (msgs/s); unknown machines get the mean
+#   processor_stats = latest metrics payload per processor (avg_latency, buffer_size, buffer_capacity)
+#
+# No Kubernetes or MQTT in here, so the engines can be exercised offline (see test_assignment.py).
+#######
+
+
+def required_processors(num_machines: int, max_per_processor: int, total_load: float = 0.0, load_capacity: float = 0.0) -> int:
+    """Pool size: enough processors for the machine count and, if a per-processor rate capacity is set, the load."""
+    if num_machines <= 0:
+        return 0
+    required = math.ceil(num_machines / max_per_processor)
+    if load_capacity > 0:
+        required = max(required, math.ceil(total_load / load_capacity))
+    return max(1, required)
+
+
+def machine_weights(machines: list, machine_load: dict = None) -> dict:
+    """Observed rate per machine; machines never seen yet get the mean of the known ones (or 1.0)."""
+    machine_load = machine_load or {}
+    known = [float(machine_load[m]) for m in machines if machine_load.get(m, 0) > 0]
+    default = sum(known) / len(known) if known else 1.0
+    return {m: float(machine_load[m]) if machine_load.get(m, 0) > 0 else default for m in machines}
+
+
+def processor_speeds(processors: list, processor_stats: dict = None) -> dict:
+    """
+    Relative capacity per processor: 1.0 for a healthy processor, lower when its buffer is filling up
+    or its latency is above the pool median (clamped to [0.5, 2] of the median).
+    """
+    processor_stats = processor_stats or {}
+    latencies = sorted(
+        float(s.get("avg_latency", 0)) for p, s in processor_stats.items()
+        if p in processors and float(s.get("avg_latency", 0)) > 0
+    )
+    reference = latencies[len(latencies) // 2] if latencies else 0.0
+
+    speeds = {}
+    for p in processors:
+        stats = processor_stats.get(p, {})
+        capacity = float(stats.get("buffer_capacity", 0) or 0)
+        fill = min(float(stats.get("buffer_size", 0) or 0) / capacity, 1.0) if capacity else 0.0
+        latency = float(stats.get("avg_latency", 0) or 0)
+        latency_ratio = min(max(latency / reference, 0.5), 2.0) if reference and latency else 1.0
+        speeds[p] = 1.0 / ((1.0 + fill) * latency_ratio)
+    return speeds
+
+
+def split_machines(machines: list, machine_load: dict = None):
+    """
+    (keep, move): an overloaded processor's machines split in two halves of about equal load, for a
+    prewarm pod that takes over one of them. Heaviest first onto the lighter half; both halves get
+    at least one machine, so a single machine is never split.
+    """
+    if len(machines) < 2:
+        return list(machines), []
+    weights = machine_weights(machines, machine_load)
+    keep, move, load = [], [], [0.0, 0.0]
+    for m in sorted(machines, key=lambda m: (-weights[m], m)):
+        side = 0 if load[0] <= load[1] else 1
+        (keep, move)[side].append(m)
+        load[side] += weights[m]
+    return sorted(keep), sorted(move)
+
+
+def count_migrations(previous: dict, current: dict) -> int:
+    """Machines that were assigned before and now sit on a different processor."""
+    before = {m: p for p, ms in (previous or {}).items() for m in ms}
+    after = {m: p for p, ms in current.items() for m in ms}
+    return sum(1 for m, p in after.items() if m in before and before[m] != p)
+
+
+class BalancedAssigner:
+    """
+    Sticky greedy bin-packing.
+      1. every machine stays on its previous processor if that processor still exists
+      2. processors above the count cap shed down to it: ceil(M/N) but never more than
+         max_per_processor, unless the pool is too small to fit M machines at all
+      3. orphaned, new and shed machines are placed heaviest-first on the processor with the lowest
+         speed-normalised load that is below the count cap
+      4. while the peak processor is above its weighted load target (mean * (1 + tolerance)), a single
+         machine is moved off it, or swapped with a lighter one, if that strictly lowers the peak;
+         at most one such step per processor
+    A steady cluster therefore sees no migrations, and a round moves at most
+    orphaned + over-cap + two machines per processor.
+    """
+    name = "balanced"
+
+    def __init__(self, max_per_processor: int, tolerance: float = 0.15):
+        self.max_per_processor = max_per_processor
+        self.tolerance = tolerance
+
+    def assign(self, machines, processors, previous=None, machine_load=None, processor_stats=None):
+        if not processors:
+            return {}
+
+        weights = machine_weights(machines, machine_load)
+        speeds = processor_speeds(processors, processor_stats)
+        total_weight = sum(weights.values())
+        total_speed = sum(speeds.values())
+        count_cap = self.count_cap(len(machines), len(processors))
+        target = {p: total_weight * speeds[p] / total_speed * (1 + self.tolerance) for p in processors}
+
+        assignments = {p: [] for p in processors}
+        load = {p: 0.0 for p in processors}
+        owner = {m: p for p, ms in (previous or {}).items() for m in ms}
+        unplaced = []
+
+        # 1. keep machines where they are
+        for m in machines:
+            p = owner.get(m)
+            if p in assignments:
+                assignments[p].append(m)
+                load[p] += weights[m]
+            else:
+                unplaced.append(m)
+
+        # 2. shed from processors over the count cap
+        for p in processors:
+            while len(assignments[p]) > count_cap:
+                m = self._pick_victim(assignments[p], weights, load[p] - target[p])
+                assignments[p].remove(m)
+                load[p] -= weights[m]
+                unplaced.append(m)
+
+        # 3. heaviest first onto the least loaded processor with room
+        for m in sorted(unplaced, key=lambda m: (-weights[m], m)):
+            candidates = [p for p in processors if len(assignments[p]) < count_cap] or processors
+            p = min(candidates, key=lambda p: ((load[p] + weights[m]) / speeds[p], len(assignments[p]), p))
+            assignments[p].append(m)
+            load[p] += weights[m]
+
+        # 4. while the peak processor is above its target, move one machine off it (or swap it with a
+        #    lighter one when the receiver is full) if that strictly lowers the pair's peak
+        for _ in range(len(processors)):
+            p = max(processors, key=lambda p: (load[p] / speeds[p], p))
+            if load[p] <= target[p]:
+                break
+            move = self._best_move(p, assignments, load, weights, speeds, count_cap)
+            if move is None:
+                break
+            m, q, back = move
+            assignments[p].remove(m)
+            assignments[q].append(m)
+            load[p] -= weights[m]
+            load[q] += weights[m]
+            if back is not None:
+                assignments[q].remove(back)
+                assignments[p].append(back)
+                load[q] -= weights[back]
+                load[p] += weights[back]
+
+        return {p: sorted(ms) for p, ms in assignments.items()}
+
+    def count_cap(self, num_machines: int, num_processors: int) -> int:
+        even = math.ceil(num_machines / num_processors)
+        if num_processors * self.max_per_processor >= num_machines:
+            return min(even, self.max_per_processor)
+        return even
+
+    @staticmethod
+    def _best_move(p, assignments, load, weights, speeds, count_cap):
+        """
+        (machine, receiver, machine sent back or None) that minimises the new peak of p and the receiver,
+        if that peak is below p's current load.
+        """
+        best, best_peak = None, load[p] / speeds[p] - 1e-9
+        for m in assignments[p]:
+            for q in assignments:
+                if q == p:
+                    continue
+                # a plain move needs room on q, a swap keeps both counts unchanged
+                options = [None] if len(assignments[q]) < count_cap else []
+                options += [b for b in assignments[q] if weights[b] < weights[m]]
+                for back in options:
+                    delta = weights[m] - (weights[back] if back is not None else 0.0)
+                    peak = max((load[p] - delta) / speeds[p], (load[q] + delta) / speeds[q])
+                    if peak < best_peak:
+                        best, best_peak = (m, q, back), peak
+        return best
+
+    @staticmethod
+    def _pick_victim(machines, weights, excess):
+        """Heaviest machine that does not overshoot the excess, otherwise the lightest one."""
+        fitting = [m for m in machines if weights[m] <= excess]
+        if fitting:
+            return max(fitting, key=lambda m: weights[m])
+        return min(machines, key=lambda m: weights[m])
+
+
+class ConsistentHashAssigner:
+    """
+    Consistent hashing with bounded loads: each machine walks the ring clockwise from its hash to the
+    first processor below the count cap, ceil(M/N * (1 + tolerance)) machines but never more than
+    max_per_processor (unless the pool is too small to fit M machines at all, then ceil(M/N)).
+    Adding or removing a processor only moves the machines of the affected ring segments. Ignores
+    rates and history by design.
+    """
+    name = "hash"
+
+    def __init__(self, max_per_processor: int, tolerance: float = 0.25, vnodes: int = 64):
+        self.max_per_processor = max_per_processor
+        self.tolerance = tolerance
+        self.vnodes = vnodes
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int(hashlib.md5(key.encode()).hexdigest()[:16], 16)
+
+    def assign(self, machines, processors, previous=None, machine_load=None, processor_stats=None):
+        if not processors:
+            return {}
+
+        ring = sorted((self._hash(f"{p}#{i}"), p) for p in processors for i in range(self.vnodes))
+        keys = [h for h, _ in ring]
+        cap = self.count_cap(len(machines), len(processors))
+
+        assignments = {p: [] for p in processors}
+        for m in sorted(machines):
+            idx = bisect.bisect(keys, self._hash(m)) % len(ring)
+            for step in range(len(ring)):
+                p = ring[(idx + step) % len(ring)][1]
+                if len(assignments[p]) < cap:
+                    assignments[p].append(m)
+                    break
+
+        return {p: sorted(ms) for p, ms in assignments.items()}
+
+    def count_cap(self, num_machines: int, num_processors: int) -> int:
+        bounded = min(math.ceil(num_machines / num_processors * (1 + self.tolerance)), self.max_per_processor)
+        return max(1, math.ceil(num_machines / num_processors), bounded)
+
+
+ENGINES = {
+    BalancedAssigner.name: BalancedAssigner,
+    ConsistentHashAssigner.name: ConsistentHashAssigner,
+}
+
+
+def get_engine(name: str, max_per_processor: int):
+    if name not in ENGINES:
+        raise ValueError(f"Unknown assignment engine '{name}', expected one of {sorted(ENGINES)}")
+    return ENGINES[name](max_per_processor)
@@ -1,10 +1,16 @@
-import logging, sys, time, os, csv
+import logging, sys, time, os, csv, threading
 from kubernetes import client, config
+from pod_tracker import get_tracker, PHASES
+from activation import activation_acks, ack_phases_ms, ACK_PHASES, FIRST_MESSAGE_TIMEOUT
+import telemetry
 
 BENCHMARK_PATH = "/data/benchmark.csv"
+# Every row is tagged, so benchmark.py can report and compare runs of different scheduler versions
+RUN_ID = os.getenv("RUN_ID") or time.strftime("run-%Y%m%dT%H%M%S", time.gmtime())
+SCHEDULER_VERSION = os.getenv("SCHEDULER_VERSION", "dev")
 
 logging.basicConfig(
-    level=logging.INFO,
+    level=os.getenv("LOG_LEVEL", "INFO"),
     handlers=[logging.StreamHandler(sys.stdout)],
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
@@ -17,85 +23,102 @@ except:
     logging.info(f"[AI-SCHED: BENCHMARK] Using local kubeconfig")
 
 
-def append_benchmark(event_type, duration_ms):
+# start_time_ms is request -> first message processed for both cold and prewarm starts
+BENCHMARK_COLUMNS = ["timestamp", "event_type", "start_time_ms"] + [f"{p}_ms" for p in PHASES] + \
+    [f"{p}_ms" for p, _ in ACK_PHASES] + ["run_id", "scheduler_version"]
+_header_checked = False
+_benchmark_lock = threading.Lock()  # cold benchmarks run on the event loop, prewarm ones on hand-out threads
+
+def _ensure_benchmark_header():
+    """Rewrite an older benchmark.csv once so its header carries the per-phase columns."""
+    global _header_checked
+    if _header_checked or not os.path.exists(BENCHMARK_PATH):
+        _header_checked = True
+        return
+
+    with open(BENCHMARK_PATH, newline="") as f:
+        rows = list(csv.DictReader(f))
+        header = rows and list(rows[0].keys())
+    if header and header != BENCHMARK_COLUMNS:
+        tmp = BENCHMARK_PATH + ".tmp"
+        with open(tmp, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=BENCHMARK_COLUMNS, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(rows)
+        os.replace(tmp, BENCHMARK_PATH)
+        logging.info(f"[AI-SCHED] Migrated {BENCHMARK_PATH} header to {BENCHMARK_COLUMNS}")
+    _header_checked = True
+
+def append_benchmark(event_type, duration_ms, phases=None):
+    telemetry.START_SECONDS.labels(event_type).observe(duration_ms / 1000.0)
     try:
-        exists = os.path.exists(BENCHMARK_PATH)
-        with open(BENCHMARK_PATH, "a", newline="") as f:
-            writer = csv.writer(f)
-            if not exists:
-                writer.writerow(["timestamp", "event_type", "start_time_ms"])
-            writer.writerow([time.time(), event_type, duration_ms])
+        with _benchmark_lock:
+            _ensure_benchmark_header()
+            exists = os.path.exists(BENCHMARK_PATH)
+            with open(BENCHMARK_PATH, "a", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=BENCHMARK_COLUMNS, extrasaction="ignore")
+                if not exists:
+                    writer.writeheader()
+                writer.writerow({"timestamp": time.time(), "event_type": event_type,
+                                 "start_time_ms": duration_ms, **(phases or {}),
+                                 "run_id": RUN_ID, "scheduler_version": SCHEDULER_VERSION})
     except Exception as e:
         logging.error(f"[AI-SCHED] Failed to write benchmark log: {e}")
 
-def wait_for_pod_ready_by_name(pod_name, timeout=120):
-    v1 = client.CoreV1Api()
-    end = time.time() + timeout
-
-    while time.time() < end:
-        try:
-            p = v1.read_namespaced_pod(pod_name, "default")
-            if p.status.phase == "Running":
-                conds = p.status.conditions or []
-                for c in conds:
-                    if c.type == "Ready" and c.status == "True":
-                        return True
-        except Exception:
-            pass
-        time.sleep(0.5)
-    return False
+def wait_for_pod_ready_by_name(pod_name, timeout=120, label_selector="app=processor"):
+    return get_tracker(label_selector).wait_for_ready(pod_name, timeout) is not None
 
 def benchmark_cold_start_deployment(deploy_name="processor", label_selector="app=processor,mode!=prewarm", timeout=180):
     """
-    Scale the existing deployment `deploy_name` by +1, wait for the NEW pod Ready, record time,
-    then scale back to original replica count.
+    Scale the existing deployment `deploy_name` by +1, wait until the NEW pod has processed its
+    first message, record that time and the per-phase breakdown (scheduled, image pulled,
+    container started, ready, process started, first message), then scale back to original
+    replica count.
     """
     apps = client.AppsV1Api()
-    v1 = client.CoreV1Api()
+    tracker = get_tracker(label_selector)
 
     logging.info(f"[AI-SCHED] Cold-start benchmarking started")
 
     # 1. get current pods and replica count
-    dep = apps.read_namespaced_deployment_scale(deploy_name, "default")
+    with telemetry.k8s_call("read_scale"):
+        dep = apps.read_namespaced_deployment_scale(deploy_name, "default")
     orig_replicas = dep.spec.replicas or 1
 
-    pods_before = set(p.metadata.name for p in v1.list_namespaced_pod("default", label_selector="app=processor").items)
+    pods_before = tracker.names()
 
     # 2. scale up
     start = time.time()
     new_replicas = orig_replicas + 1
     body = {"spec": {"replicas": new_replicas}}
-    apps.patch_namespaced_deployment_scale(name=deploy_name, namespace="default", body=body)
-
-    # 3. wait for a new pod to appear and become Ready
-    end_time = time.time() + timeout
-    new_pod_name = None
-    while time.time() < end_time:
-        pods_now = v1.list_namespaced_pod("default", label_selector="app=processor").items
-        names_now = set(p.metadata.name for p in pods_now)
-        added = names_now - pods_before
-        if added:
-            # pick the first added pod
-            cand = list(added)[0]
-            if wait_for_pod_ready_by_name(cand, timeout=timeout):
-                new_pod_name = cand
-                break
-        time.sleep(0.5)
-
-    finish = time.time()
-    duration_ms = (finish - start) * 1000.0
+    with telemetry.k8s_call("scale_processor"):
+        apps.patch_namespaced_deployment_scale(name=deploy_name, namespace="default", body=body)
+
+    # 3. wait for a new pod to appear and become Ready (watch driven, no polling)
+    end_time = start + timeout
+    new_pod_name = tracker.wait_for_new_pod(pods_before, timeout)
+    timeline = ack = None
+    if new_pod_name:
+        timeline = tracker.wait_for_ready(new_pod_name, max(0.0, end_time - time.time()))
+    if timeline:
+        ack = activation_acks.wait(new_pod_name, start, max(0.0, min(end_time - time.time(), FIRST_MESSAGE_TIMEOUT)))
 
     # 4. scale back to original
     try:
-        apps.patch_namespaced_deployment_scale(name=deploy_name, namespace="default", body={"spec": {"replicas": orig_replicas}})
+        with telemetry.k8s_call("scale_processor"):
+            apps.patch_namespaced_deployment_scale(name=deploy_name, namespace="default", body={"spec": {"replicas": orig_replicas}})
     except Exception as e:
         logging.error(f"[AI-SCHED] failed to scale back deployment {deploy_name}: {e}")
 
-    if new_pod_name is None:
-        logging.error("[AI-SCHED] Cold-start benchmark timed out")
+    if timeline is None or ack is None:
+        logging.error(f"[AI-SCHED] Cold-start benchmark timed out ({'no first message' if timeline else 'pod not ready'})")
         return None
 
-    append_benchmark("cold", duration_ms)
-    logging.info(f"[AI-SCHED] Cold-start benchmark: pod={new_pod_name} time_ms={int(duration_ms)}")
+    ack, received_at = ack
+    phases = {**timeline.phases_ms(start), **ack_phases_ms(ack, start)}
+    duration_ms = (received_at - start) * 1000.0
 
-    return duration_ms
\ No newline at end of file
+    append_benchmark("cold", duration_ms, phases)
+    logging.info(f"[AI-SCHED] Cold-start benchmark: pod={new_pod_name} time_ms={int(duration_ms)} phases={phases}")
+
+    return duration_ms
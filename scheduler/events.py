@@ -0,0 +1,107 @@
+import os, time, queue
+
+DEBOUNCE = float(os.getenv("EVENT_DEBOUNCE", "2"))  # seconds to coalesce a burst of events
+RESCHEDULE_MIN_INTERVAL = float(os.getenv("RESCHEDULE_MIN_INTERVAL", "10"))
+PREDICT_MIN_INTERVAL = float(os.getenv("PREDICT_MIN_INTERVAL", "5"))
+RESYNC_INTERVAL = float(os.getenv("RESYNC_INTERVAL", "300"))  # full round even without events
+SCALE_DOWN_STABLE = float(os.getenv("SCALE_DOWN_STABLE", "120"))  # seconds a lower target must hold
+
+# event kinds
+PODS = "pods"
+METRICS = "metrics"
+RESYNC = "resync"
+
+
+class SchedulerEvents:
+    """
+    Single queue for everything that can make a scheduling round worthwhile:
+      - Kubernetes watch streams on the machine / processor pods (added, deleted, phase change)
+      - processor metric updates arriving over MQTT (emitted by the metrics callback)
+    wait() blocks for the first event, then coalesces whatever else arrives within DEBOUNCE seconds.
+    """
+
+    def __init__(self, namespace: str = "default"):
+        self.namespace = namespace
+        self.queue = queue.Queue()
+
+    def emit(self, kind: str, detail: str = ""):
+        self.queue.put((kind, detail))
+
+    def wait(self, timeout: float) -> dict:
+        """{kind: set(details)} of the coalesced events, {RESYNC: set()} when nothing happened in timeout."""
+        try:
+            kind, detail = self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return {RESYNC: set()}
+
+        events = {kind: {detail}}
+        deadline = time.time() + DEBOUNCE
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                kind, detail = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            events.setdefault(kind, set()).add(detail)
+        return events
+
+    ############################################
+    # Kubernetes pod watches
+    ############################################
+    def watch_pods(self, label: str):
+        """Emit a PODS event whenever an app=<label> pod is added, deleted, or changes phase."""
+        from pod_tracker import get_tracker  # Kubernetes client; the simulator imports this module without one
+        get_tracker(f"app={label}").add_listener(lambda: self.emit(PODS, label))
+
+
+class RateLimiter:
+    """Lets an action through at most once every `interval` seconds."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.last = 0.0
+
+    def ready(self, now: float = None) -> bool:
+        return self.wait_time(now) <= 0
+
+    def wait_time(self, now: float = None) -> float:
+        """Seconds until the action may run again."""
+        now = time.time() if now is None else now
+        return max(0.0, self.interval - (now - self.last))
+
+    def mark(self, now: float = None):
+        self.last = time.time() if now is None else now
+
+
+class Hysteresis:
+    """
+    Scale-up targets apply immediately, scale-down targets only after they have been
+    proposed continuously for `stable` seconds, so a noisy prediction cannot flap the pool.
+    """
+
+    def __init__(self, stable: float = SCALE_DOWN_STABLE, initial: int = 0):
+        self.stable = stable
+        self.current = initial
+        self.lower_since = None
+
+    def propose(self, target: int, now: float = None):
+        """Returns the target to apply now, or None to leave the pool as it is."""
+        now = time.time() if now is None else now
+
+        if target > self.current:
+            self.current, self.lower_since = target, None
+            return target
+
+        if target == self.current:
+            self.lower_since = None
+            return None
+
+        if self.lower_since is None:
+            self.lower_since = now
+            return None
+        if now - self.lower_since >= self.stable:
+            self.current, self.lower_since = target, None
+            return target
+        return None
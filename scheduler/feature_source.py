@@ -0,0 +1,112 @@
+import os, json, time, logging, threading
+
+TAIL_BACKFILL_BYTES = int(os.getenv("TAIL_BACKFILL_BYTES", str(1024 * 1024)))
+SNAPSHOT_MAX_AGE = float(os.getenv("SNAPSHOT_MAX_AGE", "300"))  # seconds, older processors are considered gone
+
+
+class EventTailReader:
+    """
+    Follows the collector's raw_events.jsonl like `tail -F`:
+      - on first open only the last TAIL_BACKFILL_BYTES are read to seed the snapshots
+      - every poll() reads just the bytes appended since the previous poll
+      - a partial trailing line is kept until its newline arrives
+      - rotation (new inode) drains the old file first, truncation restarts at offset 0
+    and keeps the most recent event per processor in memory.
+    """
+
+    def __init__(self, path: str, key: str = "processor_id", backfill_bytes: int = TAIL_BACKFILL_BYTES):
+        self.path = path
+        self.key = key
+        self.backfill_bytes = backfill_bytes
+        self.file = None
+        self.inode = None
+        self.partial = b""
+        self.latest = {}
+        self.lock = threading.Lock()
+
+    def _open(self, backfill: bool):
+        self.file = open(self.path, "rb")
+        self.inode = os.fstat(self.file.fileno()).st_ino
+        self.partial = b""
+
+        size = os.fstat(self.file.fileno()).st_size
+        start = max(0, size - self.backfill_bytes) if backfill else 0
+        self.file.seek(start)
+        if start > 0:
+            self.file.readline()  # drop the line we landed in the middle of
+
+    def poll(self) -> int:
+        """Read everything appended since the last call; returns the number of new events."""
+        with self.lock:
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                return 0
+
+            if self.file is None:
+                self._open(backfill=True)
+                logging.info(f"[AI-SCHED] Following {self.path} from offset {self.file.tell()}")
+
+            # Compare the size with the offset from before this read: appends that land while
+            # reading only make the file longer, so they can never look like a truncation
+            if st.st_ino == self.inode and st.st_size < self.file.tell():
+                logging.info(f"[AI-SCHED] {self.path} truncated, restarting at offset 0")
+                self.file.seek(0)
+                self.partial = b""
+
+            count = self._consume(self.file.read())
+
+            if st.st_ino != self.inode:
+                logging.info(f"[AI-SCHED] {self.path} rotated, reopening")
+                self.file.close()
+                self._open(backfill=False)
+                count += self._consume(self.file.read())
+
+            return count
+
+    def _consume(self, data: bytes) -> int:
+        if not data:
+            return 0
+
+        lines = (self.partial + data).split(b"\n")
+        self.partial = lines.pop()
+
+        count = 0
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                obj = json.loads(line)
+            except ValueError:  # partly written or not UTF-8
+                continue
+            if not isinstance(obj, dict):
+                logging.debug(f"[AI-SCHED] Skipping non-object event in {self.path}: {line[:80]!r}")
+                continue
+            try:
+                timestamp = float(obj.get("timestamp", 0))
+            except (TypeError, ValueError):
+                logging.debug(f"[AI-SCHED] Skipping event with a bad timestamp in {self.path}: {line[:80]!r}")
+                continue
+
+            key = obj.get(self.key, "unknown")
+            current = self.latest.get(key)
+            if current is None or timestamp >= float(current.get("timestamp", 0)):
+                self.latest[key] = obj
+            count += 1
+        return count
+
+    def snapshots(self, max_age: float = SNAPSHOT_MAX_AGE) -> dict:
+        """Latest event per processor, skipping processors that have not reported for max_age seconds."""
+        now = time.time()
+        with self.lock:
+            return {
+                k: v for k, v in self.latest.items()
+                if max_age <= 0 or now - float(v.get("timestamp", 0)) <= max_age
+            }
+
+    def newest(self) -> dict:
+        """The single most recent event across all processors, or {}."""
+        snaps = self.snapshots(max_age=0)
+        if not snaps:
+            return {}
+        return max(snaps.values(), key=lambda e: float(e.get("timestamp", 0)))
@@ -1,11 +1,29 @@
-import logging, sys, time, math
-from time import sleep
+import logging, sys, time, os, json, threading
 from kubernetes import client, config
-
-MAX_MACHINES_PER_PROCESSOR = 2
+from assignment import get_engine, required_processors, count_migrations
+from pod_tracker import get_tracker
+import telemetry
+
+MAX_MACHINES_PER_PROCESSOR = int(os.getenv("MAX_MACHINES_PER_PROCESSOR", "2"))
+PROCESSOR_RATE_CAPACITY = float(os.getenv("PROCESSOR_RATE_CAPACITY", "0"))  # msgs/s per processor, 0 = count only
+ASSIGNMENT_ENGINE = os.getenv("ASSIGNMENT_ENGINE", "balanced")  # balanced | hash
+ASSIGNMENT_TOPIC = "assignments/{processor}"
+METRICS_TOPIC = "metrics/+"
+MACHINES_TOPIC = "machines/+"  # retained {"machines": [...]} per load generator, cleared by its last will
+METRICS_MAX_AGE = 60  # seconds; older processor metrics are ignored for load estimates
+
+# Last assignment seen per processor (retained `assignments/<processor>` messages and our own pushes)
+known_assignments = {}
+assignments_lock = threading.Lock()
+# Latest metrics payload per processor, feeds the load-aware assignment
+processor_metrics = {}
+# Virtual machines per load generator (machine/loadgen.py), assigned next to the machine pods
+virtual_machines = {}
+
+engine = get_engine(ASSIGNMENT_ENGINE, MAX_MACHINES_PER_PROCESSOR)
 
 logging.basicConfig(
-    level=logging.INFO,
+    level=os.getenv("LOG_LEVEL", "INFO"),
     handlers=[logging.StreamHandler(sys.stdout)],
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
@@ -22,117 +40,207 @@ except:
 # Given machines = [m1, m2, m3, ..., mn]
 # and processors = [p1, p2, p3, ..., pk]
 
-# Max per processor = 2
-# Distribution example (n=7 machines, k=3 processors):
-# ASSIGNED_MACHINES = [m1, m2] # use os.getenv(ASSIGNED_MACHINES) to get the assigned machines per processor
+# Max per processor = 2, pool size = ceil(n / 2) (or more if PROCESSOR_RATE_CAPACITY says so)
+# Distribution example (n=7 machines, k=4 processors), see assignment.py for the engines:
+# ASSIGNED_MACHINES = [m1, m2] # published retained on assignments/p1, applied live by the processor
 # ASSIGNED_MACHINES = [m3, m4] # then
-# ASSIGNED_MACHINES = [m5, m6, m7]   <-- odd remainder goes here
+# ASSIGNED_MACHINES = [m5, m6]
+# ASSIGNED_MACHINES = [m7]     <-- balanced on observed message rate, machines stay put between rounds
 #######
 
-def schedule():
-    running_machine_names = wait_for_pods("machine", 5)
-    logging.info(f"[AI-SCHED] scheduling started with {len(running_machine_names)} machines.")
-    if  running_machine_names:
-        scale_processors_based_on_machines(len(running_machine_names))
-        logging.info(f"[AI-SCHED] Wait 10 secs for the processors to get ready.")
-        sleep(10) # Wait 30 seconds for the pods to come life
-        running_processor_names = [
-            name.replace('-', '_') for name in wait_for_pods("processor", 2)
-        ]
-        assignments_matrix = assign_machines_to_processors(running_machine_names, running_processor_names)
-        update_processor_assignments(assignments_matrix)
-
-def scale_processors_based_on_machines(num_machines: int):
-    apps = client.AppsV1Api()
-    required = math.floor(num_machines / MAX_MACHINES_PER_PROCESSOR)
+def running_machines() -> list:
+    """Machine pods plus the virtual machines of the load generators."""
+    virtual = registered_machines()
+    # a cluster driven by a load generator alone need not wait for machine pods
+    return wait_for_pods("machine", 0 if virtual else 5) + virtual
 
-    deploy = apps.read_namespaced_deployment_scale(
-        name="processor",
-        namespace="default"
+def scale_processors_based_on_machines(num_machines: int) -> int:
+    apps = client.AppsV1Api()
+    required = required_processors(
+        num_machines, MAX_MACHINES_PER_PROCESSOR,
+        total_load=sum(machine_rates().values()), load_capacity=PROCESSOR_RATE_CAPACITY
     )
 
+    with telemetry.k8s_call("read_scale"):
+        deploy = apps.read_namespaced_deployment_scale(
+            name="processor",
+            namespace="default"
+        )
+
     current = deploy.spec.replicas
 
     if current == required:
         logging.info(f"[AI-SCHED] Processor count OK: {current}")
-        return
+        return required
 
     logging.info(f"[AI-SCHED] Scaling processors from {current} → {required}")
+    telemetry.DECISIONS.labels("processor_scale_up" if required > current else "processor_scale_down").inc()
 
-    apps.patch_namespaced_deployment_scale(
-        name="processor",
-        namespace="default",
-        body={"spec": {"replicas": required}}
-    )
+    with telemetry.k8s_call("scale_processor"):
+        apps.patch_namespaced_deployment_scale(
+            name="processor",
+            namespace="default",
+            body={"spec": {"replicas": required}}
+        )
+    return required
 
 def assign_machines_to_processors(machine_ids: list, processor_ids: list) -> dict:
-    assignments: dict = {p: [] for p in processor_ids}
-    p_idx = 0
-
-    for m in machine_ids:
-        assignments[processor_ids[p_idx]].append(m)
+    with assignments_lock:
+        previous = dict(known_assignments)
+    stats = dict(processor_metrics)
 
-        if len(assignments[processor_ids[p_idx]]) >= MAX_MACHINES_PER_PROCESSOR:
-            p_idx += 1
-            if p_idx >= len(processor_ids):  # overflow → last one gets all remaining
-                p_idx = len(processor_ids) - 1
+    if len(processor_ids) * MAX_MACHINES_PER_PROCESSOR < len(machine_ids):
+        logging.warning(f"[AI-SCHED] {len(processor_ids)} processors for {len(machine_ids)} machines, "
+                        f"some get more than {MAX_MACHINES_PER_PROCESSOR} until the scale-up is running")
+    assignments = engine.assign(machine_ids, processor_ids, previous, machine_rates(), stats)
 
-    logging.info(f"[AI-SCHED] initial scheduling, machine assignment to processors {assignments}")
+    migrations = count_migrations(previous, assignments)
+    telemetry.MIGRATIONS.inc(migrations)
+    logging.info(f"[AI-SCHED] {engine.name} scheduling, {migrations} machines moved")
+    logging.debug(f"[AI-SCHED] Machine assignment to processors {assignments}")
 
     return assignments
 
+def machine_rates() -> dict:
+    """
+    Observed msgs/s per machine, as reported by the processors currently handling them. During a
+    hand-out both pods report a machine; the one it is assigned to wins, whatever order they report in.
+    """
+    rates = {}
+    now = time.time()
+    with assignments_lock:
+        owner = {m: p for p, ms in known_assignments.items() for m in ms}
+    for processor, stats in list(processor_metrics.items()):
+        if now - float(stats.get("timestamp", 0)) > METRICS_MAX_AGE:
+            continue
+        for m, rate in stats.get("machine_rates", {}).items():
+            if owner.get(m) in (None, processor):
+                rates[m] = rate
+    return rates
+
+
+def track_assignments(mqtt_client):
+    """Learn the retained assignments so diffs survive a scheduler restart."""
+    mqtt_client.message_callback_add(ASSIGNMENT_TOPIC.format(processor="+"), on_assignment_message)
+    mqtt_client.subscribe(ASSIGNMENT_TOPIC.format(processor="+"), qos=1)
+
+def on_assignment_message(client, userdata, msg):
+    processor = msg.topic.split("/", 1)[1]
+    try:
+        payload = json.loads(msg.payload.decode()) if msg.payload else {}
+    except json.JSONDecodeError:
+        logging.error(f"[AI-SCHED] Bad retained assignment on {msg.topic}")
+        return
 
-def update_processor_assignments(assignments: dict):
-    apps = client.AppsV1Api()
+    with assignments_lock:
+        if msg.payload:
+            # an explicit empty assignment is kept, so the next round sees no change to push
+            machines = payload.get("machines", []) if isinstance(payload, dict) else payload
+            known_assignments[processor] = sorted(machines)
+        else:
+            known_assignments.pop(processor, None)  # retained message deleted
+
+
+def track_metrics(mqtt_client, on_update=None):
+    """Cache every processor's latest metrics; on_update(processor) is called after each update."""
+    def on_metrics_message(client, userdata, msg):
+        try:
+            payload = json.loads(msg.payload.decode())
+        except json.JSONDecodeError:
+            return
+        processor = msg.topic.split("/", 1)[1]
+        processor_metrics[processor] = payload
+        if on_update:
+            on_update(processor)
+
+    mqtt_client.message_callback_add(METRICS_TOPIC, on_metrics_message)
+    mqtt_client.subscribe(METRICS_TOPIC)
+
+
+def track_machines(mqtt_client, on_update=None):
+    """Follow the load generators' retained machine lists; on_update() is called after each change."""
+    def on_machines_message(client, userdata, msg):
+        generator = msg.topic.split("/", 1)[1]
+        try:
+            payload = json.loads(msg.payload.decode()) if msg.payload else {}
+        except json.JSONDecodeError:
+            logging.error(f"[AI-SCHED] Bad machine registration on {msg.topic}")
+            return
+        machines = payload.get("machines", []) if isinstance(payload, dict) else []
+        if machines:
+            virtual_machines[generator] = [str(m) for m in machines if m]
+        else:
+            virtual_machines.pop(generator, None)
+        logging.info(f"[AI-SCHED] {generator}: {len(machines)} virtual machines registered")
+        if on_update:
+            on_update()
+
+    mqtt_client.message_callback_add(MACHINES_TOPIC, on_machines_message)
+    mqtt_client.subscribe(MACHINES_TOPIC, qos=1)
+
+def registered_machines() -> list:
+    return sorted(m for machines in list(virtual_machines.values()) for m in machines)
+
+
+def update_processor_assignments(assignments: dict, mqtt_client):
+    """
+    Push only the processors whose machine set changed as retained `assignments/<processor>`
+    messages; processors that disappeared get their retained message cleared.
+    The processors apply the change in place, no Deployment rollout involved.
+    """
+    start = time.time()
+    changed = 0
+
+    with assignments_lock:
+        previous = dict(known_assignments)
 
-    env_list = []
     for proc, machines in assignments.items():
-        env_list.append({
-            "name": f"ASSIGNED_MACHINES_{proc}",
-            "value": ",".join(machines)
-        })
-
-    patch = {
-        "spec": {
-            "template": {
-                "spec": {
-                    "containers": [{
-                        "name": "processor",
-                        "env": env_list
-                    }]
-                }
-            }
-        }
-    }
-
-    apps.patch_namespaced_deployment(
-        name="processor",
-        namespace="default",
-        body=patch
-    )
+        machines = sorted(machines)
+        if previous.get(proc) == machines:
+            continue
+        publish_assignment(proc, machines, mqtt_client)
+        changed += 1
 
-    logging.info(f"[AI-SCHED] Processor assignment done: {assignments}.")
+    for proc in set(previous) - set(assignments):
+        # an empty retained payload deletes the retained message
+        mqtt_client.publish(ASSIGNMENT_TOPIC.format(processor=proc), b"", qos=1, retain=True)
+        with assignments_lock:
+            known_assignments.pop(proc, None)
+        changed += 1
 
+    duration_ms = (time.time() - start) * 1000.0
+    logging.info(f"[AI-SCHED] Processor assignment done: {changed} updates pushed in {duration_ms:.1f} ms.")
 
-def wait_for_pods(label_selector: str, expected_count: int, timeout:int = 120) -> list:
-    apps = client.CoreV1Api()
-    start = time.time()
 
-    while time.time() - start < timeout:
-        pods = apps.list_namespaced_pod(
-            namespace="default",
-            label_selector=f"app={label_selector}"
-        ).items
+def publish_assignment(proc: str, machines: list, mqtt_client):
+    payload = {"machines": sorted(machines), "version": int(time.time() * 1000)}
+    mqtt_client.publish(ASSIGNMENT_TOPIC.format(processor=proc), json.dumps(payload), qos=1, retain=True)
+    with assignments_lock:
+        known_assignments[proc] = sorted(machines)
 
-        running_pods = [p for p in pods if p.status.phase == "Running"]
-        logging.info(f"[AI-SCHED] Found {len(running_pods)} running `{label_selector}` pods.")
 
-        if len(running_pods) >= expected_count:
-            running_pod_names = [p.metadata.name for p in running_pods]
-            logging.info(f"[AI-SCHED] Ready: Found {len(running_pods)} ´{label_selector}´pods")
-            return running_pod_names
+def return_machines(pod: str, source: str, mqtt_client):
+    """Give whatever `pod` still holds back to `source`, after a hand-out that did not come up."""
+    with assignments_lock:
+        machines = list(known_assignments.get(pod, []))
+        current = list(known_assignments.get(source, []))
+    if machines:
+        publish_assignment(source, current + machines, mqtt_client)
+    publish_assignment(pod, [], mqtt_client)
+
+
+def assigned_machines(proc: str) -> list:
+    with assignments_lock:
+        return list(known_assignments.get(proc, []))
+
+
+def wait_for_pods(label_selector: str, expected_count: int, timeout:int = 120) -> list:
+    """Names of the running `app=<label_selector>` pods once there are at least expected_count."""
+    tracker = get_tracker(f"app={label_selector}")
+    running_pod_names = tracker.wait_for_count(expected_count, timeout)
 
-        logging.info(f"[AI-SCHED] Waiting: {len(running_pods)} running pods for {label_selector}, need at least {expected_count}")
-        time.sleep(3)
+    if running_pod_names is None:
+        raise TimeoutError(f"[AI-SCHED] Timed out waiting for {label_selector} to reach {expected_count} pods.")
 
-    raise TimeoutError(f"[AI-SCHED] Timed out waiting for {label_selector} to reach {expected_count} pods.")
\ No newline at end of file
+    logging.info(f"[AI-SCHED] Ready: Found {len(running_pod_names)} ´{label_selector}´pods")
+    return running_pod_names
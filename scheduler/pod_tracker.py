@@ -0,0 +1,197 @@
+import time, logging, threading
+from kubernetes import client, watch
+from kubernetes.client.rest import ApiException
+import telemetry
+
+# Lifecycle phases in the order a healthy pod passes them
+PHASES = ["created", "scheduled", "image_pulled", "container_started", "ready"]
+
+
+class PodTimeline:
+    """Wall-clock time (epoch seconds, ms resolution) at which each lifecycle phase was first observed."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.observed = {}
+        self.phase = None
+        self.deleted = False
+        self.terminating = False
+
+    def mark(self, phase: str, now: float):
+        self.observed.setdefault(phase, now)
+
+    @property
+    def ready(self) -> bool:
+        return "ready" in self.observed
+
+    def phases_ms(self, start: float) -> dict:
+        """{phase}_ms relative to `start` for every phase seen so far."""
+        return {f"{p}_ms": round((self.observed[p] - start) * 1000.0, 1) for p in PHASES if p in self.observed}
+
+
+def observed_phases(pod) -> list:
+    """Lifecycle phases the pod object has reached."""
+    phases = ["created"]
+    conditions = {c.type: c.status for c in (pod.status.conditions or [])}
+    statuses = pod.status.container_statuses or []
+
+    if conditions.get("PodScheduled") == "True":
+        phases.append("scheduled")
+    if any(s.image_id for s in statuses):
+        phases.append("image_pulled")
+    if any(s.state and s.state.running for s in statuses):
+        phases.append("container_started")
+    if conditions.get("Ready") == "True":
+        phases.append("ready")
+    return phases
+
+
+class PodReadinessTracker:
+    """
+    One Kubernetes watch stream per label selector, shared by everyone interested in those pods.
+    Each phase transition is stamped when the watch event arrives, so readiness timings are not
+    quantized to a poll interval. Waiters block on a condition variable instead of polling.
+    """
+
+    def __init__(self, label_selector: str, namespace: str = "default"):
+        self.label_selector = label_selector
+        self.namespace = namespace
+        self.pods = {}
+        self.listeners = []
+        self.cond = threading.Condition()
+        self.synced = threading.Event()
+        threading.Thread(target=self._watch_loop, name=f"pod-tracker-{label_selector}", daemon=True).start()
+
+    def add_listener(self, fn):
+        """fn() is called (on the watch thread) whenever a pod is added, deleted or changes phase."""
+        self.listeners.append(fn)
+
+    def _watch_loop(self):
+        v1 = client.CoreV1Api()
+        resource_version = None
+
+        while True:
+            try:
+                if resource_version is None:
+                    # list first so the initial state is complete before anyone waits on it
+                    with telemetry.k8s_call("list_pods"):
+                        pods = v1.list_namespaced_pod(self.namespace, label_selector=self.label_selector)
+                    now = time.time()
+                    with self.cond:
+                        self.pods = {}
+                        for pod in pods.items:
+                            self._apply("ADDED", pod, now)
+                        self.cond.notify_all()
+                    resource_version = pods.metadata.resource_version
+                    self.synced.set()
+
+                w = watch.Watch()
+                for event in w.stream(v1.list_namespaced_pod, namespace=self.namespace,
+                                      label_selector=self.label_selector,
+                                      resource_version=resource_version, timeout_seconds=300):
+                    now = time.time()
+                    pod = event["object"]
+                    resource_version = pod.metadata.resource_version
+                    with self.cond:
+                        changed = self._apply(event["type"], pod, now)
+                        self.cond.notify_all()
+                    if changed:
+                        for fn in self.listeners:
+                            fn()
+            except ApiException as e:
+                if e.status == 410:  # resource version too old, relist
+                    resource_version = None
+                else:
+                    logging.error(f"[AI-SCHED] Pod watch {self.label_selector} failed, restarting: {e}")
+                    time.sleep(1)
+            except Exception as e:
+                logging.error(f"[AI-SCHED] Pod watch {self.label_selector} failed, restarting: {e}")
+                time.sleep(1)
+
+    def _apply(self, event_type: str, pod, now: float) -> bool:
+        name = pod.metadata.name
+        timeline = self.pods.get(name)
+
+        if event_type == "DELETED":
+            if timeline:
+                timeline.deleted = True
+                del self.pods[name]
+            return True
+
+        if timeline is None:
+            timeline = self.pods[name] = PodTimeline(name)
+
+        before = (len(timeline.observed), timeline.phase, timeline.terminating)
+        for phase in observed_phases(pod):
+            timeline.mark(phase, now)
+        timeline.phase = pod.status.phase
+        timeline.terminating = pod.metadata.deletion_timestamp is not None
+        return before != (len(timeline.observed), timeline.phase, timeline.terminating)
+
+    ############################################
+    # Queries and waits
+    ############################################
+    def names(self) -> set:
+        self.synced.wait()
+        with self.cond:
+            return set(self.pods)
+
+    def running(self) -> list:
+        self.synced.wait()
+        with self.cond:
+            return [n for n, t in self.pods.items() if t.phase == "Running" and not t.terminating]
+
+    def wait_for_count(self, expected: int, timeout: float) -> list:
+        """Names of the Running pods once there are at least `expected`, or None on timeout."""
+        self.synced.wait(timeout)
+        end = time.time() + timeout
+        with self.cond:
+            while True:
+                running = [n for n, t in self.pods.items() if t.phase == "Running" and not t.terminating]
+                if len(running) >= expected:
+                    return running
+                remaining = end - time.time()
+                if remaining <= 0:
+                    return None
+                self.cond.wait(remaining)
+
+    def wait_for_new_pod(self, known: set, timeout: float):
+        """Name of the first pod not in `known`, or None on timeout."""
+        self.synced.wait(timeout)
+        end = time.time() + timeout
+        with self.cond:
+            while True:
+                added = [n for n in self.pods if n not in known]
+                if added:
+                    return min(added, key=lambda n: self.pods[n].observed["created"])
+                remaining = end - time.time()
+                if remaining <= 0:
+                    return None
+                self.cond.wait(remaining)
+
+    def wait_for_ready(self, name: str, timeout: float):
+        """The pod's PodTimeline once it is Ready, or None on timeout / deletion."""
+        end = time.time() + timeout
+        with self.cond:
+            while True:
+                timeline = self.pods.get(name)
+                if timeline is None and self.synced.is_set():
+                    return None
+                if timeline and timeline.ready:
+                    return timeline
+                remaining = end - time.time()
+                if remaining <= 0:
+                    return None
+                self.cond.wait(remaining)
+
+
+_trackers = {}
+_trackers_lock = threading.Lock()
+
+def get_tracker(label_selector: str, namespace: str = "default") -> PodReadinessTracker:
+    """Shared tracker per (namespace, label selector); the watch starts on first use."""
+    with _trackers_lock:
+        key = (namespace, label_selector)
+        if key not in _trackers:
+            _trackers[key] = PodReadinessTracker(label_selector, namespace)
+        return _trackers[key]
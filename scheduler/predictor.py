@@ -0,0 +1,80 @@
+import os, math, hashlib, logging, threading
+import numpy as np
+import xgboost as xgb
+
+PREWARM_THRESHOLD = float(os.getenv("PREWARM_THRESHOLD", "0.5"))
+MIN_PREWARM = int(os.getenv("MIN_PREWARM", "1"))
+MAX_PREWARM = int(os.getenv("MAX_PREWARM", "3"))
+
+
+class ModelCache:
+    """
+    Keeps the XGBoost Booster in memory. get() only stats the model file; the file is re-read when
+    its (mtime, size) changes, and the Booster is rebuilt only when the content hash changed too.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.model = None
+        self.features = None
+        self.signature = None
+        self.digest = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        """(booster, feature_names), or (None, None) while no model has been trained."""
+        with self.lock:
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                if self.model is None:
+                    logging.warning("[AI-SCHED] No model found -> prediction disabled.")
+                return self.model, self.features
+
+            signature = (st.st_mtime_ns, st.st_size)
+            if signature == self.signature:
+                return self.model, self.features
+
+            with open(self.path, "rb") as f:
+                raw = f.read()
+            digest = hashlib.sha256(raw).hexdigest()
+            self.signature = signature
+            if digest == self.digest:
+                return self.model, self.features
+
+            model = xgb.Booster()
+            model.load_model(bytearray(raw))
+            if model.feature_names is None:
+                raise RuntimeError("Model has no feature names!")
+
+            self.model, self.features, self.digest = model, model.feature_names, digest
+            logging.info(f"[AI-SCHED] XGB model (re)loaded, sha256={digest[:12]}")
+            return self.model, self.features
+
+
+def predict_processor_probabilities(model, features: list, rows: dict) -> dict:
+    """Score every processor's feature row in one vectorized inplace_predict call."""
+    if not rows:
+        return {}
+
+    processors = list(rows)
+    # ordering is crucial
+    matrix = np.array([[rows[p][f] for f in features] for p in processors], dtype=np.float32)
+    probs = model.inplace_predict(matrix)
+
+    return {p: float(prob) for p, prob in zip(processors, probs)}
+
+
+def scale_decision(probs: dict, threshold: float = PREWARM_THRESHOLD,
+                   min_prewarm: int = MIN_PREWARM, max_prewarm: int = MAX_PREWARM) -> int:
+    """
+    Prewarm pool size from the per-processor overload probabilities: the number of processors above
+    the threshold or the expected number of overloads (sum of probabilities), whichever is larger,
+    clamped to [min_prewarm, max_prewarm]. 0 when no processor has any overload probability.
+    """
+    if not probs or max(probs.values()) <= 0:
+        return 0
+
+    at_risk = sum(1 for p in probs.values() if p > threshold)
+    expected = math.ceil(sum(probs.values()))
+    return max(min_prewarm, min(max_prewarm, max(at_risk, expected)))
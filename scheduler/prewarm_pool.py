@@ -0,0 +1,239 @@
+import os, json, time, logging, threading
+
+REGISTRY_TOPIC = "registry/+"  # retained {"processor_id", "mode", "origin", ...}; empty = gone (last will)
+MAX_POOL_REPLICAS = int(os.getenv("MAX_POOL_REPLICAS", "10"))  # idle pods at most, handed-out pods come on top
+HANDOUT_THRESHOLD = float(os.getenv("HANDOUT_THRESHOLD", "0.8"))  # overload probability that takes a READY pod
+HANDOUT_COOLDOWN = float(os.getenv("HANDOUT_COOLDOWN", "300"))  # seconds before the same processor gets another
+HANDOUT_LEASE = float(os.getenv("HANDOUT_LEASE", "300"))  # seconds a handed-out pod serves before it is retired
+IDLE_MODES = ("PREWARM", "HYDRATING", "READY")
+# controller.kubernetes.io/pod-deletion-cost: the ReplicaSet removes the lowest first on scale-down
+PROTECTED_COST = 1000  # serving pods
+RETIRED_COST = -1000  # retired pods, before any idle one
+
+
+def hydration_sources(probs: dict, count: int) -> list:
+    """The `count` processors most likely to overload; their state is what prewarm pods take over."""
+    ranked = sorted((p for p in probs if p != "latest"), key=lambda p: probs[p], reverse=True)
+    return ranked[:count]
+
+
+class PrewarmPool:
+    """
+    In-memory inventory of the prewarm-processor pods, built from their registrations instead of
+    pod listings. Pods announce every mode transition (PREWARM -> HYDRATING -> READY -> ACTIVE) on
+    their retained registry topic and the broker clears it with their last will when they die.
+      - a pod that registers as PREWARM is sent hydrate right away, from the next preferred source
+      - the deployment is kept at (pods serving) + target, so `target` pods stay idle and hydrated
+      - acquire() hands out a READY pod from the inventory, activate() is one MQTT publish
+      - a handed-out pod serves next to the processor deployment for HANDOUT_LEASE seconds, then the
+        scheduler retires it once its cold processors are up; retire() shrinks the deployment by it
+    scale_fn(replicas) scales the deployment, cost_fn(pod, cost) sets a pod's deletion cost so the
+    ReplicaSet keeps serving pods and removes retired ones first, delete_fn(pod) deletes a retired pod
+    in case the ReplicaSet picked a not yet ready one instead. Only the simulator replaces clock
+    (simulated time).
+    """
+
+    def __init__(self, mqtt_client, scale_fn, cost_fn=None, delete_fn=None, clock=time.time):
+        self.mqtt = mqtt_client
+        self.scale_fn = scale_fn
+        self.cost_fn = cost_fn
+        self.delete_fn = delete_fn
+        self.clock = clock
+        self.cond = threading.Condition()
+        self.pods = {}  # pod -> last registration
+        self.hydrating = set()  # hydrate sent, READY not seen yet
+        self.claimed = set()  # handed out, ACTIVE not seen yet
+        self.serving = {}  # handed out and not retired: pod -> time of the hand-out
+        self.retired = set()  # retired, still registered until the ReplicaSet removes them
+        self.handed_to = {}  # source processor -> time of its last hand-out
+        self.target = None  # unknown until the first prediction round; nothing is scaled before
+        self.sources = []
+        self.replicas = None
+        self.next_source = 0
+
+    def track(self, mqtt_client):
+        mqtt_client.message_callback_add(REGISTRY_TOPIC, self._on_registration)
+        mqtt_client.subscribe(REGISTRY_TOPIC, qos=1)
+
+    ############################################
+    # Inventory
+    ############################################
+    def _on_registration(self, client, userdata, msg):
+        pod = msg.topic.split("/", 1)[1]
+        with self.cond:
+            if not msg.payload:
+                self.pods.pop(pod, None)
+                self.hydrating.discard(pod)
+                self.claimed.discard(pod)
+                self.serving.pop(pod, None)
+                self.retired.discard(pod)
+            else:
+                try:
+                    registration = json.loads(msg.payload.decode())
+                except Exception as e:
+                    logging.error(f"[AI-SCHED] Bad registration from {pod}: {e}")
+                    return
+                if registration.get("origin") != "prewarm":
+                    return
+                registration["seen"] = self.clock()
+                self.pods[pod] = registration
+                if registration["mode"] != "PREWARM":
+                    self.hydrating.discard(pod)
+                if registration["mode"] == "ACTIVE":
+                    self.claimed.discard(pod)
+                    if pod not in self.serving and pod not in self.retired:
+                        self.serving[pod] = self.clock()  # handed out before a scheduler restart
+                if registration["mode"] == "READY":
+                    logging.info(f"[AI-SCHED] Pool: {pod} READY ({registration.get('status')} from "
+                                 f"{registration.get('source')}, version {registration.get('version')})")
+            self.cond.notify_all()
+        self.reconcile()
+
+    def in_mode(self, *modes) -> list:
+        with self.cond:
+            return [p for p, r in self.pods.items() if r["mode"] in modes]
+
+    def idle(self) -> list:
+        return self.in_mode(*IDLE_MODES)
+
+    def ready(self) -> list:
+        with self.cond:
+            return [p for p, r in self.pods.items() if r["mode"] == "READY" and p not in self.claimed]
+
+    def ready_sources(self) -> list:
+        """Hydration sources of the READY pods, so a hand-out can split a processor a pod is warm for."""
+        with self.cond:
+            return sorted({r.get("source") for p, r in self.pods.items()
+                           if r["mode"] == "READY" and p not in self.claimed and r.get("source")})
+
+    def serving_pods(self) -> list:
+        """Handed-out pods that are ACTIVE and not retired; schedule() assigns machines to them too."""
+        with self.cond:
+            return sorted(p for p in self.serving if self.pods.get(p, {}).get("mode") == "ACTIVE")
+
+    ############################################
+    # Target and hydration
+    ############################################
+    def set_target(self, target: int, sources: list):
+        with self.cond:
+            self.target = target
+            self.sources = list(sources)
+        self.reconcile()
+
+    def reconcile(self):
+        """Scale the deployment to serving + target and hydrate every newly parked pod."""
+        with self.cond:
+            if self.target is None:
+                return
+            # serving pods carry load and stay until retired; the cap only bounds the idle pods, so
+            # hand-outs can never use up the pool
+            replicas = len(self.serving) + min(self.target, MAX_POOL_REPLICAS)
+            scale = replicas != self.replicas
+            self.replicas = replicas
+
+            to_hydrate = []
+            if self.target > 0:
+                for pod, r in self.pods.items():
+                    if r["mode"] == "PREWARM" and pod not in self.hydrating:
+                        self.hydrating.add(pod)
+                        to_hydrate.append((pod, self._pick_source()))
+
+        if scale:
+            try:
+                self.scale_fn(replicas)
+            except Exception as e:
+                logging.error(f"[AI-SCHED] Pool: scaling to {replicas} failed: {e}")
+                with self.cond:
+                    self.replicas = None  # retry on the next reconcile
+        for pod, source in to_hydrate:
+            self.mqtt.publish(f"prewarm/{pod}/hydrate", json.dumps({"source": source}), qos=1)
+            logging.info(f"[AI-SCHED] Pool: hydrating {pod} from {source or 'nothing (cold)'}")
+
+    def _pick_source(self):
+        if not self.sources:
+            return None
+        source = self.sources[self.next_source % len(self.sources)]
+        self.next_source += 1
+        return source
+
+    ############################################
+    # Hand-out
+    ############################################
+    def acquire(self, source: str = None, timeout: float = 0.0):
+        """
+        A READY pod hydrated from `source` (any READY pod without one), or None if there is none
+        within timeout. A pod warm for another processor holds the wrong rings, so that is a miss.
+        """
+        end = self.clock() + timeout
+        with self.cond:
+            while True:
+                ready = [p for p, r in self.pods.items() if r["mode"] == "READY" and p not in self.claimed
+                         and (source is None or r.get("source") == source)]
+                if ready:
+                    pod = ready[0]
+                    self.claimed.add(pod)
+                    self.serving[pod] = self.clock()
+                    if source:
+                        self.handed_to[source] = self.clock()
+                    return pod
+                remaining = end - self.clock()
+                if remaining <= 0:
+                    return None
+                self.cond.wait(remaining)
+
+    def activate(self, pod: str, payload: dict = None):
+        """Send activate and scale up a replacement, so the pool stays at target."""
+        self._set_cost(pod, PROTECTED_COST)
+        self.mqtt.publish(f"prewarm/{pod}/activate", json.dumps(payload or {}), qos=1)
+        logging.info(f"[AI-SCHED] Pool: activating {pod}")
+        self.reconcile()
+
+    def expired(self, lease: float = HANDOUT_LEASE) -> list:
+        """Handed-out pods whose lease is over, due for retirement."""
+        now = self.clock()
+        with self.cond:
+            return sorted(p for p, at in self.serving.items() if now - at >= lease)
+
+    def retire(self, pod: str):
+        """Stop counting a handed-out pod and scale the deployment down by it."""
+        with self.cond:
+            if self.serving.pop(pod, None) is None:
+                return
+            self.claimed.discard(pod)
+            self.retired.add(pod)
+        self._set_cost(pod, RETIRED_COST)
+        logging.info(f"[AI-SCHED] Pool: retiring {pod}")
+        self.reconcile()
+        if self.delete_fn:
+            try:
+                self.delete_fn(pod)
+            except Exception as e:
+                logging.error(f"[AI-SCHED] Could not delete retired {pod}: {e}")
+
+    def _set_cost(self, pod: str, cost: int):
+        if self.cost_fn:
+            try:
+                self.cost_fn(pod, cost)
+            except Exception as e:
+                logging.error(f"[AI-SCHED] Could not set the deletion cost of {pod}: {e}")
+
+    def wait_for_mode(self, pod: str, mode: str, timeout: float):
+        """The pod's registration once it reports `mode`, or None on timeout / disappearance."""
+        end = self.clock() + timeout
+        with self.cond:
+            while True:
+                registration = self.pods.get(pod)
+                if registration and registration["mode"] == mode:
+                    return registration
+                remaining = end - self.clock()
+                if registration is None or remaining <= 0:
+                    return None
+                self.cond.wait(remaining)
+
+    def due_for_handout(self, probs: dict, threshold: float = HANDOUT_THRESHOLD, cooldown: float = HANDOUT_COOLDOWN) -> list:
+        """Processors whose overload probability calls for a READY pod now, most urgent first."""
+        now = self.clock()
+        with self.cond:
+            due = [p for p, prob in probs.items()
+                   if p != "latest" and prob >= threshold and now - self.handed_to.get(p, 0) >= cooldown]
+        return sorted(due, key=lambda p: probs[p], reverse=True)
@@ -0,0 +1,95 @@
+import time, logging
+from assignment import split_machines
+from prewarm_pool import hydration_sources, HANDOUT_LEASE, HANDOUT_THRESHOLD, HANDOUT_COOLDOWN
+
+#######
+# The scheduler's two rounds, shared by ai_scheduler.py (real cluster) and simulator.py (fakes).
+#
+# No Kubernetes or MQTT in here: both come in through a `cluster` object with
+#   machines() -> [machine]                     machine pods (+ registered virtual machines)
+#   machine_rates() -> {machine: msgs/s}
+#   scale_processors(num_machines) -> required  size the processor deployment
+#   running_processors(required) -> [processor] processor pods to assign to
+#   assign(machines, processors)                compute and push the assignment
+#   assigned(processor) -> [machine]            its current assignment
+#   publish_assignment(processor, machines)
+#   handed_out(pod, source, machines, start)    a hand-out went out at `start` (metrics, follow-up)
+#   handout_missed(source)                      no READY pod warm for source
+#   lease_over()                                a serving hand-out is due for retirement
+#######
+
+
+class ControlPlane:
+    """
+    Scheduling round: size the processor deployment and assign the machines to its running pods plus
+    the serving hand-outs. Hand-outs whose lease is over are left out and retired once every required
+    processor runs. Prediction round: size the prewarm pool through the hysteresis and hand out a
+    READY pod to every processor likely to overload.
+    """
+
+    def __init__(self, cluster, pool, hysteresis, lease: float = HANDOUT_LEASE,
+                 handout_threshold: float = HANDOUT_THRESHOLD, handout_cooldown: float = HANDOUT_COOLDOWN,
+                 clock=time.time):
+        self.cluster = cluster
+        self.pool = pool
+        self.hysteresis = hysteresis
+        self.lease = lease
+        self.handout_threshold = handout_threshold
+        self.handout_cooldown = handout_cooldown
+        self.clock = clock
+
+    def scheduling_round(self):
+        retiring = self.pool.expired(self.lease)
+        machines = self.cluster.machines()
+        logging.info(f"[AI-SCHED] scheduling started with {len(machines)} machines.")
+        if not machines:
+            return
+        required = self.cluster.scale_processors(len(machines))
+        running = self.cluster.running_processors(required)
+        serving = running + [p for p in self.pool.serving_pods() if p not in retiring]
+        if serving:
+            self.cluster.assign(machines, serving)
+        if len(running) >= required:
+            for pod in retiring:
+                self.pool.retire(pod)
+
+    def prediction_round(self, probs: dict, prewarm_count: int, benchmark: bool = False):
+        """Apply the pool size proposed for `probs`; returns the target the hysteresis let through, or None."""
+        target = self.hysteresis.propose(prewarm_count, self.clock())
+        # the pool hydrates new pods from the processors most at risk right now
+        self.pool.set_target(self.hysteresis.current, hydration_sources(probs, max(self.hysteresis.current, 1)))
+        if self.pool.expired(self.lease):
+            self.cluster.lease_over()  # a scheduling round moves their machines and retires them
+
+        due = self.pool.due_for_handout(probs, self.handout_threshold, self.handout_cooldown)
+        handed_out = [self.hand_out(source) for source in due]
+        if benchmark and self.hysteresis.current > 0 and not any(handed_out):
+            # the benchmark hand-out is a real split of a processor some READY pod is hydrated from
+            for source in self.pool.ready_sources():
+                if self.hand_out(source):
+                    break
+        return target
+
+    def hand_out(self, source: str):
+        """
+        Activate a READY pod hydrated from `source` and move part of its machines there: the pod's
+        assignment is published and it is activated with those machines before the source lets go of
+        them, so the machines are briefly processed twice rather than not at all.
+        """
+        keep, move = split_machines(self.cluster.assigned(source), self.cluster.machine_rates())
+        if not move:
+            logging.info(f"[AI-SCHED] {source} has too few machines to split, no hand-out")
+            return None
+
+        pod = self.pool.acquire(source)
+        if pod is None:
+            self.cluster.handout_missed(source)
+            return None
+
+        start = self.clock()
+        self.cluster.publish_assignment(pod, move)
+        self.pool.activate(pod, {"machines": move})
+        self.cluster.publish_assignment(source, keep)
+        logging.info(f"[AI-SCHED] Handed {len(move)} of {source}'s machines over to {pod}")
+        self.cluster.handed_out(pod, source, move, start)
+        return pod
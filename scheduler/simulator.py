@@ -0,0 +1,637 @@
+import os, sys, csv, json, math, time, heapq, random, argparse, itertools, logging
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from assignment import get_engine, required_processors, count_migrations
+from predictor import ModelCache, predict_processor_probabilities, scale_decision, \
+    PREWARM_THRESHOLD, MIN_PREWARM, MAX_PREWARM
+from events import Hysteresis, RateLimiter, RESCHEDULE_MIN_INTERVAL, PREDICT_MIN_INTERVAL, SCALE_DOWN_STABLE
+from prewarm_pool import PrewarmPool, HANDOUT_THRESHOLD, HANDOUT_COOLDOWN, HANDOUT_LEASE
+from rounds import ControlPlane
+
+logging.basicConfig(
+    level=logging.INFO,
+    handlers=[logging.StreamHandler(sys.stdout)],
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+########################################################
+# Offline discrete-event simulator of the scheduling and prewarm pipeline.
+#
+# The control plane runs the scheduler's real code against simulated time:
+#   the scheduling and prediction rounds (rounds.py), assignment engines (assignment.py),
+#   scale_decision / the XGB model (predictor.py), Hysteresis and RateLimiter (events.py), and
+#   PrewarmPool (prewarm_pool.py)
+# behind a fake MQTT broker and a fake Kubernetes cluster. Pod startups, hydration, hand-outs and
+# scheduler rounds are events on a heap. The data plane is a fluid queue per processor, advanced
+# every TICK seconds: Poisson arrivals from its machines, SERVICE_RATE msgs/s served, a
+# QUEUE_SIZE buffer that overflows into drops. Start latencies are lognormals fit to benchmark.csv.
+#
+# Simplifications, compared to the cluster:
+#   - schedule() assigns to the processors running now instead of blocking until new ones are up;
+#     the PODS event of each new processor triggers the next round
+#   - a hand-out moves half of the source's load to the pod at once; in the cluster both
+#     process the moved machines for the moment between the two assignment messages
+#   - a processor that never got an assignment holds the shared data/# subscription from the
+#     moment it runs; in the cluster it subscribes a little later, once connected
+########################################################
+
+BENCHMARK_PATH = "/data/benchmark.csv"
+MODEL_PATH = "/data/xgb_model.json"
+
+TICK = float(os.getenv("SIM_TICK", "1.0"))  # seconds per data-plane step
+METRICS_INTERVAL = 5.0  # processors publish metrics every STATE_INTERVAL seconds
+WORKLOAD_STEP = 60.0  # seconds between workload updates
+MQTT_DELAY = 0.005  # seconds from publish to delivery
+
+# Same thresholds label_features.py uses to call a processor overloaded
+CPU_THRESHOLD = 80.0
+BUFFER_THRESHOLD = 25
+
+# Fallback start latencies (median seconds, log sigma) when benchmark.csv has too few rows
+DEFAULT_LATENCIES = {"cold": (8.0, 0.3), "prewarm": (0.3, 0.4)}
+HYDRATE_LATENCY = (0.5, 0.5)
+
+# Everything a sweep can vary; the defaults mirror the scheduler's own configuration
+POLICY_DEFAULTS = {
+    "predictor": "utilization",  # model | utilization | none
+    "engine": os.getenv("ASSIGNMENT_ENGINE", "balanced"),
+    "max_machines_per_processor": int(os.getenv("MAX_MACHINES_PER_PROCESSOR", "2")),
+    "processor_rate_capacity": float(os.getenv("PROCESSOR_RATE_CAPACITY", "0")),
+    "prewarm_threshold": PREWARM_THRESHOLD,
+    "min_prewarm": MIN_PREWARM,
+    "max_prewarm": MAX_PREWARM,
+    "scale_down_stable": SCALE_DOWN_STABLE,
+    "handout_threshold": HANDOUT_THRESHOLD,
+    "handout_cooldown": HANDOUT_COOLDOWN,
+    "handout_lease": HANDOUT_LEASE,
+    "reschedule_interval": RESCHEDULE_MIN_INTERVAL,
+    "predict_interval": PREDICT_MIN_INTERVAL,
+}
+
+WORKLOAD_DEFAULTS = {
+    "min_machines": 5,
+    "max_machines": 15,
+    "machine_rate": 1.0,  # mean msgs/s per machine, lognormal across machines
+    "service_rate": 5.0,  # msgs/s one processor serves
+    "queue_size": 1000,  # INGEST_QUEUE_SIZE
+    "bursts_per_hour": 2.0,
+    "burst_factor": 4.0,
+    "burst_seconds": 300.0,
+}
+
+
+############################################
+# LATENCIES
+############################################
+class Lognormal:
+    def __init__(self, median: float, sigma: float):
+        self.mu = math.log(max(median, 1e-6))
+        self.sigma = sigma
+
+    def sample(self, rng: random.Random) -> float:
+        return rng.lognormvariate(self.mu, self.sigma)
+
+    def describe(self) -> dict:
+        return {"median_s": round(math.exp(self.mu), 3), "sigma": round(self.sigma, 3)}
+
+
+def fit_latencies(path: str = BENCHMARK_PATH) -> dict:
+    """{event_type: Lognormal} of start_time_ms per event type in benchmark.csv, defaults where it has < 10 rows."""
+    fits = {k: Lognormal(*v) for k, v in DEFAULT_LATENCIES.items()}
+    try:
+        with open(path, newline="") as f:
+            values = {}
+            for row in csv.DictReader(f):
+                try:
+                    ms = float(row["start_time_ms"])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                if ms > 0:
+                    values.setdefault(row.get("event_type"), []).append(math.log(ms / 1000.0))
+    except FileNotFoundError:
+        logging.info(f"[SIM] No {path}, using default start latencies")
+        return fits
+
+    for event_type, logs in values.items():
+        if event_type in fits and len(logs) >= 10:
+            fit = Lognormal(1.0, float(np.std(logs)))
+            fit.mu = float(np.mean(logs))
+            fits[event_type] = fit
+    return fits
+
+
+############################################
+# FAKE MQTT + KUBERNETES
+############################################
+def topic_matches(pattern: str, topic: str) -> bool:
+    parts, levels = pattern.split("/"), topic.split("/")
+    for i, part in enumerate(parts):
+        if part == "#":
+            return True
+        if i >= len(levels) or (part != "+" and part != levels[i]):
+            return False
+    return len(parts) == len(levels)
+
+
+class FakeMessage:
+    def __init__(self, topic: str, payload: bytes):
+        self.topic = topic
+        self.payload = payload
+
+
+class FakeMqtt:
+    """The paho client surface the scheduler uses; publishes are delivered MQTT_DELAY later in simulated time."""
+
+    def __init__(self, sim):
+        self.sim = sim
+        self.callbacks = []  # (filter, callback(client, userdata, msg))
+
+    def message_callback_add(self, pattern, callback):
+        self.callbacks.append((pattern, callback))
+
+    def subscribe(self, *args, **kwargs):
+        pass
+
+    def publish(self, topic, payload=b"", qos=0, retain=False):
+        payload = payload.encode() if isinstance(payload, str) else (payload or b"")
+        self.sim.after(MQTT_DELAY, self._deliver, FakeMessage(topic, payload))
+
+    def _deliver(self, msg):
+        for pattern, callback in self.callbacks:
+            if topic_matches(pattern, msg.topic):
+                callback(self, None, msg)
+
+
+class SimPod:
+    def __init__(self, name: str, deployment: str, created: float):
+        self.name = name
+        self.deployment = deployment
+        self.created = created
+        self.running = False
+        self.mode = "ACTIVE" if deployment == "processor" else None
+        self.source = None
+        self.deletion_cost = 0
+
+
+class FakeCluster:
+    """Deployments and their pods. Pods run after a cold start sampled from the fitted distribution."""
+
+    def __init__(self, sim):
+        self.sim = sim
+        self.replicas = {"processor": 0, "prewarm-processor": 0}
+        self.pods = {}
+        self.next_id = itertools.count()
+
+    def running(self, deployment: str) -> list:
+        return [p for p in self.pods.values() if p.deployment == deployment and p.running]
+
+    def scale(self, deployment: str, replicas: int):
+        self.replicas[deployment] = replicas
+        self.sim.dirty = True
+        pods = [p for p in self.pods.values() if p.deployment == deployment]
+        for _ in range(replicas - len(pods)):
+            pod = SimPod(f"{deployment}-{next(self.next_id)}", deployment, self.sim.now)
+            self.pods[pod.name] = pod
+            self.sim.after(self.sim.latencies["cold"].sample(self.sim.rng), self.sim.pod_started, pod.name)
+        # like the ReplicaSet controller: not yet running first, then lowest deletion cost, then newest
+        for pod in sorted(pods, key=lambda p: (p.running, p.deletion_cost, -p.created))[:max(len(pods) - replicas, 0)]:
+            del self.pods[pod.name]
+            self.sim.pod_deleted(pod)
+
+    def set_deletion_cost(self, pod_name: str, cost: int):
+        if pod_name in self.pods:
+            self.pods[pod_name].deletion_cost = cost
+
+    def delete(self, pod_name: str):
+        """Delete one pod; its ReplicaSet replaces it if the deployment still wants it."""
+        pod = self.pods.pop(pod_name, None)
+        if pod is not None:
+            self.sim.pod_deleted(pod)
+            self.scale(pod.deployment, self.replicas[pod.deployment])
+
+
+class SimCluster:
+    """The cluster side of the scheduler's rounds (rounds.py), on the simulator's pods and assignments."""
+
+    def __init__(self, sim):
+        self.sim = sim
+
+    def machines(self) -> list:
+        return sorted(self.sim.machines)
+
+    def machine_rates(self) -> dict:
+        return {m: self.sim.machine_rate(m) for m in self.sim.machines}
+
+    def scale_processors(self, num_machines: int) -> int:
+        rates = self.machine_rates()
+        required = required_processors(num_machines, self.sim.policy["max_machines_per_processor"],
+                                       total_load=sum(rates.values()), load_capacity=self.sim.policy["processor_rate_capacity"])
+        if required != self.sim.cluster.replicas["processor"]:
+            self.sim.cluster.scale("processor", required)
+        return required
+
+    def running_processors(self, required: int) -> list:
+        return sorted(p.name for p in self.sim.cluster.running("processor"))
+
+    def assign(self, machines: list, processors: list):
+        assignments = self.sim.engine.assign(machines, processors, self.sim.assignments, self.machine_rates(), self.sim.metrics)
+        self.sim.stats["migrations"] += count_migrations(self.sim.assignments, assignments)
+        self.sim.assignments = assignments
+        self.sim.assigned_ever.update(assignments)
+        self.sim.dirty = True
+
+    def assigned(self, processor: str) -> list:
+        return [m for m in self.sim.assignments.get(processor, []) if m in self.sim.machines]
+
+    def publish_assignment(self, processor: str, machines: list):
+        self.sim.assignments[processor] = list(machines)
+        self.sim.assigned_ever.add(processor)
+        self.sim.dirty = True
+
+    def handed_out(self, pod: str, source: str, machines: list, start: float):
+        self.sim.stats["handouts"] += 1
+        self.sim.stats["migrations"] += len(machines)
+
+    def handout_missed(self, source: str):
+        self.sim.stats["missed_handouts"] += 1
+
+    def lease_over(self):
+        self.sim.pods_changed = True
+
+
+############################################
+# SIMULATOR
+############################################
+class Simulator:
+    def __init__(self, policy: dict = None, workload: dict = None, seed: int = 0, latencies: dict = None, model=None):
+        self.policy = {**POLICY_DEFAULTS, **(policy or {})}
+        self.workload = {**WORKLOAD_DEFAULTS, **(workload or {})}
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.np_rng = np.random.default_rng(seed)
+        self.latencies = latencies or fit_latencies()
+        self.model, self.features = model if model else (None, None)
+
+        self.now = 0.0
+        self.heap = []
+        self.seq = itertools.count()
+
+        self.mqtt = FakeMqtt(self)
+        self.cluster = FakeCluster(self)
+        self.mqtt.message_callback_add("prewarm/+/+", self.on_command)
+
+        # the scheduler's own pieces
+        self.engine = get_engine(self.policy["engine"], self.policy["max_machines_per_processor"])
+        self.pool = PrewarmPool(self.mqtt, lambda n: self.cluster.scale("prewarm-processor", n),
+                                self.cluster.set_deletion_cost, self.cluster.delete, clock=lambda: self.now)
+        self.pool.track(self.mqtt)
+        self.hysteresis = Hysteresis(stable=self.policy["scale_down_stable"])
+        self.control = ControlPlane(SimCluster(self), self.pool, self.hysteresis, self.policy["handout_lease"],
+                                    self.policy["handout_threshold"], self.policy["handout_cooldown"],
+                                    clock=lambda: self.now)
+        self.reschedule_limiter = RateLimiter(self.policy["reschedule_interval"])
+        self.predict_limiter = RateLimiter(self.policy["predict_interval"])
+        self.assignments = {}
+        self.assigned_ever = set()  # processors that got an assignment, and so left the shared group
+        self.pods_changed = True
+
+        self.machines = {}  # machine -> base msgs/s
+        self.burst = (set(), 0.0)  # machines in a burst, and until when
+        self.next_machine = itertools.count()
+        self.metrics = {}  # last published metrics per processor
+        self.plane = None
+        self.queues = {}  # processor -> backlog and metric accumulators, between plane rebuilds
+        self.dirty = True
+        self.activating = {}  # pod -> activate time
+        self.stats = {k: 0.0 for k in ("messages", "dropped", "unserved", "overload_seconds", "processor_seconds",
+                                       "prewarm_seconds", "cold_starts", "handouts", "missed_handouts", "migrations")}
+        self.handout_latencies = []
+        self.latency_bins = np.logspace(-3, 3, 121)  # seconds
+        self.latency_hist = np.zeros(len(self.latency_bins) + 1)
+
+    ############################################
+    # Event queue
+    ############################################
+    def after(self, delay: float, fn, *args):
+        heapq.heappush(self.heap, (self.now + delay, next(self.seq), fn, args))
+
+    def every(self, interval: float, fn):
+        def tick():
+            fn()
+            self.after(interval, tick)
+        self.after(0.0, tick)
+
+    def run(self, duration: float) -> dict:
+        started = time.time()
+        self.every(WORKLOAD_STEP, self.update_workload)
+        self.every(TICK, self.data_plane)
+        self.every(METRICS_INTERVAL, self.control_loop)
+        while self.heap and self.heap[0][0] <= duration:
+            self.now, _, fn, args = heapq.heappop(self.heap)
+            fn(*args)
+        self.now = duration
+        return self.summary(duration, time.time() - started)
+
+    ############################################
+    # Workload: diurnal machine count, per-machine lognormal rates, random bursts
+    ############################################
+    def update_workload(self):
+        w = self.workload
+        day = 0.5 - 0.5 * math.cos(2 * math.pi * self.now / 86400.0)
+        wanted = int(round(w["min_machines"] + day * (w["max_machines"] - w["min_machines"])))
+        while len(self.machines) < wanted:
+            self.machines[f"machine-{next(self.next_machine)}"] = w["machine_rate"] * self.rng.lognormvariate(-0.125, 0.5)
+            self.pods_changed = True
+        while len(self.machines) > wanted:
+            del self.machines[self.rng.choice(sorted(self.machines))]
+            self.pods_changed = True
+
+        if self.now >= self.burst[1] and self.rng.random() < w["bursts_per_hour"] * WORKLOAD_STEP / 3600.0:
+            names = sorted(self.machines)
+            hot = set(self.rng.sample(names, max(1, len(names) // 4)))
+            self.burst = (hot, self.now + w["burst_seconds"])
+        self.dirty = True  # rates follow the machines and the burst
+
+    def machine_rate(self, machine: str) -> float:
+        hot, until = self.burst
+        rate = self.machines[machine]
+        return rate * self.workload["burst_factor"] if machine in hot and self.now < until else rate
+
+    ############################################
+    # Data plane
+    ############################################
+    def serving(self) -> list:
+        """Running processors plus the handed-out prewarm pods, from their activate command on."""
+        return [p.name for p in self.cluster.running("processor")] + \
+            [p.name for p in self.cluster.running("prewarm-processor") if p.mode == "ACTIVE" or p.name in self.activating]
+
+    def processor_rates(self) -> dict:
+        """msgs/s arriving at every serving pod from the machines assigned to it."""
+        rates, unserved = dict.fromkeys(self.serving(), 0.0), 0.0
+        for processor, machines in self.assignments.items():
+            for m in machines:
+                if m not in self.machines:
+                    continue
+                if processor in rates:
+                    rates[processor] += self.machine_rate(m)
+                else:
+                    unserved += self.machine_rate(m)
+        assigned = {m for ms in self.assignments.values() for m in ms}
+        unserved += sum(self.machine_rate(m) for m in self.machines if m not in assigned)
+        # processors without an assignment yet share data/# through the shared group: every
+        # message goes to one of them as well, on top of its assigned processor
+        shared = [p.name for p in self.cluster.running("processor") if p.name not in self.assigned_ever]
+        if shared:
+            total = sum(self.machine_rate(m) for m in self.machines)
+            for p in shared:
+                rates[p] += total / len(shared)
+            unserved = 0.0
+        return rates, unserved
+
+    def rebuild_plane(self):
+        """Per-processor arrays of the data plane, rebuilt only when pods, modes, assignments or rates changed."""
+        old = self.plane
+        if old:
+            for i, name in enumerate(old["names"]):
+                self.queues[name] = {k: float(old[k][i]) for k in ("backlog", "arrived", "seconds", "latency")}
+        for name in set(self.queues) - set(self.cluster.pods):
+            self.stats["dropped"] += self.queues.pop(name)["backlog"]  # a deleted pod's buffer is lost
+
+        rates, unserved = self.processor_rates()
+        names = list(rates)
+        state = [self.queues.get(n, {}) for n in names]
+        self.plane = {"names": names, "rates": np.array([rates[n] for n in names]), "unserved": unserved,
+                      **{k: np.array([q.get(k, 0.0) for q in state]) for k in ("backlog", "arrived", "seconds", "latency")},
+                      "processor_pods": sum(1 for p in self.cluster.pods.values()
+                                            if p.deployment == "processor" or p.mode == "ACTIVE"),
+                      "idle_prewarm_pods": sum(1 for p in self.cluster.pods.values()
+                                               if p.deployment != "processor" and p.mode != "ACTIVE")}
+        self.dirty = False
+
+    def data_plane(self):
+        if self.dirty:
+            self.rebuild_plane()
+        w, plane = self.workload, self.plane
+        capacity = w["service_rate"] * TICK
+        if plane["unserved"] > 0:
+            self.stats["unserved"] += self.np_rng.poisson(plane["unserved"] * TICK)
+        self.stats["processor_seconds"] += plane["processor_pods"] * TICK
+        self.stats["prewarm_seconds"] += plane["idle_prewarm_pods"] * TICK
+        if not plane["names"]:
+            return
+
+        arrived = self.np_rng.poisson(plane["rates"] * TICK).astype(float)
+        backlog = np.maximum(plane["backlog"] + arrived - capacity, 0.0)
+        dropped = np.maximum(backlog - w["queue_size"], 0.0)
+        backlog -= dropped
+        latency = (backlog + 1.0) / w["service_rate"]
+        np.add.at(self.latency_hist, np.searchsorted(self.latency_bins, latency), arrived - dropped)
+        self.stats["messages"] += arrived.sum()
+        self.stats["dropped"] += dropped.sum()
+
+        cpu_usage = 100.0 * np.minimum(arrived / capacity, 1.0)
+        self.stats["overload_seconds"] += TICK * np.count_nonzero((cpu_usage > CPU_THRESHOLD) | (backlog > BUFFER_THRESHOLD))
+        plane["backlog"], plane["latency"] = backlog, latency
+        plane["arrived"] += arrived
+        plane["seconds"] += TICK
+
+    ############################################
+    # Pods
+    ############################################
+    def pod_started(self, name: str):
+        pod = self.cluster.pods.get(name)
+        if pod is None:
+            return  # scaled down before it started
+        pod.running = True
+        self.dirty = True
+        if pod.deployment == "processor":
+            self.stats["cold_starts"] += 1
+            self.pods_changed = True
+        else:
+            self.set_mode(pod, "PREWARM")
+
+    def pod_deleted(self, pod: SimPod):
+        self.dirty = True
+        if pod.deployment == "processor" or pod.mode == "ACTIVE":
+            self.pods_changed = True
+        if pod.deployment != "processor" and pod.running:
+            self.mqtt.publish(f"registry/{pod.name}", b"", retain=True)  # last will
+
+    def set_mode(self, pod: SimPod, mode: str, **extra):
+        pod.mode = mode
+        self.dirty = True
+        self.mqtt.publish(f"registry/{pod.name}", json.dumps({
+            "processor_id": pod.name, "mode": mode, "origin": "prewarm", "timestamp": self.now,
+            "source": pod.source, **extra}), retain=True)
+
+    def on_command(self, client, userdata, msg):
+        _, name, command = msg.topic.split("/")
+        pod = self.cluster.pods.get(name)
+        if pod is None or not pod.running:
+            return
+        if command == "hydrate" and pod.mode == "PREWARM":
+            pod.source = json.loads(msg.payload or b"{}").get("source")
+            self.set_mode(pod, "HYDRATING")
+            self.after(Lognormal(*HYDRATE_LATENCY).sample(self.rng), self.hydrated, name)
+        elif command == "activate" and pod.mode == "READY":
+            self.activating[name] = self.now
+            # request -> first message processed, as benchmark.csv measures it
+            self.after(self.latencies["prewarm"].sample(self.rng), self.activated, name)
+
+    def hydrated(self, name: str):
+        pod = self.cluster.pods.get(name)
+        if pod is not None and pod.mode == "HYDRATING":
+            self.set_mode(pod, "READY", status="restored" if pod.source else "cold")
+
+    def activated(self, name: str):
+        pod = self.cluster.pods.get(name)
+        start = self.activating.pop(name, None)
+        if pod is not None and start is not None:
+            self.set_mode(pod, "ACTIVE")
+            self.handout_latencies.append(self.now - start)
+
+    ############################################
+    # Control plane: the scheduler's event loop
+    ############################################
+    def control_loop(self):
+        if self.pods_changed and self.reschedule_limiter.ready(self.now):
+            self.pods_changed = False
+            self.reschedule_limiter.mark(self.now)
+            self.schedule()
+        if self.predict_limiter.ready(self.now):
+            self.predict_limiter.mark(self.now)
+            self.prediction_round()
+
+    def publish_metrics(self) -> dict:
+        """The metrics/<processor> payloads since the last call, as the scheduler caches them."""
+        plane, out = self.plane, {}
+        if not plane:
+            return out
+        for i, name in enumerate(plane["names"]):
+            if plane["seconds"][i] <= 0:
+                continue
+            rate = float(plane["arrived"][i] / plane["seconds"][i])
+            out[name] = {"cpu_usage": 100.0 * min(rate / self.workload["service_rate"], 1.0), "mem_usage": 0.0,
+                         "buffer_size": float(plane["backlog"][i]), "buffer_capacity": self.workload["queue_size"],
+                         "avg_latency": float(plane["latency"][i]), "avg_rate": rate, "timestamp": self.now}
+        plane["arrived"][:] = 0.0
+        plane["seconds"][:] = 0.0
+        self.metrics = out
+        return out
+
+    def schedule(self):
+        """ai_scheduler.scheduling_round()."""
+        self.control.scheduling_round()
+
+    def probabilities(self, metrics: dict) -> dict:
+        if self.policy["predictor"] == "model" and self.model is not None:
+            rows = {p: {f: float(m.get(f, 0.0)) for f in self.features} for p, m in metrics.items()}
+            return predict_processor_probabilities(self.model, self.features, rows)
+        if self.policy["predictor"] == "utilization":
+            # stand-in without a model: overload probability rises linearly from 50 % to 100 % cpu
+            return {p: min(max((m["cpu_usage"] / 100.0 - 0.5) / 0.5, 0.0), 1.0) for p, m in metrics.items()}
+        return {}
+
+    def prediction_round(self):
+        """ai_scheduler.prediction_round() on simulated metrics."""
+        probs = self.probabilities(self.publish_metrics())
+        prewarm_count = scale_decision(probs, self.policy["prewarm_threshold"],
+                                       self.policy["min_prewarm"], self.policy["max_prewarm"])
+        self.control.prediction_round(probs, prewarm_count)
+
+    ############################################
+    # Results
+    ############################################
+    def latency_percentile(self, q: float) -> float:
+        total = self.latency_hist.sum()
+        if total <= 0:
+            return 0.0
+        i = int(np.searchsorted(np.cumsum(self.latency_hist), q / 100.0 * total))
+        return float(self.latency_bins[min(i, len(self.latency_bins) - 1)])
+
+    def summary(self, duration: float, wall: float) -> dict:
+        s = self.stats
+        handout = sorted(self.handout_latencies)
+        return {
+            "seed": self.seed,
+            **self.policy,
+            "sim_hours": round(duration / 3600.0, 2),
+            "wall_seconds": round(wall, 2),
+            "messages": int(s["messages"]),
+            "drop_rate": round((s["dropped"] + s["unserved"]) / max(s["messages"] + s["unserved"], 1), 6),
+            "overload_fraction": round(s["overload_seconds"] / max(s["processor_seconds"], 1e-6), 4),
+            "latency_p50_ms": round(self.latency_percentile(50) * 1000.0, 1),
+            "latency_p99_ms": round(self.latency_percentile(99) * 1000.0, 1),
+            "cold_starts": int(s["cold_starts"]),
+            "handouts": int(s["handouts"]),
+            "missed_handouts": int(s["missed_handouts"]),
+            "handout_p50_ms": round(handout[len(handout) // 2] * 1000.0, 1) if handout else None,
+            "prewarm_pod_hours": round(s["prewarm_seconds"] / 3600.0, 2),
+            "processor_pod_hours": round(s["processor_seconds"] / 3600.0, 2),
+            "migrations": int(s["migrations"]),
+        }
+
+
+############################################
+# SWEEPS
+############################################
+def parse_grid(specs: list) -> list:
+    """["prewarm_threshold=0.3,0.5", "predictor=utilization,none"] -> every combination as a policy dict."""
+    axes = []
+    for spec in specs:
+        key, _, values = spec.partition("=")
+        if key not in POLICY_DEFAULTS:
+            raise ValueError(f"Unknown policy field {key!r}, expected one of {sorted(POLICY_DEFAULTS)}")
+        kind = type(POLICY_DEFAULTS[key])
+        axes.append([(key, kind(v)) for v in values.split(",")])
+    return [dict(combo) for combo in itertools.product(*axes)]
+
+
+def _run_one(args):
+    policy, workload, seed, hours, latencies = args
+    logging.getLogger().setLevel(logging.WARNING)  # the pool logs every transition
+    model = ModelCache(MODEL_PATH).get() if policy.get("predictor") == "model" else None
+    return Simulator(policy, workload, seed, latencies, model).run(hours * 3600.0)
+
+
+def sweep(policies: list, seeds: int, hours: float, workload: dict = None, workers: int = None) -> list:
+    latencies = fit_latencies()
+    logging.info(f"[SIM] Start latencies: { {k: v.describe() for k, v in latencies.items()} }")
+    jobs = [(policy, workload, seed, hours, latencies) for policy in policies for seed in range(seeds)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_run_one, jobs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate the scheduler and prewarm pool offline")
+    parser.add_argument("--hours", type=float, default=24.0)
+    parser.add_argument("--seeds", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--sweep", nargs="*", default=[], help="policy grid, e.g. prewarm_threshold=0.3,0.5 max_prewarm=1,3")
+    parser.add_argument("--workload", default="{}", help=f"JSON overrides of {sorted(WORKLOAD_DEFAULTS)}")
+    parser.add_argument("--out", default="/data/sim_results.csv")
+    args = parser.parse_args()
+
+    # fail before hours of simulation, not after
+    out_dir = os.path.dirname(os.path.abspath(args.out))
+    os.makedirs(out_dir, exist_ok=True)
+    if not os.access(out_dir, os.W_OK) or (os.path.exists(args.out) and not os.access(args.out, os.W_OK)):
+        parser.error(f"cannot write --out {args.out}")
+
+    policies = parse_grid(args.sweep) or [{}]
+    results = sweep(policies, args.seeds, args.hours, json.loads(args.workload), args.workers)
+
+    with open(args.out, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0]))
+        writer.writeheader()
+        writer.writerows(results)
+    varied = sorted({k for p in policies for k in p})
+    for r in results:
+        logging.info(f"[SIM] { {k: r[k] for k in varied} } seed={r['seed']}: drop={r['drop_rate']:.4%} "
+                     f"overload={r['overload_fraction']:.2%} p99={r['latency_p99_ms']}ms handouts={r['handouts']} "
+                     f"missed={r['missed_handouts']} prewarm_h={r['prewarm_pod_hours']} ({r['wall_seconds']}s)")
+    logging.info(f"[SIM] {len(results)} runs written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+import os, logging
+from contextlib import contextmanager
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))  # Prometheus /metrics, 0 = off
+
+API_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+START_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+ROUNDS = Counter("scheduler_rounds_total", "Scheduler rounds run, by kind", ["kind"])
+ROUND_ERRORS = Counter("scheduler_round_errors_total", "Scheduler rounds that raised, by kind", ["kind"])
+PREDICTION_SECONDS = Histogram("scheduler_prediction_seconds", "Time of one prediction round", buckets=API_BUCKETS)
+INFERENCE_SECONDS = Histogram("scheduler_inference_seconds", "Time to score every processor with the model",
+                              buckets=API_BUCKETS)
+K8S_SECONDS = Histogram("scheduler_k8s_request_seconds", "Kubernetes API call latency, by operation", ["operation"],
+                        buckets=API_BUCKETS)
+K8S_ERRORS = Counter("scheduler_k8s_errors_total", "Failed Kubernetes API calls, by operation", ["operation"])
+DECISIONS = Counter("scheduler_decisions_total", "Scaling and hand-out decisions, by decision", ["decision"])
+MIGRATIONS = Counter("scheduler_migrations_total", "Machines moved to another processor")
+PREWARM_TARGET = Gauge("scheduler_prewarm_target", "Idle prewarm pods the pool is kept at")
+START_SECONDS = Histogram("scheduler_start_seconds", "Request to first processed message, by start type", ["event_type"],
+                          buckets=START_BUCKETS)
+
+
+@contextmanager
+def k8s_call(operation: str):
+    """Time a Kubernetes API call and count it as failed if it raises."""
+    try:
+        with K8S_SECONDS.labels(operation).time():
+            yield
+    except Exception:
+        K8S_ERRORS.labels(operation).inc()
+        raise
+
+
+def serve(port: int = METRICS_PORT):
+    if port > 0:
+        start_http_server(port)
+        logging.info(f"[AI-SCHED] Serving Prometheus metrics on :{port}/metrics")
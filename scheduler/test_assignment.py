@@ -0,0 +1,162 @@
+import random
+import pytest
+from assignment import (ENGINES, BalancedAssigner, ConsistentHashAssigner, count_migrations, get_engine,
+                        required_processors, split_machines)
+
+########################################################
+# Random machine churn, rate drift and pool resizing. Every round checks the bounds the scheduler
+# relies on:
+#   - every machine is assigned exactly once
+#   - no processor holds more than the engine's count cap, nor more than MAX_MACHINES_PER_PROCESSOR
+#   - an unchanged cluster causes zero migrations
+# and for "balanced" additionally:
+#   - max weighted load <= load target + heaviest machine
+#   - migrations <= orphaned (processor removed) + over the new count cap + two per processor
+########################################################
+
+def simulate_rounds(engine, rounds: int = 200, seed: int = 0, max_per_processor: int = 2) -> dict:
+    rng = random.Random(seed)
+    next_id = 0
+    machines = []
+    rates = {}
+    previous = {}
+    worst_ratio, total_migrations = 0.0, 0
+
+    def add_machine():
+        nonlocal next_id
+        m = f"machine-{next_id}"
+        next_id += 1
+        machines.append(m)
+        rates[m] = rng.lognormvariate(0, 0.5)
+
+    for _ in range(rng.randint(5, 15)):
+        add_machine()
+
+    for r in range(rounds):
+        churn = r % 2 == 0  # odd rounds replay the same cluster to check stability
+        if churn:
+            for _ in range(rng.randint(0, 3)):
+                if len(machines) > 1:
+                    machines.remove(rng.choice(machines))
+            for _ in range(rng.randint(0, 3)):
+                add_machine()
+            for m in machines:
+                rates[m] *= rng.uniform(0.9, 1.1)
+
+        n = required_processors(len(machines), max_per_processor)
+        processors = [f"processor-{i}" for i in range(n)]
+
+        result = engine.assign(machines, processors, previous, rates)
+        assert sorted(m for ms in result.values() for m in ms) == sorted(machines), f"round {r}: machines lost or duplicated"
+
+        count_cap = engine.count_cap(len(machines), len(processors))
+        assert count_cap <= max_per_processor, f"round {r}: count cap above max_per_processor"
+        assert max(len(ms) for ms in result.values()) <= count_cap, f"round {r}: count cap exceeded"
+
+        migrations = count_migrations(previous, result)
+        total_migrations += migrations
+        if not churn:
+            assert migrations == 0, f"round {r}: {migrations} migrations on an unchanged cluster"
+
+        if isinstance(engine, BalancedAssigner):
+            alive = set(machines)
+            orphaned = sum(1 for p, ms in previous.items() if p not in result for m in ms if m in alive)
+            over_cap = sum(max(0, sum(1 for m in ms if m in alive) - count_cap)
+                           for p, ms in previous.items() if p in result)
+            assert migrations <= orphaned + over_cap + 2 * len(processors), f"round {r}: migration bound exceeded"
+
+            total = sum(rates[m] for m in machines)
+            heaviest = max(rates[m] for m in machines)
+            max_load = max(sum(rates[m] for m in ms) for ms in result.values())
+            assert max_load <= total / len(processors) * (1 + engine.tolerance) + heaviest + 1e-9, f"round {r}: load bound exceeded"
+            worst_ratio = max(worst_ratio, max_load / (total / len(processors)))
+
+        previous = result
+
+    return {"rounds": rounds, "migrations": total_migrations, "worst_load_ratio": round(worst_ratio, 3)}
+
+
+@pytest.mark.parametrize("name", sorted(ENGINES))
+@pytest.mark.parametrize("max_per_processor", [1, 2, 5])
+@pytest.mark.parametrize("seed", range(10))
+def test_bounds_hold_under_churn(name, max_per_processor, seed):
+    simulate_rounds(get_engine(name, max_per_processor), seed=seed, max_per_processor=max_per_processor)
+
+
+@pytest.mark.parametrize("name", sorted(ENGINES))
+def test_empty_pool(name):
+    assert get_engine(name, 2).assign(["machine-0"], []) == {}
+
+
+def test_hash_respects_max_per_processor():
+    machines = [f"machine-{i}" for i in range(40)]
+    processors = [f"processor-{i}" for i in range(20)]
+    # without the cap, tolerance 0.25 would allow ceil(2 * 1.25) = 3 machines per processor
+    result = ConsistentHashAssigner(max_per_processor=2).assign(machines, processors)
+    assert max(len(ms) for ms in result.values()) == 2
+    assert sorted(m for ms in result.values() for m in ms) == sorted(machines)
+
+
+def test_hash_keeps_every_machine_when_the_pool_is_too_small():
+    machines = [f"machine-{i}" for i in range(10)]
+    processors = ["processor-0", "processor-1"]
+    result = ConsistentHashAssigner(max_per_processor=2).assign(machines, processors)
+    assert sorted(m for ms in result.values() for m in ms) == sorted(machines)
+    assert max(len(ms) for ms in result.values()) == 5
+
+
+def test_hash_moves_only_the_removed_processors_machines():
+    engine = ConsistentHashAssigner(max_per_processor=50, tolerance=10.0)  # effectively unbounded
+    machines = [f"machine-{i}" for i in range(50)]
+    before = engine.assign(machines, [f"processor-{i}" for i in range(5)])
+    after = engine.assign(machines, [f"processor-{i}" for i in range(4)])
+    assert sorted(m for p in after for m in after[p] if m not in before[p]) == sorted(before["processor-4"])
+    assert count_migrations(before, after) == len(before["processor-4"])
+
+
+def test_balanced_spreads_load_by_rate():
+    machines = ["heavy-0", "heavy-1", "light-0", "light-1"]
+    rates = {"heavy-0": 3.0, "heavy-1": 3.0, "light-0": 1.0, "light-1": 1.0}
+    result = BalancedAssigner(max_per_processor=2).assign(machines, ["processor-0", "processor-1"], machine_load=rates)
+    assert sorted(sum(rates[m] for m in ms) for ms in result.values()) == [4.0, 4.0]
+
+
+@pytest.mark.parametrize("name", sorted(ENGINES))
+def test_pool_below_required_spreads_evenly(name):
+    # assignment runs on the running processors before a scale-up finishes
+    machines = [f"machine-{i}" for i in range(10)]
+    processors = ["processor-0", "processor-1", "processor-2"]
+    engine = get_engine(name, 2)
+    result = engine.assign(machines, processors)
+    assert sorted(m for ms in result.values() for m in ms) == sorted(machines)
+    assert engine.count_cap(len(machines), len(processors)) == 4
+    assert max(len(ms) for ms in result.values()) <= 4
+
+
+@pytest.mark.parametrize("name", sorted(ENGINES))
+def test_extra_processors_stay_under_max_per_processor(name):
+    # serving hand-outs come on top of the required processors
+    machines = [f"machine-{i}" for i in range(6)]
+    processors = [f"processor-{i}" for i in range(5)]
+    engine = get_engine(name, 2)
+    result = engine.assign(machines, processors)
+    assert sorted(m for ms in result.values() for m in ms) == sorted(machines)
+    assert max(len(ms) for ms in result.values()) <= 2
+
+
+def test_required_processors_grows_with_load():
+    assert required_processors(0, 2) == 0
+    assert required_processors(5, 2) == 3
+    assert required_processors(5, 2, total_load=40.0, load_capacity=10.0) == 4
+
+
+def test_split_machines_halves_the_load():
+    rates = {"a": 4.0, "b": 3.0, "c": 2.0, "d": 1.0}
+    keep, move = split_machines(sorted(rates), rates)
+    assert sorted(keep + move) == sorted(rates)
+    assert sum(rates[m] for m in keep) == sum(rates[m] for m in move) == 5.0
+
+
+def test_split_machines_never_splits_a_single_machine():
+    assert split_machines(["a"]) == (["a"], [])
+    assert split_machines([]) == ([], [])
@@ -0,0 +1,53 @@
+import json
+from feature_source import EventTailReader
+
+
+def write(path, lines, mode="a"):
+    with open(path, mode) as f:
+        f.write("".join(lines))
+
+
+def event(processor, timestamp, **fields):
+    return json.dumps({"processor_id": processor, "timestamp": timestamp, **fields}) + "\n"
+
+
+def test_keeps_the_newest_event_per_processor(tmp_path):
+    path = tmp_path / "raw_events.jsonl"
+    write(path, [event("p1", 2, cpu=20), event("p1", 1, cpu=10), event("p2", 1, cpu=30)], "w")
+    reader = EventTailReader(str(path))
+    assert reader.poll() == 3
+    snaps = reader.snapshots(max_age=0)
+    assert snaps["p1"]["cpu"] == 20 and snaps["p2"]["cpu"] == 30
+
+
+def test_skips_malformed_lines(tmp_path):
+    path = tmp_path / "raw_events.jsonl"
+    write(path, ["42\n", '"text"\n', "[1, 2]\n", "{not json\n",
+                 json.dumps({"processor_id": "p1", "timestamp": "soon"}) + "\n",
+                 json.dumps({"processor_id": "p1", "timestamp": None}) + "\n",
+                 event("p1", 5, cpu=50)], "w")
+    with open(path, "ab") as f:
+        f.write(b"\xff\xfe\n")
+    reader = EventTailReader(str(path))
+    assert reader.poll() == 1
+    assert reader.snapshots(max_age=0)["p1"]["cpu"] == 50
+
+
+def test_partial_line_waits_for_its_newline(tmp_path):
+    path = tmp_path / "raw_events.jsonl"
+    line = event("p1", 1, cpu=10)
+    write(path, [line[:10]], "w")
+    reader = EventTailReader(str(path))
+    assert reader.poll() == 0
+    write(path, [line[10:]])
+    assert reader.poll() == 1
+
+
+def test_truncation_restarts_at_offset_zero(tmp_path):
+    path = tmp_path / "raw_events.jsonl"
+    write(path, [event("p1", 1, cpu=10), event("p1", 2, cpu=20)], "w")
+    reader = EventTailReader(str(path))
+    reader.poll()
+    write(path, [event("p1", 3, cpu=30)], "w")
+    assert reader.poll() == 1
+    assert reader.snapshots(max_age=0)["p1"]["cpu"] == 30
@@ -0,0 +1,37 @@
+import json
+from types import SimpleNamespace
+from prewarm_pool import PrewarmPool
+
+
+class FakeMqtt:
+    def __init__(self):
+        self.published = []
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        self.published.append((topic, payload))
+
+
+def pool_with(**ready_sources):
+    pool = PrewarmPool(FakeMqtt(), scale_fn=lambda replicas: None)
+    for pod, source in ready_sources.items():
+        payload = json.dumps({"processor_id": pod, "mode": "READY", "origin": "prewarm", "source": source})
+        pool._on_registration(None, None, SimpleNamespace(topic=f"registry/{pod}", payload=payload.encode()))
+    return pool
+
+
+def test_acquire_takes_a_pod_hydrated_from_the_source():
+    pool = pool_with(pod_a="processor-0", pod_b="processor-1")
+    assert pool.acquire("processor-1") == "pod_b"
+    assert pool.serving_pods() == []  # serving once it reports ACTIVE
+
+
+def test_acquire_misses_without_a_matching_pod():
+    pool = pool_with(pod_a="processor-0")
+    assert pool.acquire("processor-1") is None
+    assert pool.ready() == ["pod_a"]
+
+
+def test_ready_sources_skips_claimed_pods():
+    pool = pool_with(pod_a="processor-0", pod_b="processor-1")
+    pool.acquire("processor-0")
+    assert pool.ready_sources() == ["processor-1"]
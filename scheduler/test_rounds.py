@@ -0,0 +1,102 @@
+import json
+from types import SimpleNamespace
+from events import Hysteresis
+from prewarm_pool import PrewarmPool
+from rounds import ControlPlane
+
+
+class FakeMqtt:
+    def publish(self, topic, payload, qos=0, retain=False):
+        pass
+
+
+class FakeCluster:
+    def __init__(self, machines, running, required=None):
+        self.machine_list = machines
+        self.running = running
+        self.required = len(running) if required is None else required
+        self.assignments = {}
+        self.handouts = []
+        self.missed = []
+
+    def machines(self):
+        return list(self.machine_list)
+
+    def machine_rates(self):
+        return {m: 1.0 for m in self.machine_list}
+
+    def scale_processors(self, num_machines):
+        return self.required
+
+    def running_processors(self, required):
+        return list(self.running)
+
+    def assign(self, machines, processors):
+        self.assignments = {p: machines[i::len(processors)] for i, p in enumerate(processors)}
+
+    def assigned(self, processor):
+        return self.assignments.get(processor, [])
+
+    def publish_assignment(self, processor, machines):
+        self.assignments[processor] = list(machines)
+
+    def handed_out(self, pod, source, machines, start):
+        self.handouts.append((pod, source, machines))
+
+    def handout_missed(self, source):
+        self.missed.append(source)
+
+    def lease_over(self):
+        pass
+
+
+def control_plane(cluster, now, **ready_sources):
+    pool = PrewarmPool(FakeMqtt(), scale_fn=lambda replicas: None, clock=lambda: now[0])
+    for pod, source in ready_sources.items():
+        payload = json.dumps({"processor_id": pod, "mode": "READY", "origin": "prewarm", "source": source})
+        pool._on_registration(None, None, SimpleNamespace(topic=f"registry/{pod}", payload=payload.encode()))
+    return ControlPlane(cluster, pool, Hysteresis(), lease=100, clock=lambda: now[0]), pool
+
+
+def activate(pool, pod):
+    payload = json.dumps({"processor_id": pod, "mode": "ACTIVE", "origin": "prewarm"})
+    pool._on_registration(None, None, SimpleNamespace(topic=f"registry/{pod}", payload=payload.encode()))
+
+
+def test_hand_out_splits_the_source():
+    now = [1000.0]
+    cluster = FakeCluster(["m1", "m2", "m3", "m4"], ["processor-0"])
+    control, pool = control_plane(cluster, now, pod_a="processor-0")
+    control.scheduling_round()
+    assert control.prediction_round({"processor-0": 0.95}, prewarm_count=1) == 1
+    assert [h[:2] for h in cluster.handouts] == [("pod_a", "processor-0")]
+    assert sorted(cluster.assignments["processor-0"] + cluster.assignments["pod_a"]) == ["m1", "m2", "m3", "m4"]
+    assert len(cluster.assignments["pod_a"]) == 2
+
+
+def test_hand_out_without_a_warm_pod_is_missed():
+    now = [1000.0]
+    cluster = FakeCluster(["m1", "m2"], ["processor-0"])
+    control, pool = control_plane(cluster, now, pod_a="processor-9")
+    control.scheduling_round()
+    control.prediction_round({"processor-0": 0.95}, prewarm_count=1)
+    assert cluster.missed == ["processor-0"] and not cluster.handouts
+
+
+def test_lease_retirement_waits_for_the_required_processors():
+    now = [1000.0]
+    cluster = FakeCluster(["m1", "m2", "m3", "m4"], ["processor-0"])
+    control, pool = control_plane(cluster, now, pod_a="processor-0")
+    control.scheduling_round()
+    control.prediction_round({"processor-0": 0.95}, prewarm_count=1)
+    activate(pool, "pod_a")
+    now[0] = 1200.0
+
+    cluster.required = 2  # the replacement is not running yet
+    control.scheduling_round()
+    assert "pod_a" not in cluster.assignments
+    assert "pod_a" not in pool.retired
+
+    cluster.running = ["processor-0", "processor-1"]
+    control.scheduling_round()
+    assert "pod_a" in pool.retired
@@ -0,0 +1,138 @@
+import os, json, math, random, bisect, logging
+from collections import defaultdict
+
+############################################
+# CONFIG
+############################################
+MIN_MACHINES = int(os.getenv("MIN_MACHINES", "5"))
+MAX_MACHINES = int(os.getenv("MAX_MACHINES", "15"))
+BASE_RATE = float(os.getenv("BASE_RATE", "1.0"))  # readings per second per machine at the lowest load
+PEAK_RATE = float(os.getenv("PEAK_RATE", "1.0"))  # ... and at the highest
+PERIOD = float(os.getenv("PERIOD", "600"))  # seconds: diurnal cycle, random hold, step/ramp time, burst spacing
+BURST_SECONDS = float(os.getenv("BURST_SECONDS", "60"))
+RATE_NOISE = float(os.getenv("RATE_NOISE", "0.0"))  # +/- fraction of seeded noise on the rate
+TRACE_SPEEDUP = float(os.getenv("TRACE_SPEEDUP", "1.0"))  # replay a trace this many times faster
+
+
+############################################
+# PATTERNS
+############################################
+# Every pattern maps (t, rng_for) to the load level u in [0, 1]; rng_for(k) is the seeded RNG of
+# period k, so a run is the same whatever order or step the scenario is sampled at.
+
+def diurnal(t, rng_for):
+    return 0.5 - 0.5 * math.cos(2 * math.pi * t / PERIOD)
+
+
+def step(t, rng_for):
+    return 0.0 if t < PERIOD else 1.0
+
+
+def ramp(t, rng_for):
+    return min(t / PERIOD, 1.0)
+
+
+def burst(t, rng_for):
+    k = int(t // PERIOD)
+    start = k * PERIOD + rng_for(k).uniform(0, max(PERIOD - BURST_SECONDS, 0))
+    return 1.0 if start <= t < start + BURST_SECONDS else 0.0
+
+
+def constant(t, rng_for):
+    return 1.0
+
+
+def uniform(t, rng_for):
+    """The old behaviour of simulate_shift.py: a new random level every PERIOD, now seeded."""
+    return rng_for(int(t // PERIOD)).random()
+
+
+PATTERNS = {"diurnal": diurnal, "step": step, "ramp": ramp, "burst": burst, "constant": constant, "random": uniform}
+
+
+class Scenario:
+    """
+    A reproducible workload: at(t) is the (machine count, readings per second per machine) `t`
+    seconds into the run. Parametric scenarios scale a pattern between MIN/MAX_MACHINES and
+    BASE/PEAK_RATE; trace scenarios replay recorded points. The same name and seed always give
+    the same workload.
+    """
+
+    def __init__(self, name: str, seed: int = 0, pattern=None, points: list = None, duration: float = 0.0):
+        self.name = name
+        self.seed = seed
+        self.pattern = pattern
+        self.points = points  # [(t, machines, rate)] sorted by t, for traces
+        self.duration = duration  # seconds, 0 = unbounded
+
+    def _rng_for(self, k: int) -> random.Random:
+        return random.Random(f"{self.name}:{self.seed}:{k}")
+
+    def at(self, t: float):
+        if self.points is not None:
+            i = max(bisect.bisect_right([p[0] for p in self.points], t) - 1, 0)
+            _, machines, rate = self.points[i]
+        else:
+            u = self.pattern(t, self._rng_for)
+            machines = MIN_MACHINES + u * (MAX_MACHINES - MIN_MACHINES)
+            rate = BASE_RATE + u * (PEAK_RATE - BASE_RATE)
+        if RATE_NOISE > 0:
+            rate *= 1.0 + self._rng_for(f"noise:{t:.3f}").uniform(-RATE_NOISE, RATE_NOISE)
+        return int(round(machines)), round(max(rate, 0.01), 3)
+
+    def steps(self, interval: float):
+        """(t, machines, rate) every `interval` seconds until the duration, forever if it is 0."""
+        k = 0
+        while not self.duration or k * interval < self.duration:
+            t = k * interval
+            yield (t, *self.at(t))
+            k += 1
+
+    def describe(self) -> dict:
+        return {"scenario": self.name, "seed": self.seed, "duration": self.duration}
+
+
+############################################
+# TRACES
+############################################
+def load_trace(path: str, speedup: float = TRACE_SPEEDUP) -> list:
+    """
+    [(t, machines, rate)] from a collector raw_events.jsonl: per window, the machine count and
+    message rate summed over processors, rate per machine = total rate / machines. t starts at 0
+    and is divided by `speedup`.
+    """
+    windows = defaultdict(lambda: [0, 0.0])
+    with open(path) as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+                window = windows[float(row["timestamp"])]
+                window[0] += int(row.get("machine_count", 0))
+                window[1] += float(row.get("msg_rate", 0.0))
+            except (ValueError, KeyError, TypeError):
+                continue
+    if not windows:
+        raise ValueError(f"No windows in trace {path}")
+
+    start = min(windows)
+    points = []
+    for ts in sorted(windows):
+        machines, total_rate = windows[ts]
+        if machines > 0:
+            points.append(((ts - start) / speedup, machines, total_rate / machines))
+    if not points:
+        raise ValueError(f"Trace {path} has no windows with machines")
+    logging.info(f"[Shift] Loaded trace {path}: {len(points)} windows over {points[-1][0]:.0f}s")
+    return points
+
+
+def build(spec: str, seed: int = 0, duration: float = 0.0) -> Scenario:
+    """Scenario from "diurnal", "step", "ramp", "burst", "constant", "random" or "trace:<path>"."""
+    if spec.startswith("trace:"):
+        points = load_trace(spec.split(":", 1)[1])
+        # one more window so the last point is held for its own length
+        length = points[-1][0] + (points[-1][0] - points[-2][0] if len(points) > 1 else 0)
+        return Scenario(spec, seed, points=points, duration=duration or length)
+    if spec not in PATTERNS:
+        raise ValueError(f"Unknown scenario {spec!r}, expected one of {sorted(PATTERNS)} or trace:<path>")
+    return Scenario(spec, seed, pattern=PATTERNS[spec], duration=duration)
@@ -1,9 +1,11 @@
-import random, time, logging, sys
+import os, time, json, logging, sys
 from kubernetes import client, config
+import paho.mqtt.client as mqtt
+from paho.mqtt.enums import CallbackAPIVersion
+from scenarios import build
 
 config.load_incluster_config()   # if inside cluster
 apps_v1 = client.AppsV1Api()
-core_v1 = client.CoreV1Api()
 
 logging.basicConfig(
     level=logging.INFO,
@@ -11,27 +13,60 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
-MIN_MACHINES = 5
-MAX_MACHINES = 15
+############################################
+# CONFIG
+############################################
+BROKER_HOST = os.getenv("MQTT_BROKER", "mqtt-broker")
+SCENARIO = os.getenv("SCENARIO", "random")  # diurnal | step | ramp | burst | constant | random | trace:<path>
+SEED = int(os.getenv("SEED", "0"))
+STEP_INTERVAL = float(os.getenv("STEP_INTERVAL", "60"))  # seconds between scenario updates
+DURATION = float(os.getenv("DURATION", "0"))  # seconds, 0 = the trace's length, forever for patterns
+MACHINE_DEPLOYMENT = os.getenv("MACHINE_DEPLOYMENT", "machine")
+# Retained; machine pods read their per-machine rate from it, the scenario topic records what ran
+MACHINE_RATE_TOPIC = "control/machines/rate"
+SCENARIO_TOPIC = "shift/scenario"
 
-while True:
-    running_machines = core_v1.list_namespaced_pod(
+scenario = build(SCENARIO, SEED, DURATION)
+
+mqtt_client = mqtt.Client(callback_api_version=CallbackAPIVersion.VERSION2, client_id="shift")
+mqtt_client.connect(BROKER_HOST, 1883, 60)
+mqtt_client.loop_start()
+
+
+def scale_machines(replicas):
+    apps_v1.patch_namespaced_deployment_scale(
+        name=MACHINE_DEPLOYMENT,
         namespace="default",
-        label_selector="app=machine"
+        body={"spec": {"replicas": replicas}}
     )
-    running_machine_names = [p.metadata.name for p in running_machines.items]
-    running_machine_count = len(running_machine_names)
-
-    logging.info(f"[Shift] {running_machine_count} machines are running.")
-
-    if running_machine_count < MAX_MACHINES:
-        new_replicas = random.randint(MIN_MACHINES, MAX_MACHINES)
-        logging.info(f"[Shift] Starting {new_replicas} new machines...")
-        body = {"spec": {"replicas": new_replicas}}
-        apps_v1.patch_namespaced_deployment_scale(
-            name="machine",
-            namespace="default",
-            body=body
-        )
-
-    time.sleep(600)
+
+
+def set_machine_rate(rate):
+    mqtt_client.publish(MACHINE_RATE_TOPIC, json.dumps({"rate": rate}), qos=1, retain=True)
+
+
+logging.info(f"[Shift] Running scenario {scenario.name} (seed {SEED}), step {STEP_INTERVAL}s, "
+             f"{'for ' + str(scenario.duration) + 's' if scenario.duration else 'until stopped'}")
+started = time.time()
+current = (None, None)
+for t, machines, rate in scenario.steps(STEP_INTERVAL):
+    time.sleep(max(0.0, started + t - time.time()))
+
+    if machines != current[0]:
+        logging.info(f"[Shift] t={t:.0f}s: scaling to {machines} machines")
+        try:
+            scale_machines(machines)
+        except Exception as e:
+            logging.error(f"[Shift] Scaling to {machines} machines failed: {e}")
+            machines = current[0]  # retry on the next step
+    if rate != current[1]:
+        logging.info(f"[Shift] t={t:.0f}s: {rate} readings/s per machine")
+        set_machine_rate(rate)
+    current = (machines, rate)
+    mqtt_client.publish(SCENARIO_TOPIC, json.dumps({**scenario.describe(), "t": t, "machines": machines,
+                                                    "rate": rate, "started": started}), qos=1, retain=True)
+
+time.sleep(max(0.0, started + scenario.duration - time.time()))  # hold the last step
+logging.info(f"[Shift] Scenario {scenario.name} finished")
+mqtt_client.loop_stop()
+mqtt_client.disconnect()
@@ -0,0 +1,78 @@
+import os, time, datetime
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+FEATURE_STORE_DIR = os.getenv("FEATURE_STORE_DIR", "/data/features")
+LABELED_STORE_DIR = os.getenv("LABELED_STORE_DIR", "/data/labeled")
+
+# Layout written by the collector: <root>/date=YYYY-MM-DD/hour=HH/part-*.parquet
+PARTITIONING = ds.partitioning(pa.schema([("date", pa.string()), ("hour", pa.int32())]), flavor="hive")
+
+
+def store_exists(root: str) -> bool:
+    return os.path.isdir(root) and any(f.endswith(".parquet") for _, _, files in os.walk(root) for f in files)
+
+
+def _utc(timestamp: float) -> datetime.datetime:
+    return datetime.datetime.fromtimestamp(timestamp, tz=datetime.timezone.utc)
+
+
+def time_filter(since: float = None, until: float = None, whole_partitions: bool = False):
+    """
+    Predicate on the timestamp column plus the matching date/hour partition keys, so whole
+    partitions outside the range are skipped without opening their files. With whole_partitions
+    the partition holding `since` is kept in full, for callers that rewrite what they read.
+    """
+    expr = None
+    if since is not None:
+        t = _utc(since)
+        day = f"{t:%Y-%m-%d}"
+        partitions = (ds.field("date") > day) | ((ds.field("date") == day) & (ds.field("hour") >= t.hour))
+        expr = partitions if whole_partitions else partitions & (ds.field("timestamp") > since)
+    if until is not None:
+        t = _utc(until)
+        day = f"{t:%Y-%m-%d}"
+        partitions = (ds.field("date") < day) | ((ds.field("date") == day) & (ds.field("hour") <= t.hour))
+        bound = partitions & (ds.field("timestamp") <= until)
+        expr = bound if expr is None else expr & bound
+    return expr
+
+
+def read_store(root: str, columns: list = None, since: float = None, until: float = None,
+               whole_partitions: bool = False) -> pd.DataFrame:
+    """Read only the needed columns of the partitions overlapping (since, until]."""
+    dataset = ds.dataset(root, format="parquet", partitioning=PARTITIONING)
+    table = dataset.to_table(columns=columns, filter=time_filter(since, until, whole_partitions))
+    return table.to_pandas()
+
+
+def since_hours(hours: float):
+    """Epoch seconds `hours` ago, or None for the whole history when hours <= 0."""
+    return time.time() - hours * 3600 if hours > 0 else None
+
+
+def write_store(df: pd.DataFrame, root: str):
+    """
+    Write a frame with a timestamp column as hourly partitions, replacing the partitions it covers:
+    the frame must hold every row of those partitions (read_store(..., whole_partitions=True)).
+    """
+    stamps = pd.to_datetime(df["timestamp"], unit="s", utc=True)
+    df = df.assign(date=stamps.dt.strftime("%Y-%m-%d"), hour=stamps.dt.hour.astype("int32"))
+
+    ds.write_dataset(
+        pa.Table.from_pandas(df, preserve_index=False),
+        root,
+        format="parquet",
+        partitioning=PARTITIONING,
+        existing_data_behavior="delete_matching",
+        basename_template="part-{i}.parquet",
+    )
+
+
+def iter_store(root: str, columns: list = None, since: float = None, until: float = None, batch_size: int = 65536):
+    """Record batches (pandas frames) of the store, for out-of-core consumers."""
+    dataset = ds.dataset(root, format="parquet", partitioning=PARTITIONING)
+    for batch in dataset.to_batches(columns=columns, filter=time_filter(since, until), batch_size=batch_size):
+        if batch.num_rows:
+            yield batch.to_pandas()
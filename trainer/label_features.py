@@ -1,5 +1,7 @@
 import pandas as pd
+import numpy as np
 import os, logging, sys
+from feature_store import FEATURE_STORE_DIR, LABELED_STORE_DIR, store_exists, read_store, write_store, since_hours
 
 logging.basicConfig(
     level=logging.INFO,
@@ -10,32 +12,96 @@ logging.basicConfig(
 DATA_DIR = "/data"
 RAW_FILE = os.path.join(DATA_DIR, "features.csv")
 LABELED_FILE = os.path.join(DATA_DIR, "labeled_features.csv")
+BENCHMARK_FILE = os.path.join(DATA_DIR, "benchmark.csv")
 
 CPU_THRESHOLD = 80.0
 BUFFER_THRESHOLD = 25
+LABEL_WINDOW_HOURS = float(os.getenv("LABEL_WINDOW_HOURS", "0"))  # relabel only recent partitions, 0 = all
 
-def label_data(df):
-    df["label"] = ((df["cpu_usage"] > CPU_THRESHOLD) | 
-                   (df["buffer_size"] > BUFFER_THRESHOLD)).astype(int)
+# A row is positive if its processor is overloaded now or within the next LABEL_HORIZON seconds.
+# "auto" takes the HORIZON_PERCENTILE of the measured cold starts, so a prewarm started on a positive
+# prediction is ready before the overload; 0 labels the current row only.
+LABEL_HORIZON = os.getenv("LABEL_HORIZON", "auto")
+HORIZON_PERCENTILE = float(os.getenv("HORIZON_PERCENTILE", "90"))
+DEFAULT_HORIZON = float(os.getenv("HORIZON", "60"))  # seconds, when there are no cold start benchmarks yet
+
+def cold_start_horizon():
+    """Seconds to look ahead: LABEL_HORIZON, or the cold start percentile from benchmark.csv."""
+    if LABEL_HORIZON != "auto":
+        return float(LABEL_HORIZON)
+    try:
+        bench = pd.read_csv(BENCHMARK_FILE, usecols=["event_type", "start_time_ms"])
+    except (FileNotFoundError, ValueError, pd.errors.EmptyDataError):
+        return DEFAULT_HORIZON
+
+    cold = pd.to_numeric(bench.loc[bench["event_type"] == "cold", "start_time_ms"], errors="coerce").dropna()
+    if cold.empty:
+        return DEFAULT_HORIZON
+    return float(np.percentile(cold, HORIZON_PERCENTILE)) / 1000.0
+
+def label_data(df, horizon=0.0):
+    overloaded = (df["cpu_usage"] > CPU_THRESHOLD) | (df["buffer_size"] > BUFFER_THRESHOLD)
+    if horizon <= 0 or "timestamp" not in df.columns:
+        df["label"] = overloaded.astype(int)
+        return df
+
+    # Forward-looking window as a backward rolling window on reversed time: per processor, newest row
+    # first, indexed by time before the newest row, so rolling("Hs") covers [t, t + H].
+    keys = df["processor_id"] if "processor_id" in df.columns else pd.Series("", index=df.index)
+    ts = pd.to_numeric(df["timestamp"], errors="coerce")
+    frame = pd.DataFrame({"key": keys.astype(str).to_numpy(), "ts": ts.to_numpy(),
+                          "hot": overloaded.astype(float).to_numpy(), "row": np.arange(len(df))})
+    frame = frame.sort_values(["key", "ts"], ascending=[True, False], kind="stable")
+    frame.index = pd.to_datetime(ts.max() - frame["ts"], unit="s")
+
+    # groupby(sort=True) yields the groups in key order, i.e. in the order of the sorted frame
+    ahead = frame.groupby("key", sort=True)["hot"].rolling(f"{horizon}s", closed="both").max()
+    label = np.empty(len(df), dtype=int)
+    label[frame["row"].to_numpy()] = ahead.to_numpy()
+    df["label"] = label
     return df
 
+def load_features():
+    """Feature rows from the Parquet store (recent partitions only if configured), else features.csv."""
+    if store_exists(FEATURE_STORE_DIR):
+        logging.info(f"[Labeling] Loading features from {FEATURE_STORE_DIR}...")
+        # whole hours only: write_store replaces every partition it writes to
+        return read_store(FEATURE_STORE_DIR, since=since_hours(LABEL_WINDOW_HOURS), whole_partitions=True), True
+
+    if os.path.exists(RAW_FILE):
+        logging.info("[Labeling] Loading features...")
+        return pd.read_csv(RAW_FILE), False
+
+    return None, False
+
 def main():
-    if not os.path.exists(RAW_FILE):
-        logging.info(f"[Labeling] No features.csv found in {DATA_DIR}")
+    df, from_store = load_features()
+    if df is None:
+        logging.info(f"[Labeling] No features found in {DATA_DIR}")
         return
 
-    logging.info("[Labeling] Loading features...")
-    df = pd.read_csv(RAW_FILE)
-
     # Ensure columns exist
     for col in ["cpu_usage", "buffer_size"]:
         if col not in df.columns:
             raise ValueError(f"Missing required column: {col}")
 
-    logging.info("[Labeling] Applying labeling rules...")
-    df = label_data(df)
-    df.to_csv(LABELED_FILE, index=False)
-    logging.info(f"[Labeling] Done. Saved labeled dataset -> {LABELED_FILE}")
+    horizon = cold_start_horizon()
+    logging.info(f"[Labeling] Applying labeling rules, looking {horizon:.1f}s ahead...")
+    df = label_data(df, horizon)
+
+    if horizon > 0 and "timestamp" in df.columns:
+        # the newest rows' horizon is not observed yet; they are labeled on a later run, so the
+        # trainer's watermark never moves past a row whose label could still change
+        ts = pd.to_numeric(df["timestamp"], errors="coerce")
+        pending = ts > ts.max() - horizon
+        df = df[~pending]
+        logging.info(f"[Labeling] Holding back {int(pending.sum())} rows until their horizon has passed")
+    if from_store:
+        write_store(df.drop(columns=["date", "hour"], errors="ignore"), LABELED_STORE_DIR)
+        logging.info(f"[Labeling] Done. Saved {len(df)} labeled rows -> {LABELED_STORE_DIR}")
+    else:
+        df.to_csv(LABELED_FILE, index=False)
+        logging.info(f"[Labeling] Done. Saved labeled dataset -> {LABELED_FILE}")
 
 if __name__ == "__main__":
     main()
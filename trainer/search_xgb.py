@@ -0,0 +1,172 @@
+import os, time, json, random, logging, itertools
+import numpy as np
+import xgboost as xgb
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.model_selection import TimeSeriesSplit
+from sklearn.metrics import log_loss
+
+SEARCH_STRATEGY = os.getenv("SEARCH_STRATEGY", "random")  # grid | random
+SEARCH_CANDIDATES = int(os.getenv("SEARCH_CANDIDATES", "24"))  # random strategy only
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", "0"))  # 0 = one per two cores
+SEARCH_SEED = int(os.getenv("SEARCH_SEED", "0"))
+CV_FOLDS = int(os.getenv("CV_FOLDS", "4"))
+HOLDOUT_FRACTION = float(os.getenv("HOLDOUT_FRACTION", "0.2"))
+MAX_ROUNDS = int(os.getenv("MAX_ROUNDS", "400"))
+EARLY_STOPPING_ROUNDS = int(os.getenv("EARLY_STOPPING_ROUNDS", "20"))
+MAX_PREDICT_MS = float(os.getenv("MAX_PREDICT_MS", "0"))  # 0 = no latency limit
+PREDICT_BATCH = int(os.getenv("PREDICT_BATCH", "16"))  # rows per scheduler prediction round
+SEARCH_RESULTS_PATH = "/data/search_results.json"
+
+SPACE = {
+    "max_depth": [3, 4, 6, 8],
+    "eta": [0.03, 0.1, 0.3],
+    "min_child_weight": [1, 5, 10],
+    "subsample": [0.7, 1.0],
+    "colsample_bytree": [0.7, 1.0],
+    "lambda": [1.0, 5.0],
+}
+
+BASE_PARAMS = {
+    "objective": "binary:logistic",
+    "eval_metric": "logloss",
+    "tree_method": "hist",
+}
+
+
+def candidates(strategy: str = SEARCH_STRATEGY, n: int = SEARCH_CANDIDATES, seed: int = SEARCH_SEED) -> list:
+    """Full grid over SPACE, or n distinct random points of it."""
+    keys = sorted(SPACE)
+    grid = [dict(zip(keys, values)) for values in itertools.product(*(SPACE[k] for k in keys))]
+    if strategy == "grid" or n >= len(grid):
+        return grid
+    return random.Random(seed).sample(grid, n)
+
+
+def cpu_budget() -> int:
+    """Cores this process may use (respects CPU affinity / cpusets)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def time_ordered_split(n: int, holdout_fraction: float = HOLDOUT_FRACTION, folds: int = CV_FOLDS):
+    """
+    Rows are assumed sorted by timestamp. The newest holdout_fraction is held out for the promotion
+    check; the rest is split into expanding-window folds, each validated on the rows right after it.
+    """
+    cut = int(n * (1.0 - holdout_fraction))
+    splits = list(TimeSeriesSplit(n_splits=folds).split(np.arange(cut)))
+    return splits, np.arange(cut), np.arange(cut, n)
+
+
+############################################
+# WORKERS
+############################################
+_X = _y = _splits = None
+_nthread = 1
+
+def _init_worker(X, y, splits, nthread):
+    global _X, _y, _splits, _nthread
+    _X, _y, _splits, _nthread = X, y, splits, nthread
+
+
+def predict_latency_ms(booster, X, batch: int = PREDICT_BATCH, repeats: int = 50) -> float:
+    """Median wall time of one scheduler-sized inplace_predict call."""
+    rows = X[:batch]
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        booster.inplace_predict(rows)
+        timings.append((time.perf_counter() - start) * 1000.0)
+    return float(np.median(timings))
+
+
+def _evaluate(candidate: dict) -> dict:
+    params = {**BASE_PARAMS, **candidate, "nthread": _nthread}
+    losses, rounds = [], []
+    booster = None
+
+    for train_idx, val_idx in _splits:
+        dtrain = xgb.DMatrix(_X[train_idx], label=_y[train_idx], nthread=_nthread)
+        dval = xgb.DMatrix(_X[val_idx], label=_y[val_idx], nthread=_nthread)
+        booster = xgb.train(params, dtrain, num_boost_round=MAX_ROUNDS, evals=[(dval, "val")],
+                            early_stopping_rounds=EARLY_STOPPING_ROUNDS, verbose_eval=False)
+        losses.append(booster.best_score)
+        rounds.append(booster.best_iteration + 1)
+
+    return {
+        "params": candidate,
+        "logloss": float(np.mean(losses)),
+        "logloss_std": float(np.std(losses)),
+        "num_boost_round": int(np.ceil(np.mean(rounds))),
+        "predict_ms": predict_latency_ms(booster, _X[_splits[-1][1]]),
+    }
+
+
+############################################
+# SEARCH
+############################################
+def holdout_logloss(booster, X, y) -> float:
+    return float(log_loss(y, booster.inplace_predict(X), labels=[0, 1]))
+
+
+def search(X: np.ndarray, y: np.ndarray, current_params: dict, current_rounds: int):
+    """
+    Evaluate every candidate with time-ordered CV on a process pool, then fit the best one and the
+    current configuration on the same non-holdout rows and compare them on the holdout. (The deployed
+    model itself has usually seen the holdout rows, so it cannot be scored on them fairly.)
+    X, y must be sorted by time. Returns (booster, params) of the promoted model, (None, best) when
+    it does not beat the current one, and the report of every candidate.
+    """
+    splits, fit_idx, holdout_idx = time_ordered_split(len(X))
+    points = candidates()
+
+    cores = cpu_budget()
+    workers = min(SEARCH_WORKERS or max(1, cores // 2), len(points))
+    nthread = max(1, cores // workers)
+    logging.info(f"[Training] Searching {len(points)} candidates on {workers} workers x {nthread} threads, "
+                 f"{len(fit_idx)} rows in {len(splits)} folds, {len(holdout_idx)} held out")
+
+    start = time.time()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(X[fit_idx], y[fit_idx], splits, nthread)) as pool:
+        results = list(pool.map(_evaluate, points))
+    logging.info(f"[Training] Search finished in {time.time() - start:.1f}s")
+
+    eligible = [r for r in results if not MAX_PREDICT_MS or r["predict_ms"] <= MAX_PREDICT_MS]
+    if not eligible:
+        logging.warning(f"[Training] No candidate predicts within {MAX_PREDICT_MS}ms, keeping the current model")
+        return None, None, {"candidates": results}
+    best = min(eligible, key=lambda r: r["logloss"])
+    logging.info(f"[Training] Best candidate: {best}")
+
+    params = {**BASE_PARAMS, **best["params"], "nthread": cores}
+    booster = xgb.train(params, xgb.DMatrix(X[fit_idx], label=y[fit_idx]), num_boost_round=best["num_boost_round"])
+    new_loss = holdout_logloss(booster, X[holdout_idx], y[holdout_idx])
+
+    current = xgb.train({**current_params, "nthread": cores}, xgb.DMatrix(X[fit_idx], label=y[fit_idx]),
+                        num_boost_round=current_rounds)
+    current_loss = holdout_logloss(current, X[holdout_idx], y[holdout_idx])
+
+    report = {
+        "candidates": sorted(results, key=lambda r: r["logloss"]),
+        "best": best,
+        "holdout_logloss": new_loss,
+        "current_holdout_logloss": current_loss,
+        "promoted": new_loss < current_loss,
+    }
+    logging.info(f"[Training] Holdout logloss: candidate {new_loss:.5f}, current {current_loss:.5f}")
+
+    if not report["promoted"]:
+        return None, best, report
+
+    # passed on the holdout: refit on every row so the newest data is in the shipped model
+    booster = xgb.train(params, xgb.DMatrix(X, label=y), num_boost_round=best["num_boost_round"])
+    return booster, {**best["params"], "num_boost_round": best["num_boost_round"]}, report
+
+
+def write_report(report: dict, path: str = SEARCH_RESULTS_PATH):
+    report = {**report, "searched_at": time.time()}
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
@@ -1,6 +1,8 @@
 import pandas as pd
 import xgboost as xgb
-import logging, sys
+import logging, sys, os, json, time
+from feature_store import LABELED_STORE_DIR, store_exists, read_store, iter_store, since_hours
+from search_xgb import search, write_report
 
 logging.basicConfig(
     level=logging.INFO,
@@ -10,10 +12,20 @@ logging.basicConfig(
 
 DATA_PATH = "/data/labeled_features.csv"
 MODEL_PATH = "/data/xgb_model.json"
+WATERMARK_PATH = "/data/train_watermark.json"
+PARAMS_PATH = "/data/xgb_params.json"  # written by the search mode, used by every later run
+CACHE_DIR = os.getenv("XGB_CACHE_DIR", "/data/xgb-cache")
+TRAIN_WINDOW_HOURS = float(os.getenv("TRAIN_WINDOW_HOURS", "0"))  # 0 = whole history
 
-logging.info("[Training] Loading labeled features...")
-
-df = pd.read_csv(DATA_PATH)
+# full        - retrain from scratch on everything in the window
+# incremental - continue boosting the existing model on rows newer than the watermark
+# external    - retrain from scratch, streaming the store through an external-memory DMatrix
+# search      - parallel hyperparameter search, the winner replaces the model only if it is better
+TRAIN_MODE = os.getenv("TRAIN_MODE", "incremental")
+NUM_BOOST_ROUND = int(os.getenv("NUM_BOOST_ROUND", "50"))
+INCREMENTAL_ROUNDS = int(os.getenv("INCREMENTAL_ROUNDS", "10"))
+MAX_TOTAL_ROUNDS = int(os.getenv("MAX_TOTAL_ROUNDS", "500"))  # beyond this, incremental falls back to a rebuild
+BATCH_ROWS = int(os.getenv("BATCH_ROWS", "65536"))
 
 # Define the updated feature set
 features = [
@@ -21,28 +33,206 @@ features = [
     "avg_latency", "avg_rate", "temperature", "vibration", "load"
 ]
 
-# Filter available columns dynamically
-for col in features:
-    df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0.0)
-
-X = df[features]
-y = df["label"].astype(int)
-
-logging.info(f"[Training] Using features: {features}")
-logging.info(f"[Training] Dataset size: {len(X)} samples")
-logging.info(f"[Training] {df[features].dtypes}")
-
-# Train a simple XGBoost model
-dtrain = xgb.DMatrix(X, label=y)
 params = {
     "objective": "binary:logistic",
     "max_depth": 4,
     "eta": 0.1,
-    "eval_metric": "logloss"
+    "eval_metric": "logloss",
+    "tree_method": "hist",
 }
 
-model = xgb.train(params, dtrain, num_boost_round=50)
-model.save_model(MODEL_PATH)
 
-logging.info(f"[Training] Model saved -> {MODEL_PATH}")
+############################################
+# DATA
+############################################
+
+def load_frame(since=None) -> pd.DataFrame:
+    """Labeled rows newer than `since` (and inside TRAIN_WINDOW_HOURS), model columns only."""
+    window_start = since_hours(TRAIN_WINDOW_HOURS)
+    if since is None or (window_start is not None and window_start > since):
+        since = window_start
+
+    if store_exists(LABELED_STORE_DIR):
+        # only the model columns, only the partitions inside the training window
+        return read_store(LABELED_STORE_DIR, columns=["timestamp"] + features + ["label"], since=since)
+
+    df = pd.read_csv(DATA_PATH)
+    if since is not None and "timestamp" in df.columns:
+        df = df[pd.to_numeric(df["timestamp"], errors="coerce") > since]
+    return df
+
+def prepare(df: pd.DataFrame):
+    # Filter available columns dynamically
+    for col in features:
+        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0.0)
+    return df[features], df["label"].astype(int)
+
+def max_timestamp(df: pd.DataFrame):
+    if "timestamp" not in df.columns or df.empty:
+        return None
+    return float(pd.to_numeric(df["timestamp"], errors="coerce").max())
+
+
+class StoreBatches(xgb.DataIter):
+    """Feeds the labeled store to XGBoost batch by batch; the DMatrix pages to CACHE_DIR."""
+
+    def __init__(self, since=None):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        self.since = since
+        self.batches = None
+        self.rows = 0  # rows in the last complete pass
+        self.pass_rows = 0
+        self.max_ts = None
+        super().__init__(cache_prefix=os.path.join(CACHE_DIR, "train"))
+
+    def reset(self):
+        self.batches = iter_store(LABELED_STORE_DIR, columns=["timestamp"] + features + ["label"],
+                                  since=self.since, batch_size=BATCH_ROWS)
+        self.pass_rows = 0
+
+    def next(self, input_data):
+        if self.batches is None:
+            self.reset()
+        try:
+            df = next(self.batches)
+        except StopIteration:
+            self.rows = self.pass_rows
+            return 0
+
+        X, y = prepare(df)
+        input_data(data=X, label=y)
+        self.pass_rows += len(df)
+        ts = max_timestamp(df)
+        self.max_ts = ts if self.max_ts is None else max(self.max_ts, ts)
+        return 1
+
+
+############################################
+# WATERMARK
+############################################
+
+def read_watermark() -> dict:
+    try:
+        with open(WATERMARK_PATH) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def apply_tuned_params():
+    """Use the parameters and round count the last promoted search found, if any."""
+    global NUM_BOOST_ROUND
+    try:
+        with open(PARAMS_PATH) as f:
+            tuned = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return
+    NUM_BOOST_ROUND = int(tuned.pop("num_boost_round", NUM_BOOST_ROUND))
+    params.update(tuned)
+    logging.info(f"[Training] Using tuned parameters {params}, {NUM_BOOST_ROUND} rounds")
+
+def write_watermark(timestamp, rows, mode, model):
+    watermark = {
+        "timestamp": timestamp,
+        "rows": rows,
+        "mode": mode,
+        "total_rounds": model.num_boosted_rounds(),
+        "trained_at": time.time(),
+    }
+    tmp = WATERMARK_PATH + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(watermark, f)
+    os.replace(tmp, WATERMARK_PATH)
+    logging.info(f"[Training] Watermark -> {watermark}")
+
+
+############################################
+# MODES
+############################################
+
+def train_full():
+    logging.info("[Training] Loading labeled features...")
+    df = load_frame()
+    X, y = prepare(df)
+
+    logging.info(f"[Training] Using features: {features}")
+    logging.info(f"[Training] Dataset size: {len(X)} samples")
+
+    model = xgb.train(params, xgb.DMatrix(X, label=y), num_boost_round=NUM_BOOST_ROUND)
+    return model, max_timestamp(df), len(X)
+
+def train_incremental(watermark: dict):
+    since = watermark["timestamp"]
+    logging.info(f"[Training] Loading labeled features newer than {since}...")
+    df = load_frame(since=since)
+    if df.empty:
+        logging.info("[Training] No new rows since the last watermark, model unchanged.")
+        return None, since, 0
+
+    X, y = prepare(df)
+    logging.info(f"[Training] Continuing from {MODEL_PATH} with {len(X)} new samples, {INCREMENTAL_ROUNDS} rounds")
+
+    model = xgb.train(params, xgb.DMatrix(X, label=y), num_boost_round=INCREMENTAL_ROUNDS, xgb_model=MODEL_PATH)
+    return model, max_timestamp(df), len(X)
+
+def train_external():
+    if not store_exists(LABELED_STORE_DIR):
+        logging.info("[Training] No labeled store for external-memory training, training in memory.")
+        return train_full()
+
+    batches = StoreBatches(since=since_hours(TRAIN_WINDOW_HOURS))
+    dtrain = xgb.DMatrix(batches)
+    logging.info(f"[Training] External-memory DMatrix over {batches.rows} samples")
+
+    model = xgb.train(params, dtrain, num_boost_round=NUM_BOOST_ROUND)
+    return model, batches.max_ts, batches.rows
+
+def train_search():
+    df = load_frame()
+    if "timestamp" in df.columns:
+        df = df.sort_values("timestamp", kind="stable")
+    X, y = prepare(df)
+
+    model, best, report = search(X.to_numpy(dtype="float32"), y.to_numpy(), params, NUM_BOOST_ROUND)
+    write_report(report)
+    if model is None:
+        logging.info("[Training] Search did not beat the current model, model unchanged.")
+        return None, None, 0
+
+    with open(PARAMS_PATH, "w") as f:
+        json.dump(best, f)
+    return model, max_timestamp(df), len(X)
+
+
+def main():
+    start = time.time()
+    watermark = read_watermark()
+    mode = TRAIN_MODE
+    apply_tuned_params()
+
+    if mode == "incremental":
+        if not os.path.exists(MODEL_PATH) or watermark.get("timestamp") is None:
+            logging.info("[Training] No previous model or watermark, starting with a full training.")
+            mode = "full"
+        elif watermark.get("total_rounds", 0) + INCREMENTAL_ROUNDS > MAX_TOTAL_ROUNDS:
+            logging.info(f"[Training] Model reached {MAX_TOTAL_ROUNDS} rounds, rebuilding from scratch.")
+            mode = "full"
+
+    if mode == "incremental":
+        model, timestamp, rows = train_incremental(watermark)
+    elif mode == "external":
+        model, timestamp, rows = train_external()
+    elif mode == "search":
+        model, timestamp, rows = train_search()
+    else:
+        model, timestamp, rows = train_full()
+
+    if model is None:
+        return
+
+    model.save_model(MODEL_PATH)
+    write_watermark(timestamp, rows, mode, model)
+    logging.info(f"[Training] Model saved -> {MODEL_PATH} ({mode}, {rows} rows, {time.time() - start:.1f}s)")
+
 
+if __name__ == "__main__":
+    main()